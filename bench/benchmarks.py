@@ -0,0 +1,277 @@
+"""
+.. py:module:: benchmarks
+    :platform: Unix, Windows
+    :synopsis: Times each stage of a playlister run, and the whole run, on
+        synthetic libraries of increasing size.
+
+    Usage: python -m bench.benchmarks --sizes 1000 10000 \
+        --output results.json --compare previous.json
+"""
+
+import gc
+import sys
+import json
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+
+from argparse import ArgumentParser
+from datetime import datetime
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from bench.context import playlister, files, m3u, xspf, remap
+from bench.synthetic import generate_library
+
+DEFAULT_SIZES = [1000, 10000, 100000, 500000]
+
+MUSIC_PATH = Path("/home/bench/Music")
+
+
+def measure(
+    func: Callable[[], Any],
+    repeat: int = 3,
+    memory: bool = True
+) -> Dict[str, float]:
+    """Times a function, taking the best of several runs, then runs it once
+        more under tracemalloc for its peak memory. The traced run is kept
+        out of the timings as tracing slows everything down.
+
+        :param func: the function to measure.
+        :param repeat: how many timed runs.
+        :param memory: whether to measure peak memory.
+        :returns: the wall time in seconds and peak memory in bytes.
+    """
+
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+
+    result = {"seconds": min(times)}
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+
+        finally:
+            tracemalloc.stop()
+
+    return result
+
+
+def bench_size(
+    size: int,
+    data_dir: Path,
+    repeat: int = 3,
+    memory: bool = True
+) -> Dict[str, Dict[str, float]]:
+    """Runs every benchmark on a library of the given size.
+
+        :param size: number of tracks.
+        :param data_dir: where the generated libraries are kept between runs.
+        :param repeat: how many timed runs per benchmark.
+        :param memory: whether to measure peak memory.
+        :returns: the results, keyed by stage.
+    """
+
+    source = data_dir / "synthetic-{}.xml".format(size)
+    if not source.exists():
+        print("Generating {}...".format(source), file=sys.stderr)
+        generate_library(source, tracks=size)
+
+    tracks = files.load_plist(source)
+    remapper = remap.Remapper(music_path=MUSIC_PATH)
+    remapped = list(map(remapper.remap_track, tracks))
+    output_dir = Path(tempfile.mkdtemp(prefix="playlister-bench-"))
+
+    stages = [
+        ("load_plist", partial(files.load_plist, source)),
+        ("to_m3u_track", lambda: list(map(m3u.to_m3u_track, remapped))),
+        ("to_xspf_track", lambda: list(map(xspf.to_xspf_track, remapped))),
+        ("replace_music_path", lambda: [
+            playlister.replace_music_path(MUSIC_PATH, track)
+            for track in tracks
+        ]),
+        ("remap_track", lambda: list(map(remapper.remap_track, tracks))),
+        ("playlister_m3u", partial(
+            playlister.playlister,
+            source,
+            output_dir,
+            "m3u",
+            MUSIC_PATH
+        )),
+        ("write_playlists_xspf", partial(
+            playlister.write_playlists,
+            source,
+            output_dir,
+            "xspf",
+            MUSIC_PATH
+        )),
+    ]
+
+    results = {}
+    for name, func in stages:
+        print("  {}...".format(name), file=sys.stderr)
+        result = measure(func, repeat, memory)
+        result["tracks_per_second"] = size / result["seconds"]
+        results[name] = result
+
+    return results
+
+
+def bench_startup(repeat: int = 3) -> Dict[str, float]:
+    """Times starting an interpreter that imports playlister, less the time
+        to start a bare one.
+
+        :param repeat: how many runs to take the best of.
+        :returns: the import overhead in seconds.
+    """
+
+    root_dir = str(Path(__file__).resolve().parent.parent)
+
+    def start(code: str) -> float:
+        times = []
+        for _ in range(repeat):
+            begin = perf_counter()
+            subprocess.check_call([sys.executable, "-c", code], cwd=root_dir)
+            times.append(perf_counter() - begin)
+
+        return min(times)
+
+    return {"seconds": start("import playlister.app") - start("pass")}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stderr=subprocess.DEVNULL
+        ).decode("utf-8").strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(
+    current: Dict[str, Any],
+    previous: Dict[str, Any]
+) -> List[str]:
+    """Lines comparing two benchmark runs, the ratio is previous/current so
+        above 1 means faster now.
+
+        :param current: the results of this run.
+        :param previous: the results to compare against.
+        :returns: the lines of the comparison table.
+    """
+
+    lines = ["{:>8} {:<22} {:>10} {:>10} {:>8}".format(
+        "tracks", "stage", "before", "after", "speedup"
+    )]
+    for size, stages in current["results"].items():
+        for stage, result in stages.items():
+            before = previous["results"].get(size, {}).get(stage)
+            if not before:
+                continue
+
+            lines.append("{:>8} {:<22} {:>9.3f}s {:>9.3f}s {:>7.2f}x".format(
+                size,
+                stage,
+                before["seconds"],
+                result["seconds"],
+                before["seconds"] / result["seconds"]
+            ))
+
+    return lines
+
+
+def main(args: List[str]) -> int:
+    parser = ArgumentParser(description="Benchmarks playlister.")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="library sizes in tracks"
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory",
+        dest="memory",
+        action="store_false",
+        help="skip the peak memory runs"
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "playlister-bench",
+        help="where to keep the generated libraries"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="file to save the results to, as json"
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        help="results file from an earlier run to compare with"
+    )
+    ns = parser.parse_args(args)
+
+    current = {
+        "date": datetime.now().isoformat(),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "startup": bench_startup(max(ns.repeat, 5)),
+        "results": {}
+    }
+
+    for size in ns.sizes:
+        print("Benchmarking {} tracks".format(size), file=sys.stderr)
+        current["results"][str(size)] = bench_size(
+            size,
+            ns.data_dir,
+            ns.repeat,
+            ns.memory
+        )
+
+    print("{:>8} {:<22} {:>9.3f}s".format(
+        "",
+        "startup_import",
+        current["startup"]["seconds"]
+    ))
+    for size, stages in current["results"].items():
+        for stage, result in stages.items():
+            print("{:>8} {:<22} {:>9.3f}s {:>12.0f} tracks/s {:>10}".format(
+                size,
+                stage,
+                result["seconds"],
+                result["tracks_per_second"],
+                "{:.1f} MB".format(result["peak_bytes"] / 2**20)
+                if "peak_bytes" in result else ""
+            ))
+
+    if ns.output:
+        ns.output.parent.mkdir(parents=True, exist_ok=True)
+        with ns.output.open("w") as f:
+            json.dump(current, f, indent=2)
+
+    if ns.compare:
+        with ns.compare.open() as f:
+            print("\n".join(compare(current, json.load(f))))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
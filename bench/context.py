@@ -0,0 +1,13 @@
+import sys
+import os.path
+
+sys.path.insert(
+    0,
+    os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+)
+
+import playlister.app as playlister
+import playlister.files as files
+import playlister.m3u as m3u
+import playlister.xspf as xspf
+import playlister.remap as remap
@@ -0,0 +1,263 @@
+"""
+.. py:module:: synthetic
+    :platform: Unix, Windows
+    :synopsis: Generates realistic synthetic iTunes® library exports for
+        benchmarking playlister.
+
+    Usage: python -m bench.synthetic out.xml --tracks 100000 --playlists 50
+"""
+
+import sys
+import random
+
+from argparse import ArgumentParser
+from pathlib import Path
+from urllib.parse import quote
+from unicodedata import normalize
+from xml.sax.saxutils import escape
+from typing import List, Optional, TextIO
+
+HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE plist PUBLIC "-//Apple Computer//DTD PLIST 1.0//EN" \
+"http://www.apple.com/DTDs/PropertyList-1.0.dtd">
+<plist version="1.0">
+<dict>
+	<key>Major Version</key><integer>1</integer>
+	<key>Minor Version</key><integer>1</integer>
+	<key>Date</key><date>2016-08-22T14:31:48Z</date>
+	<key>Application Version</key><string>12.4.3.1</string>
+	<key>Features</key><integer>5</integer>
+	<key>Show Content Ratings</key><true/>
+	<key>Music Folder</key><string>{music_folder}</string>
+	<key>Library Persistent ID</key><string>2EE7826E137BE07F</string>
+	<key>Tracks</key>
+	<dict>
+"""
+
+TRACK = """		<key>{track_id}</key>
+		<dict>
+			<key>Track ID</key><integer>{track_id}</integer>
+			<key>Name</key><string>{name}</string>
+			<key>Artist</key><string>{artist}</string>
+			<key>Album Artist</key><string>{artist}</string>
+			<key>Composer</key><string>{artist}</string>
+			<key>Album</key><string>{album}</string>
+			<key>Genre</key><string>Rock</string>
+			<key>Kind</key><string>Purchased AAC audio file</string>
+			<key>Size</key><integer>{size}</integer>
+			<key>Total Time</key><integer>{total_time}</integer>
+			<key>Disc Number</key><integer>1</integer>
+			<key>Disc Count</key><integer>1</integer>
+			<key>Track Number</key><integer>{number}</integer>
+			<key>Track Count</key><integer>12</integer>
+			<key>Year</key><integer>{year}</integer>
+			<key>Date Modified</key><date>2014-01-21T23:44:49Z</date>
+			<key>Date Added</key><date>2014-01-21T23:43:47Z</date>
+			<key>Bit Rate</key><integer>256</integer>
+			<key>Sample Rate</key><integer>44100</integer>
+			<key>Play Count</key><integer>{plays}</integer>
+			<key>Play Date</key><integer>3538303254</integer>
+			<key>Play Date UTC</key><date>2016-02-14T19:00:54Z</date>
+			<key>Release Date</key><date>{year}-03-01T00:00:00Z</date>
+			<key>Normalization</key><integer>328</integer>
+			<key>Artwork Count</key><integer>1</integer>
+			<key>Sort Album</key><string>{album}</string>
+			<key>Sort Artist</key><string>{artist}</string>
+			<key>Sort Name</key><string>{name}</string>
+			<key>Persistent ID</key><string>{persistent_id:016X}</string>
+			<key>Track Type</key><string>File</string>
+			<key>Purchased</key><true/>
+			<key>Location</key><string>{location}</string>
+			<key>File Folder Count</key><integer>5</integer>
+			<key>Library Folder Count</key><integer>1</integer>
+		</dict>
+"""
+
+PLAYLISTS = """	</dict>
+	<key>Playlists</key>
+	<array>
+"""
+
+PLAYLIST_HEAD = """		<dict>
+			<key>Name</key><string>{name}</string>
+			<key>Description</key><string></string>{master}
+			<key>Playlist ID</key><integer>{playlist_id}</integer>
+			<key>Playlist Persistent ID</key><string>{persistent_id:016X}</string>
+			<key>All Items</key><true/>
+			<key>Playlist Items</key>
+			<array>
+"""
+
+PLAYLIST_ITEM = """				<dict>
+					<key>Track ID</key><integer>{track_id}</integer>
+				</dict>
+"""
+
+PLAYLIST_TAIL = """			</array>
+		</dict>
+"""
+
+FOOTER = """	</array>
+</dict>
+</plist>
+"""
+
+MUSIC_FOLDER = "file:///Users/bench/Music/iTunes/iTunes%20Media/"
+
+WORDS = [
+    "Sailor", "Margarita", "Island", "Cheeseburger", "Paradise", "Volcano",
+    "Changes", "Latitude", "Attitude", "Pirate", "Beach", "Boat", "Drinks",
+    "Fins", "Coconut", "Harbor", "Tide", "Sunset", "Breeze", "Storm"
+]
+
+# Accented words, stored decomposed (NFD) the way Apple writes them.
+UNICODE_WORDS = [
+    normalize("NFD", word) for word in [
+        "Café", "Señor", "Mañana", "Noël", "Déjà", "Über", "Smörgåsbord",
+        "Fiancée", "Jalapeño", "Crème", "Björk", "Motörhead", "Ærø",
+        "Sigur Rós", "Beyoncé", "東京", "Ελλάδα", "Москва"
+    ]
+]
+
+
+def _words(rng: random.Random, count: int, unicode_density: float) -> str:
+    return " ".join(
+        rng.choice(UNICODE_WORDS)
+        if rng.random() < unicode_density else rng.choice(WORDS)
+        for _ in range(count)
+    )
+
+
+def write_library(
+    f: TextIO,
+    tracks: int = 1000,
+    playlists: int = 1,
+    unicode_density: float = 0.1,
+    path_depth: int = 0,
+    artists: Optional[int] = None,
+    seed: int = 0
+) -> None:
+    """Writes a synthetic iTunes® library export. With a single playlist the
+        output looks like File -> Library -> Export Playlist with every
+        track in it, otherwise like a full library export: the master
+        Library playlist followed by playlists-1 random playlists.
+
+        :param f: the text file object to write to.
+        :param tracks: number of tracks.
+        :param playlists: number of playlists.
+        :param unicode_density: fraction of words that are non-ASCII.
+        :param path_depth: extra directory levels under Artist/Album.
+        :param artists: number of distinct artists, defaults to tracks/20.
+        :param seed: seed for the random generator, for repeatable output.
+    """
+
+    rng = random.Random(seed)
+    artists = artists or max(1, tracks // 20)
+    artist_names = [
+        _words(rng, rng.randint(1, 3), unicode_density)
+        for _ in range(artists)
+    ]
+
+    f.write(HEADER.format(music_folder=MUSIC_FOLDER))
+
+    track_ids = []
+    for i in range(tracks):
+        track_id = 1000 + i * 2
+        track_ids.append(track_id)
+
+        artist = artist_names[rng.randrange(artists)]
+        album = _words(rng, rng.randint(1, 4), unicode_density)
+        name = _words(rng, rng.randint(1, 5), unicode_density)
+        number = rng.randint(1, 12)
+        extra = [
+            _words(rng, 1, unicode_density) for _ in range(path_depth)
+        ]
+        path = "/".join(
+            [artist, album] + extra + ["{:02d} {}.m4a".format(number, name)]
+        )
+
+        f.write(TRACK.format(
+            track_id=track_id,
+            name=escape(name),
+            artist=escape(artist),
+            album=escape(album),
+            size=rng.randint(2000000, 12000000),
+            total_time=rng.randint(90000, 600000),
+            number=number,
+            year=rng.randint(1960, 2020),
+            plays=rng.randint(0, 200),
+            persistent_id=rng.getrandbits(64),
+            location=escape(MUSIC_FOLDER + "Music/" + quote(path))
+        ))
+
+    f.write(PLAYLISTS)
+
+    for i in range(playlists):
+        if playlists == 1:
+            name, items, master = "Synthetic", track_ids, ""
+
+        elif i == 0:
+            name, items = "Library", track_ids
+            master = "\n\t\t\t<key>Master</key><true/>"
+
+        else:
+            name = _words(rng, rng.randint(1, 3), unicode_density)
+            items = rng.sample(track_ids, rng.randint(1, min(tracks, 500)))
+            master = ""
+
+        f.write(PLAYLIST_HEAD.format(
+            name=escape(name),
+            master=master,
+            playlist_id=100000 + i,
+            persistent_id=rng.getrandbits(64)
+        ))
+        for track_id in items:
+            f.write(PLAYLIST_ITEM.format(track_id=track_id))
+
+        f.write(PLAYLIST_TAIL)
+
+    f.write(FOOTER)
+
+
+def generate_library(path: Path, **kwargs) -> Path:
+    """Writes a synthetic library export to path, see write_library for the
+        keyword arguments.
+
+        :param path: the file to write.
+        :returns: the path written.
+    """
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8") as f:
+        write_library(f, **kwargs)
+
+    return path
+
+
+def main(args: List[str]) -> int:
+    parser = ArgumentParser(description="Generates a synthetic iTunes® "
+                            "library export for benchmarking.")
+    parser.add_argument("path", type=Path, help="the xml file to write")
+    parser.add_argument("--tracks", type=int, default=1000)
+    parser.add_argument("--playlists", type=int, default=1)
+    parser.add_argument("--unicode-density", type=float, default=0.1)
+    parser.add_argument("--path-depth", type=int, default=0)
+    parser.add_argument("--artists", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    ns = parser.parse_args(args)
+
+    generate_library(
+        ns.path,
+        tracks=ns.tracks,
+        playlists=ns.playlists,
+        unicode_density=ns.unicode_density,
+        path_depth=ns.path_depth,
+        artists=ns.artists,
+        seed=ns.seed
+    )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
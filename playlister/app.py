@@ -8,20 +8,30 @@ import sys
 import re
 import os.path
 
-from time import time
-from datetime import timedelta
+from time import perf_counter, process_time
 from urllib.parse import unquote, quote
 from pathlib import Path
-from typing import Dict, Optional, List, Tuple
+from io import StringIO
+from typing import (
+    Any, BinaryIO, Callable, Deque, Dict, Optional, Iterable, Iterator, List,
+    Mapping, Set, TextIO, Tuple, Union
+)
 from functools import partial
+from collections import OrderedDict, deque
+from contextlib import ExitStack, closing, redirect_stdout
 
-from playlister.cli import parse_args
-from playlister.files import glob_xml_files, load_plist
-from playlister.playlister_utils import pipe
-from playlister.m3u import to_m3u_track, to_m3u_list
-from playlister.xspf import to_xspf_track, to_xspf_list
-
-start = time()
+from playlister.cli import parse_args, parse_serve_args
+from playlister.files import (
+    CHUNK_SIZE, find_xml_files, glob_xml_files, is_included, load_plist,
+    load_library
+)
+from playlister.track import Track
+from playlister.cache import TrackCache, DEFAULT_CACHE_SIZE
+from playlister.remap import Remapper, LocationDecoder, load_rules
+from playlister.stats import Stats, TimedWriter
+from playlister.output import OutputFile
+from playlister.playlister_utils import pipe, safe_filename
+from playlister.formats import load_format, UnknownOutputFormatError
 
 ITUNES_PATH = re.compile(
     # windows and mac both do Users-delimiter-Username
@@ -44,22 +54,27 @@ class NoTargetPathError(Exception):
     pass
 
 
-class UnknownOutputFormatError(Exception):
-    """Error raised for unknown playlist type"""
+class NoMusicPathError(Exception):
+    """Error raised when verifying without a music path to verify against.
+    """
 
     pass
 
 
 def replace_music_path(
     music_path: Path,
-    track: Dict[str, str]
-) -> Dict[str, str]:
+    track: Mapping[str, Any]
+) -> Track:
     """Takes a track record and changes the location to accurately
-        reflect the new path instead of the iTunes path.
+        reflect the new path instead of the iTunes path. The record is
+        copied rather than modified, as it may be shared between playlists.
+        Conversions go through :py:class:`remap.Remapper` instead, which
+        handles more layouts and custom rules.
 
         :param music_path: the path to the music files on the target machine.
-        :param track: the record for the track to update.
-        :returns: the updated track record.
+        :param track: the record for the track to update, a Track or a
+            plist dict.
+        :returns: the updated copy of the track record, as a Track.
     """
 
     # unquoted = unquote(track.get("Location", "")[7:]) + os.path.sep
@@ -71,127 +86,1820 @@ def replace_music_path(
     unquoted = unquote(track.get("Location", "")[7:])
     oldPath = re.sub(ITUNES_PATH, "", unquoted)
     newPath = os.path.join(music_path, oldPath)
-    track["Location"] = quote(str(newPath))
 
-    return track
+    return Track(track, Location=quote(str(newPath)))
 
 
-def playlister(
-    target_path: Path,
-    output_path: Path,
+def get_converters(
     list_type: str,
     music_path: Optional[Path] = None,
-    verbose: Optional[bool] = False
-) -> List[Tuple[Path, str]]:
-    """Main function for altering playlists.
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None
+) -> Tuple[
+    Callable[[Dict[str, str]], str],
+    Callable[[TextIO, str, Iterable[str]], None]
+]:
+    """Builds the track converter and list writer for a list type.
 
-        :param target_path: the path to the xml file/directory.
-        :param output_path: the path to write the modified lists to.
         :param list_type: the list type, one of xspf, m3u, m3u8.
-        :param music_path: the path to the music files, e.g. if converting
-            lists meant to be played on another device.
+        :param music_path: the path to the music files, if relocating them.
+        :param cache: caches the converted tracks, if given.
+        :param remapper: rewrites the track locations, defaults to mapping
+            the standard library layouts to music_path if that's given.
+        :returns: a tuple of (track converter, list writer).
+        :raises: UnknownOutputFormatError
+    """
+
+    if remapper is None and music_path:
+        remapper = Remapper(music_path=music_path)
+
+    conversions = []
+    if remapper is not None:
+        conversions.append(remapper.remap_track)
+
+    output_format = load_format(list_type)
+    conversions.append(output_format.to_track)
+
+    convert_track = pipe(*conversions)
+    if cache is not None:
+        convert_track = cache.wrap(
+            convert_track,
+            conversions[-1].__name__,
+            remapper.rules if remapper else None
+        )
+
+    return convert_track, output_format.write_list
+
+
+def list_types_of(list_type: Union[str, Iterable[str]]) -> List[str]:
+    """
+        :param list_type: a list type, or several.
+        :returns: the list types as a list, without repeats.
+    """
+
+    if isinstance(list_type, str):
+        return [list_type]
+
+    return list(OrderedDict.fromkeys(list_type))
+
+
+def get_writers(
+    list_type: Union[str, Iterable[str]],
+    music_path: Optional[Path] = None,
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None,
+    split: Optional[bool] = False
+) -> Tuple[
+    Optional[Callable[[Mapping[str, Any]], Mapping[str, Any]]],
+    List[Tuple[
+        str,
+        Callable[[Mapping[str, Any]], str],
+        Callable[[TextIO, str, Iterable[str]], None]
+    ]]
+]:
+    """Builds the converters for one or more list types. With several, the
+        track locations are rewritten by one preparer shared between the
+        formats, whose results the track cache keeps for the next format,
+        rather than by each format's converter.
+
+        :param list_type: the list type, or a list of them.
+        :param music_path: the path to the music files, if relocating them.
+        :param cache: caches the rewritten and converted tracks, if given.
+        :param remapper: rewrites the track locations, defaults to mapping
+            the standard library layouts to music_path if that's given.
+        :param split: rewrite the locations in the preparer even with a
+            single list type, e.g. to check them before converting.
+        :returns: a tuple of (track preparer or None, [(list type, track
+            converter, list writer)]). The preparer, if any, must be applied
+            to each track before the converters.
+        :raises: UnknownOutputFormatError
+    """
+
+    list_types = list_types_of(list_type)
+    if len(list_types) == 1 and not split:
+        return None, [
+            (list_types[0],) +
+            get_converters(list_types[0], music_path, cache, remapper)
+        ]
+
+    if remapper is None and music_path:
+        remapper = Remapper(music_path=music_path)
+
+    prepare = None
+    if remapper is not None:
+        prepare = remapper.remap_track
+        if cache is not None:
+            prepare = cache.wrap(prepare, "remap_track", remapper.rules)
+
+    return prepare, [
+        (list_type,) + get_converters(list_type, None, cache)
+        for list_type in list_types
+    ]
+
+
+def iter_playlists(
+    orig_file: Path,
+    new_path: Path,
+    list_type: str,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False,
+    stats: Optional[Stats] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    source: Optional[BinaryIO] = None
+) -> Iterator[Tuple[Path, str, List[Dict[str, str]]]]:
+    """Loads the playlist(s) from a single xml file.
+
+        :param orig_file: the xml file to load.
+        :param new_path: the output file, or in library mode the output
+            directory.
+        :param list_type: the list type, used as the file extension.
+        :param library: load every playlist in a full library export.
         :param verbose: toggles verbose output.
-        :returns: List of tuples in the form (output_filepath, contents)
-        :raises: NoTargetPathError, OSError, UnknownOutputFormatError
+        :param stats: records the parse time and bytes read, if given.
+        :param snapshot: load the xml file from its snapshot when that's up
+            to date, otherwise parse it and write one.
+        :param index: an SQLite index file to load the xml file into, if
+            it has changed since it was last indexed, and then read the
+            tracks back from in batches, instead of holding them all in
+            memory.
+        :param source: the xml file's contents, already opened, to parse
+            instead of opening it. Not used with snapshot or index.
+        :returns: an iterator of (output path, list name, tracks) tuples.
+    """
+
+    stats = stats or Stats(False)
+    stats.count("bytes_read", orig_file.stat().st_size)
+
+    if index:
+        from playlister.index import LibraryIndex
+
+        # the tracks are read from the index as they're written out
+        with LibraryIndex(index) as db:
+            with stats.timer("parse"):
+                updated = db.update(orig_file)
+                if verbose and updated:
+                    print("Indexed {}.".format(orig_file.resolve()))
+
+                playlists = db.playlists(orig_file, library)
+
+            yield from _name_playlists(
+                orig_file, new_path, list_type, library, playlists
+            )
+
+        return
+
+    if snapshot:
+        from playlister.snapshot import load_playlists
+
+        with stats.timer("parse"):
+            playlists = load_playlists(orig_file, library, verbose)
+
+    elif library:
+        with stats.timer("parse"):
+            playlists = load_library(orig_file, verbose, source)
+
+    else:
+        with stats.timer("parse"):
+            playlists = [("", load_plist(orig_file, verbose, source))]
+
+    yield from _name_playlists(
+        orig_file, new_path, list_type, library, playlists
+    )
+
+
+def unique_file_name(name: str, seen: Set[str]) -> str:
+    """Turns a playlist name into a file name, without an extension.
+        Playlist names aren't unique in a library, so repeats are numbered.
+
+        :param name: the playlist name.
+        :param seen: the file names given out so far, in library order.
+            The new one is added to it.
+        :returns: the file name.
+    """
+
+    file_name = base_name = safe_filename(name)
+    duplicates = 1
+    while file_name in seen:
+        duplicates += 1
+        file_name = "{} ({})".format(base_name, duplicates)
+
+    seen.add(file_name)
+    return file_name
+
+
+def _name_playlists(
+    orig_file: Path,
+    new_path: Path,
+    list_type: str,
+    library: bool,
+    playlists: Iterable[Tuple[str, Iterable[Dict[str, Any]]]]
+) -> Iterator[Tuple[Path, str, Iterable[Dict[str, Any]]]]:
+    """Pairs loaded playlists up with their output paths, see
+        iter_playlists.
+    """
+
+    if not library:
+        list_name = orig_file.name.split(".")[0]
+        for _, tracks in playlists:
+            yield new_path, list_name, tracks
+            return
+
+        yield new_path, list_name, []
+        return
+
+    names = set()  # type: Set[str]
+    for list_name, tracks in playlists:
+        file_name = unique_file_name(list_name, names)
+        new_file = new_path / "{}.{}".format(file_name, list_type)
+        yield new_file, list_name, tracks
+
+
+def _iter_outputs(
+    orig_file: Path,
+    new_path: Path,
+    list_type: Union[str, Iterable[str]],
+    music_path: Optional[Path] = None,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False,
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None,
+    stats: Optional[Stats] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    targets: Optional[List[Tuple[Path, List[str], Remapper]]] = None,
+    verifier: Optional[Any] = None,
+    relinker: Optional[Any] = None,
+    source: Optional[BinaryIO] = None
+) -> Iterator[Tuple[
+    Path,
+    str,
+    Iterable[Mapping[str, Any]],
+    Callable[[Mapping[str, Any]], str],
+    Callable[[TextIO, str, Iterable[str]], None]
+]]:
+    """Loads the playlist(s) from a single xml file, once, and pairs each
+        one up with every list type asked for, see convert_file for the
+        parameters. With several list types, the other outputs go next to
+        the first one with their own extension. The relinker and verifier,
+        if any, only apply to the first target, which music_path applies
+        to. The tracks are prepared as each output is written rather than
+        up front, so a playlist is never held in memory twice.
+
+        :returns: an iterator of (output path, list name, tracks, track
+            converter, list writer) tuples.
+        :raises: UnknownOutputFormatError
+    """
+
+    stats = stats or Stats(False)
+
+    # (output path, track preparer, [(list type, converter, writer)])
+    outputs = []
+    for target_path, target_type, target_remapper in [
+        (new_path, list_type, remapper)
+    ] + list(targets or []):
+        prepare, writers = get_writers(
+            target_type,
+            music_path if target_path is new_path else None,
+            cache,
+            target_remapper,
+            bool(verifier or relinker) and target_path is new_path
+        )
+
+        outputs.append((
+            target_path,
+            stats.timed("convert", prepare) if prepare else None,
+            [
+                (output_type, stats.timed("convert", convert), write_list)
+                for output_type, convert, write_list in writers
+            ]
+        ))
+
+    for new_file, list_name, tracks in iter_playlists(
+        orig_file,
+        new_path,
+        outputs[0][2][0][0],
+        library,
+        verbose,
+        stats,
+        snapshot,
+        index,
+        source
+    ):
+        for target_path, prepare, writers in outputs:
+            if target_path is new_path:
+                target_file = new_file
+
+            # the same file name in the target's own directory
+            elif library:
+                target_file = target_path / new_file.name
+
+            else:
+                target_file = target_path
+
+            steps = [prepare] if prepare else []
+            check = None
+            if target_path is new_path:
+                if relinker:
+                    steps.append(
+                        stats.timed("relink", relinker.relink_track)
+                    )
+
+                if verifier:
+                    check = partial(
+                        _verified,
+                        verifier=verifier,
+                        playlist=str(target_file),
+                        stats=stats
+                    )
+
+            prepared = (
+                _PreparedTracks(tracks, steps, check) if steps or check
+                else tracks
+            )
+
+            for i, (output_type, convert, write_list) in enumerate(writers):
+                yield (
+                    target_file.with_suffix("." + output_type)
+                    if i or target_path is not new_path else target_file,
+                    list_name,
+                    prepared,
+                    convert,
+                    write_list
+                )
+
+
+class _PreparedTracks(object):
+    """The tracks of one playlist for one target, rewritten as they're
+        iterated rather than all at once. Each writer iterates them again;
+        the first pass also verifies them, if asked to.
+
+        :param tracks: the loaded tracks, iterable more than once.
+        :param steps: the functions to apply to each track, in order.
+        :param check: wraps the first pass's iterator, e.g. _verified.
+    """
+
+    def __init__(
+        self,
+        tracks: Iterable[Mapping[str, Any]],
+        steps: List[Callable[[Mapping[str, Any]], Mapping[str, Any]]],
+        check: Optional[Callable[..., Iterator[Mapping[str, Any]]]] = None
+    ):
+        self.tracks = tracks
+        self.step = pipe(*steps) if steps else None
+        self.check = check
+
+    def __iter__(self) -> Iterator[Mapping[str, Any]]:
+        tracks = (
+            map(self.step, self.tracks) if self.step else iter(self.tracks)
+        )
+        if self.check:
+            check, self.check = self.check, None
+            return check(tracks)
+
+        return tracks
+
+
+def _verified(
+    tracks: Iterator[Mapping[str, Any]],
+    verifier: Any,
+    playlist: str,
+    stats: Stats
+) -> Iterator[Mapping[str, Any]]:
+    """Passes a playlist's tracks on as the verifier checks them, counting
+        the missing ones once they run out.
+
+        :param tracks: the rewritten tracks.
+        :param verifier: the verify.Verifier.
+        :param playlist: the playlist, as it's to be reported.
+        :param stats: times the checks and counts the missing tracks.
+        :returns: an iterator of the same tracks.
+    """
+
+    missing = []  # type: List[str]
+    checked = verifier.checking(playlist, tracks, missing)
+    next_track = stats.timed("verify", next)
+
+    track = next_track(checked, None)
+    while track is not None:
+        yield track
+        track = next_track(checked, None)
+
+    stats.count("missing", len(missing))
+
+
+def _counted(
+    tracks: Iterable[Mapping[str, Any]],
+    stats: Stats
+) -> Iterator[Mapping[str, Any]]:
+    """Counts a playlist's tracks as they're written, rather than asking
+        for its length, which may take a query.
+
+        :param tracks: the tracks.
+        :param stats: counts them once they run out.
+        :returns: an iterator of the same tracks.
+    """
+
+    count = 0
+    for track in tracks:
+        count += 1
+        yield track
+
+    stats.count("tracks", count)
+
+
+def convert_file(
+    orig_file: Path,
+    new_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False,
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None,
+    stats: Optional[Stats] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    targets: Optional[List[Tuple[Path, List[str], Remapper]]] = None,
+    verifier: Optional[Any] = None,
+    relinker: Optional[Any] = None
+) -> List[Tuple[Path, str]]:
+    """Loads a single xml file and converts the playlist(s) in it.
+
+        :param orig_file: the xml file to convert.
+        :param new_path: the output file, or in library mode the output
+            directory.
+        :param list_type: the list type, one of xspf, m3u, m3u8, or a list
+            of them.
+        :param music_path: the path to the music files, if relocating them.
+        :param library: convert every playlist in a full library export.
+        :param verbose: toggles verbose output.
+        :param cache: caches the converted tracks, if given.
+        :param remapper: rewrites the track locations, if given.
+        :param stats: records timings and counts, if given.
+        :param snapshot: read the xml file via its snapshot, see
+            iter_playlists.
+        :param index: read the xml file via an SQLite index, see
+            iter_playlists.
+        :param targets: more (output path, list types, remapper) targets
+            to render the same playlists to, e.g. one per profile. Their
+            output paths are directories in library mode, files otherwise.
+        :param verifier: a verify.Verifier to check the rewritten track
+            locations of each playlist with, if given.
+        :param relinker: a relink.Relinker to repair the rewritten track
+            locations that don't exist with, if given. Runs before the
+            verifier.
+        :returns: a list of (output path, contents) tuples.
+        :raises: UnknownOutputFormatError
+    """
+
+    return list(_iter_converted(
+        orig_file,
+        new_path,
+        list_type,
+        music_path,
+        library,
+        verbose,
+        cache,
+        remapper,
+        stats,
+        snapshot,
+        index,
+        targets,
+        verifier,
+        relinker
+    ))
+
+
+def _iter_converted(
+    orig_file: Path,
+    new_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False,
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None,
+    stats: Optional[Stats] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    targets: Optional[List[Tuple[Path, List[str], Remapper]]] = None,
+    verifier: Optional[Any] = None,
+    relinker: Optional[Any] = None,
+    source: Optional[BinaryIO] = None
+) -> Iterator[Tuple[Path, str]]:
+    """Same as convert_file, but yields each playlist as soon as it's
+        rendered, so only one is held in memory.
+
+        :param source: see iter_playlists.
+        :returns: an iterator of (output path, contents) tuples.
+        :raises: UnknownOutputFormatError
+    """
+
+    stats = stats or Stats(False)
+
+    for new_file, list_name, tracks, convert_track, write_list in (
+        _iter_outputs(
+            orig_file,
+            new_path,
+            list_type,
+            music_path,
+            library,
+            verbose,
+            cache,
+            remapper,
+            stats,
+            snapshot,
+            index,
+            targets,
+            verifier,
+            relinker,
+            source
+        )
+    ):
+        buffer = StringIO()
+        with stats.timer("render"):
+            write_list(buffer, list_name, map(
+                convert_track,
+                _counted(tracks, stats) if stats.enabled else tracks
+            ))
+
+        contents = buffer.getvalue()
+
+        stats.count("playlists")
+        stats.count("bytes_written", len(contents.encode("utf-8")))
+
+        yield new_file, contents
+
+
+def write_file(
+    orig_file: Path,
+    new_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False,
+    cache: Optional[TrackCache] = None,
+    remapper: Optional[Remapper] = None,
+    stats: Optional[Stats] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    targets: Optional[List[Tuple[Path, List[str], Remapper]]] = None,
+    verifier: Optional[Any] = None,
+    relinker: Optional[Any] = None,
+    archive: Optional[Any] = None
+) -> List[Path]:
+    """Loads a single xml file and streams the converted playlist(s) in it
+        straight to disk, one track at a time.
+
+        :param orig_file: the xml file to convert.
+        :param new_path: the output file, or in library mode the output
+            directory.
+        :param list_type: the list type, one of xspf, m3u, m3u8, or a list
+            of them.
+        :param music_path: the path to the music files, if relocating them.
+        :param library: convert every playlist in a full library export.
+        :param verbose: toggles verbose output.
+        :param cache: caches the converted tracks, if given.
+        :param remapper: rewrites the track locations, if given.
+        :param stats: records timings and counts, if given.
+        :param snapshot: read the xml file via its snapshot, see
+            iter_playlists.
+        :param index: read the xml file via an SQLite index, see
+            iter_playlists.
+        :param targets: more (output path, list types, remapper) targets
+            to render the same playlists to, e.g. one per profile. Their
+            output paths are directories in library mode, files otherwise.
+        :param verifier: a verify.Verifier to check the rewritten track
+            locations of each playlist with, if given.
+        :param relinker: a relink.Relinker to repair the rewritten track
+            locations that don't exist with, if given. Runs before the
+            verifier.
+        :param archive: an archive.Archive to add the playlists to instead
+            of writing them to their output paths.
+        :returns: the paths written, or that would have been.
+        :raises: UnknownOutputFormatError, OSError
+    """
+
+    stats = stats or Stats(False)
+
+    written = []
+    for new_file, list_name, tracks, convert_track, write_list in (
+        _iter_outputs(
+            orig_file,
+            new_path,
+            list_type,
+            music_path,
+            library,
+            verbose,
+            cache,
+            remapper,
+            stats,
+            snapshot,
+            index,
+            targets,
+            verifier,
+            relinker
+        )
+    ):
+        if verbose:
+            print("Writing {}...".format(str(new_file)))
+
+        output = archive.entry(new_file) if archive else OutputFile(new_file)
+        with stats.timer("write"):
+            if not archive:
+                new_file.parent.mkdir(parents=True, exist_ok=True)
+
+            f = output.open()
+
+        try:
+            with stats.timer("render"):
+                write_list(
+                    TimedWriter(f, stats) if stats.enabled else f,
+                    list_name,
+                    map(
+                        convert_track,
+                        _counted(tracks, stats) if stats.enabled else tracks
+                    )
+                )
+
+        except BaseException:
+            output.discard()
+            raise
+
+        with stats.timer("write"):
+            changed = output.commit()
+
+        written.append(new_file)
+
+        stats.count("playlists")
+        stats.count(
+            "bytes_written",
+            output.size if archive else new_file.stat().st_size
+        )
+        stats.count("written" if changed else "unchanged")
+
+    return written
+
+
+def _run_file_job(
+    job: Tuple[Callable[..., Any], Tuple, Dict[str, Any]]
+) -> Tuple[Any, Optional[str]]:
+    """Runs a per-file function, catching the error so that one bad file
+        doesn't take down the whole batch.
+
+        :param job: a tuple of (function, positional arguments, keyword
+            arguments).
+        :returns: a tuple of (result, error message or None).
+    """
+
+    func, args, kwargs = job
+    try:
+        return func(*args, **kwargs), None
+
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+
+def _run_pooled_file_job(
+    job: Tuple[Callable[..., Any], Tuple, Dict[str, Any]]
+) -> Tuple[Any, Optional[str], Dict[str, Any]]:
+    """Runs a per-file function in a worker process. The worker's copies of
+        the cache, remapper and stats don't make it back to the parent, so
+        their state is returned alongside the result.
+
+        The jobs of a chunk are unpickled together and share those copies,
+        so the state returned is only this job's: the stats are fresh, the
+        cache counters are the difference made by this job and the other
+        state is cleared before it runs. The cache's contents are kept.
+
+        :param job: a tuple of (function, positional arguments, keyword
+            arguments).
+        :returns: a tuple of (result, error message or None, state), with
+            the cache counters, unmatched locations of each remapper,
+            relinked and missing tracks and stats in state.
+    """
+
+    func, args, kwargs = job
+    kwargs = dict(kwargs, stats=Stats(kwargs["stats"].enabled))
+    cache = kwargs["cache"]
+    remappers = [kwargs["remapper"]] + [
+        remapper for _, _, remapper in kwargs.get("targets") or []
+    ]
+
+    verifier = kwargs.get("verifier")
+    relinker = kwargs.get("relinker")
+    for each in remappers:
+        if each:
+            each.unmatched.clear()
+
+    if verifier:
+        verifier.missing.clear()
+
+    if relinker:
+        relinker.relinked.clear()
+
+    before = (cache.hits, cache.misses, cache.evictions)
+    value, error = _run_file_job((func, args, kwargs))
+
+    return value, error, {
+        "cache": tuple(
+            after - start for after, start in zip(
+                (cache.hits, cache.misses, cache.evictions),
+                before
+            )
+        ),
+        "missing": verifier.missing if verifier else {},
+        "relinked": relinker.relinked if relinker else {},
+        "unmatched": [
+            list(remapper.unmatched) if remapper else []
+            for remapper in remappers
+        ],
+        "stats": kwargs["stats"].as_dict()
+    }
+
+
+# the end of a file's chunks in a pipelined run
+_END_OF_FILE = object()
+
+
+class _FileDone(object):
+    """Follows a file's playlists through a pipelined run, with the error
+        that stopped its conversion, if any.
+    """
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: Optional[str] = None):
+        self.error = error
+
+
+def _streams(job: Tuple[Callable[..., Any], Tuple, Dict[str, Any]]) -> bool:
+    """Whether a job's xml file is parsed as it's read, rather than loaded
+        from a snapshot or an index.
+    """
+
+    return not (job[2].get("snapshot") or job[2].get("index"))
+
+
+def _read_stage(
+    jobs: Iterator[Tuple[Callable[..., Any], Tuple, Dict[str, Any]]]
+) -> Iterator[Any]:
+    """The read stage of a pipelined run. Passes on each job, followed by
+        its xml file's raw contents a chunk at a time and then
+        _END_OF_FILE, so the converter parses the file as it comes in
+        rather than reading it again.
+
+        :param jobs: tuples of (function, positional arguments, keyword
+            arguments), with the xml file as the first positional argument.
+        :returns: an iterator of jobs, chunks and end markers. An error
+            reading the file takes the place of its remaining chunks and
+            its end marker.
+    """
+
+    for job in jobs:
+        yield job
+        if _streams(job):
+            try:
+                with job[1][0].open("rb") as f:
+                    yield from iter(partial(f.read, CHUNK_SIZE), b"")
+
+            # the converter will report it, and it ends the file
+            except OSError as e:
+                yield e
+                continue
+
+        yield _END_OF_FILE
+
+
+def _convert_stage(items: Iterator[Any]) -> Iterator[Any]:
+    """The convert stage of a pipelined run. Parses each file from its
+        chunks and passes on its playlists one at a time, as (output path,
+        contents) tuples, followed by a _FileDone.
+
+        :param items: the read stage's output.
+        :returns: an iterator of playlists and _FileDones.
+    """
+
+    from playlister.pipeline import ChunkReader
+
+    for func, args, kwargs in items:
+        reader = ChunkReader(items, _END_OF_FILE)
+        if _streams((func, args, kwargs)):
+            kwargs = dict(kwargs, source=reader)
+
+        error = None
+        try:
+            yield from func(*args, **kwargs)
+
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+
+        reader.finish()
+        yield _FileDone(error)
+
+
+def _write_stage(
+    items: Iterator[Any],
+    verbose: Optional[bool] = False,
+    stats: Optional[Stats] = None,
+    archive: Optional[Any] = None
+) -> Iterator[Tuple[Optional[List[Path]], Optional[str]]]:
+    """The write stage of a pipelined run. Writes out each playlist as it
+        comes in.
+
+        :param items: the convert stage's output.
+        :param verbose: toggles verbose output.
+        :param stats: records the write time, if given.
+        :param archive: an archive.Archive to add the playlists to instead,
+            if given.
+        :returns: an iterator of (paths written, error message or None)
+            tuples, one per file.
+    """
+
+    written = []  # type: List[Path]
+    error = None
+    for item in items:
+        if isinstance(item, _FileDone):
+            error = error or item.error
+            yield (None, error) if error else (written, None)
+            written = []
+            error = None
+            continue
+
+        if error:
+            continue
+
+        new_file, contents = item
+        try:
+            _write_contents(new_file, contents, verbose, stats, archive)
+            written.append(new_file)
+
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+
+
+def _write_contents(
+    new_file: Path,
+    contents: str,
+    verbose: Optional[bool] = False,
+    stats: Optional[Stats] = None,
+    archive: Optional[Any] = None
+):
+    """Writes out one converted playlist, see _write_converted.
+
+        :raises: OSError
+    """
+
+    stats = stats or Stats(False)
+    if verbose:
+        print("Writing {}...".format(str(new_file)))
+
+    with stats.timer("write"):
+        if archive:
+            output = archive.entry(new_file)
+
+        else:
+            new_file.parent.mkdir(parents=True, exist_ok=True)
+            output = OutputFile(new_file)
+
+        try:
+            output.open().write(contents)
+
+        except BaseException:
+            output.discard()
+            raise
+
+        changed = output.commit()
+
+    stats.count("written" if changed else "unchanged")
+
+
+def _write_converted(
+    result: Tuple[Optional[List[Tuple[Path, str]]], Optional[str]],
+    verbose: Optional[bool] = False,
+    stats: Optional[Stats] = None,
+    archive: Optional[Any] = None
+) -> Tuple[Optional[List[Path]], Optional[str]]:
+    """Writes out a file's converted playlists, from convert_file, e.g. in
+        this process after a worker converted them.
+
+        :param result: a tuple of (convert_file result, error message or
+            None).
+        :param verbose: toggles verbose output.
+        :param stats: records the write time, if given.
+        :param archive: an archive.Archive to add the playlists to instead,
+            if given.
+        :returns: a tuple of (paths written, error message or None).
+    """
+
+    converted, error = result
+    if error:
+        return None, error
+
+    written = []
+    try:
+        for new_file, contents in converted:
+            _write_contents(new_file, contents, verbose, stats, archive)
+            written.append(new_file)
+
+    except Exception as e:
+        return None, "{}: {}".format(type(e).__name__, e)
+
+    return written, None
+
+
+def _timed_iter(
+    iterator: Iterator[Any],
+    stats: Stats,
+    stage: str
+) -> Iterator[Any]:
+    """Times getting each item from an iterator as part of a stage.
+
+        :param iterator: e.g. a search of a directory tree.
+        :param stats: the stats to record the time in.
+        :param stage: the stage to count the time towards.
+        :returns: an iterator of the same items.
+    """
+
+    while True:
+        with stats.timer(stage):
+            try:
+                item = next(iterator)
+
+            except StopIteration:
+                return
+
+        yield item
+
+
+def _changed_files(
+    orig_files: Iterable[Path],
+    manifest: Any,
+    verbose: Optional[bool],
+    stats: Stats
+) -> Iterator[Path]:
+    """Leaves out the xml files whose outputs are up to date.
+
+        :param orig_files: the xml files.
+        :param manifest: the manifest.Manifest of the last run.
+        :param verbose: print the files skipped.
+        :param stats: counts the files skipped.
+        :returns: an iterator of the other xml files.
+    """
+
+    for orig_file in orig_files:
+        if manifest.is_current(orig_file):
+            if verbose:
+                print("Skipping unchanged {}".format(orig_file.name))
+
+            stats.count("skipped")
+            continue
+
+        yield orig_file
+
+
+def _run_files(
+    func: Callable[..., Any],
+    target_path: Path,
+    output_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    verbose: Optional[bool] = False,
+    library: Optional[bool] = False,
+    jobs: Optional[int] = 1,
+    incremental: Optional[bool] = False,
+    cache_size: Optional[int] = DEFAULT_CACHE_SIZE,
+    remap: Optional[List[Tuple[str, str]]] = None,
+    remap_file: Optional[Path] = None,
+    stats: Union[str, Stats, None] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    pipeline: Optional[bool] = False,
+    profiles: Optional[Path] = None,
+    verify: Optional[bool] = False,
+    relink: Optional[bool] = False,
+    only: Optional[List[Path]] = None,
+    warm: Optional[Dict[str, Any]] = None,
+    archive: Optional[Any] = None,
+    recursive: Optional[bool] = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None
+) -> Iterator[Any]:
+    """Runs func (convert_file or write_file) over every xml file found at
+        target_path, see playlister for the parameters. When incremental,
+        func must be write_file: files recorded as unchanged in the output
+        directory's manifest are skipped and the rest are recorded. Every
+        file converted in this process shares one track cache, with jobs
+        each file sent to a worker process gets its own.
+
+        :param only: the xml files to convert instead of every one found
+            at target_path, e.g. the ones that changed while watching.
+        :param warm: state to keep between runs. The first run stores its
+            track cache, remap rules and, when verifying or relinking, the
+            music directory's index in it, later runs reuse them.
+        :param archive: an archive.Archive for write_file to add the
+            playlists to. Entries are named relative to the output
+            directory, or the one all the profiles' are in.
+        :param recursive: see playlister.
+        :param include: see playlister.
+        :param exclude: see playlister.
+
+        :returns: an iterator of the per-file results, in file order.
+        :raises: NoTargetPathError, OSError, UnknownOutputFormatError,
+            InvalidRuleError
     """
 
     output = None
-    conversions = []
+    wall_start = perf_counter()
+    cpu_start = process_time()
+
+    if isinstance(stats, Stats):
+        run_stats = stats
+        stats = None
+
+    else:
+        run_stats = Stats(bool(stats))
 
     if not target_path:
         raise NoTargetPathError("Must have target file/directory.")
 
-    if target_path.is_dir():
-        if verbose:
-            print("{} is a directory. Scanning for xml files...".format(
-                str(target_path)
-            ))
+    # a search of the tree is timed from wherever its files are consumed,
+    # which is another thread when pipelined
+    find_stats = Stats(run_stats.enabled)
+    target_dir = target_path.is_dir()
+
+    orig_files = [target_path]  # type: Iterable[Path]
+    if target_dir:
+        # the changed files a watcher saw, which the patterns still apply to
+        if only is not None:
+            orig_files = [
+                orig_file for orig_file in only
+                if is_included(orig_file, target_path, include, exclude)
+            ]
+
+        elif recursive or include or exclude:
+            if verbose:
+                print("{} is a directory. Searching it for xml files as "
+                      "they're converted...".format(str(target_path)))
+
+            # a stream, so the first files convert while the rest of the
+            # tree is searched
+            orig_files = _timed_iter(
+                find_xml_files(target_path, include, exclude, recursive),
+                find_stats,
+                "glob"
+            )
 
-        orig_files = glob_xml_files(target_path)
-        num_files = len(orig_files)
-        if not output_path.is_dir:
+        else:
+            if verbose:
+                print("{} is a directory. Scanning for xml files...".format(
+                    str(target_path)
+                ))
+
+            with run_stats.timer("glob"):
+                orig_files = glob_xml_files(target_path)
+
+        # a missing output directory is made as the playlists are written
+        if output_path.exists() and not output_path.is_dir():
             raise OSError("{} is not a directory.".format(str(output_path)))
 
-        if verbose:
-            print("done. Found {} xml files.".format(num_files))
+        if verbose and isinstance(orig_files, list):
+            print("done. Found {} xml files.".format(len(orig_files)))
 
-    else:
-        orig_files = [target_path]
-        if output_path.is_file():
-            output = [output_path]
+    # a single playlist's output path names its file, whether or not the
+    # file exists yet
+    elif (
+        not output_path.is_dir() and not library
+        and isinstance(list_type, str)
+    ):
+        output = output_path
 
-    if music_path:
-        conversions.append(
-            partial(replace_music_path, music_path)
-        )
+    # unknown until a search is done
+    num_files = (
+        len(orig_files) if isinstance(orig_files, list) else None
+    )  # type: Optional[int]
 
-    if list_type == "m3u" or list_type == "m3u8":
-        conversions.append(to_m3u_track)
-        convert_list = to_m3u_list
+    if jobs is not None and jobs < 1:
+        jobs = os.cpu_count() or 1
 
-    elif list_type == "xspf":
-        conversions.append(to_xspf_track)
-        convert_list = to_xspf_list
+    if warm:
+        rules, remapper, cache = warm["rules"], warm["remapper"], warm["cache"]
+        targets = warm["targets"]
 
     else:
-        raise UnknownOutputFormatError(
-            "Unknown list type {}.".format(list_type)
+        # rules given on the command line win over the ones from the file
+        rules = (
+            (load_rules(remap_file) if remap_file else []) + list(remap or [])
         )
+        remapper = None
+        if rules or music_path:
+            remapper = Remapper(rules, music_path)
 
-    convert = pipe(load_plist, partial(map, pipe(*conversions)))
+        # one (profile, remapper) per profile, the profile's own rules win
+        targets = []  # type: List[Tuple[Any, Optional[Remapper]]]
+        if profiles:
+            from playlister.profiles import load_profiles
 
-    converted = []
-    for i, orig_file in enumerate(orig_files):
-        if verbose:
-            print("Converting {}, {} of {}".format(
-                orig_file.name,
-                i + 1,
-                num_files
-            ))
+            # every profile's remapper decodes each location only once
+            decode = LocationDecoder(max(cache_size, 1))
+            for profile in load_profiles(profiles):
+                profile_rules = rules + profile.remap
+                targets.append((profile, Remapper(
+                    profile_rules,
+                    profile.music_path,
+                    decode
+                ) if profile_rules or profile.music_path else None))
 
-        list_name = orig_file.name.split(".")[0]
+        cache = TrackCache(cache_size)
+        if warm is not None:
+            warm.update(
+                rules=rules,
+                remapper=remapper,
+                cache=cache,
+                targets=targets
+            )
+
+    # profiles replace the list type, music path and output path, the
+    # first one is converted as usual and the rest are extra targets
+    names = [None]  # type: List[Optional[str]]
+    all_profiles = [profile for profile, _ in targets]
+    if targets:
+        output = None
+        names = [profile.name for profile in all_profiles]
+        (profile, remapper), targets = targets[0], targets[1:]
+        list_type, music_path = profile.list_type, profile.music_path
+        output_path = profile.output_path
+
+    remappers = [remapper] + [r for _, r in targets]
+    for each in remappers:
+        if each:
+            each.unmatched.clear()
+
+    # fail fast on an unknown list type, before any file is read
+    list_types = list_types_of(list_type)
+    for output_type in list_types + [
+        t for profile in all_profiles for t in profile.list_type
+    ]:
+        load_format(output_type)
+
+    manifest = None
+    if incremental:
+        from playlister.manifest import Manifest
+
+        options = {
+            "list_type": list_type,
+            "music_path": str(music_path) if music_path else None,
+            "library": bool(library),
+            "remap": [list(rule) for rule in rules]
+        }
+
+        if relink:
+            options["relink"] = True
+
+        if all_profiles:
+            options["profiles"] = [
+                [
+                    profile.name,
+                    str(profile.output_path),
+                    profile.list_type,
+                    str(profile.music_path) if profile.music_path else None,
+                    [list(rule) for rule in profile.remap]
+                ]
+                for profile in all_profiles
+            ]
+
+        manifest = Manifest(output.parent if output else output_path, options)
+
+        if num_files is None:
+            orig_files = _changed_files(
+                orig_files,
+                manifest,
+                verbose,
+                find_stats
+            )
+
+        else:
+            orig_files = list(
+                _changed_files(orig_files, manifest, verbose, run_stats)
+            )
+            num_files = len(orig_files)
+
+    verifier = relinker = None
+    if (verify or relink) and orig_files:
+        if not music_path:
+            raise NoMusicPathError(
+                "Verifying and relinking need a music path to check the "
+                "tracks against."
+            )
+
+        from playlister.verify import MusicIndex, Verifier
+
+        # a watch session scans the music directory on its first run only
+        if warm and "music_index" in warm:
+            music_index, relinker = warm["music_index"], warm["relinker"]
+            if relinker:
+                relinker.relinked.clear()
+
+        else:
+            from playlister.scan import scan_files
+
+            if verbose:
+                print("Indexing {}...".format(str(music_path)))
+
+            # one walk of the music directory, rather than a stat per track
+            with run_stats.timer("scan"):
+                paths = [entry.path for entry in scan_files(music_path)]
+                music_index = MusicIndex(paths, music_path)
+                if relink:
+                    from playlister.relink import Relinker
+
+                    relinker = Relinker(music_index, paths)
+
+            if verbose:
+                print("done. Found {} files.".format(len(music_index)))
+
+            if warm is not None:
+                warm.update(music_index=music_index, relinker=relinker)
+
+        if verify:
+            verifier = Verifier(music_index)
+
+    pooled = jobs and jobs > 1 and (num_files is None or num_files > 1)
+    writing = func is write_file
+    pipelined = pipeline and not pooled and writing
 
+    if archive is not None and archive.base is None:
+        archive.base = Path(os.path.commonpath(
+            [str(output.parent if output else output_path)] +
+            [str(profile.output_path) for profile in all_profiles]
+        ))
+
+    # workers can't share the archive, they convert and this process adds
+    # each file's playlists to it
+    archived_pool = pooled and writing and archive is not None
+    if archived_pool:
+        func = convert_file
+
+    # workers record into a fresh copy that is merged back per file, and
+    # the pipeline's threads each into their own, merged at the end
+    job_stats = Stats(run_stats.enabled) if pooled or pipelined else (
+        run_stats
+    )
+    write_stats = Stats(run_stats.enabled)
+
+    # the pipeline reads in one stage, converts in the next and writes in
+    # the last
+    if pipelined:
+        func = _iter_converted
+
+    def new_path_for(orig_file: Path, base: Path, first_type: str) -> Path:
         if output:
-            new_file = output[i]
+            return output
+
+        # several libraries each get their own directory
+        if library and target_dir:
+            return base / subdirectory_of(orig_file) / (
+                orig_file.name.split(".")[0]
+            )
+
+        if library:
+            return base
+
+        return base / subdirectory_of(orig_file) / "{}.{}".format(
+            orig_file.name.split(".")[0],
+            first_type
+        )
+
+    def subdirectory_of(orig_file: Path) -> Path:
+        # files found deeper in the tree keep their place in it, so e.g.
+        # every user's Library.xml gets its own output
+        try:
+            return orig_file.parent.relative_to(target_path)
+
+        except ValueError:
+            return Path()
+
+    # the files whose jobs were handed out, in order, with their manifest
+    # fingerprints, popped as their results come back
+    queued = deque()  # type: Deque[Tuple[Path, Optional[Dict[str, Any]]]]
+
+    def file_jobs() -> Iterator[Tuple[Any, ...]]:
+        for orig_file in orig_files:
+            queued.append((orig_file, fingerprint_of(orig_file)))
+            yield file_job(orig_file)
+
+    def fingerprint_of(orig_file: Path) -> Optional[Dict[str, Any]]:
+        # taken before the job runs, so a file that changes while it's
+        # converted is converted again next time
+        if not manifest:
+            return None
+
+        try:
+            return manifest.fingerprint(orig_file)
+
+        # the job fails on it too
+        except OSError:
+            return None
+
+    def file_job(orig_file: Path) -> Tuple[Any, ...]:
+        new_path = new_path_for(orig_file, output_path, list_types[0])
+        job = (
+            func,
+            (orig_file, new_path, list_type, music_path, library, verbose),
+            {
+                "cache": cache,
+                "remapper": remapper,
+                "stats": job_stats,
+                "snapshot": snapshot,
+                "index": index,
+                "verifier": verifier,
+                "relinker": relinker,
+                "targets": [
+                    (
+                        new_path_for(
+                            orig_file,
+                            profile.output_path,
+                            profile.list_type[0]
+                        ),
+                        profile.list_type,
+                        profile_remapper
+                    )
+                    for profile, profile_remapper in targets
+                ]
+            }
+        )
+
+        if func is write_file and archive is not None:
+            job[2]["archive"] = archive
+
+        return job
+
+    with ExitStack() as stack:
+        if pooled:
+            # only pay for importing multiprocessing when it's used
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=jobs)
+            )
+
+            # executor.map yields in submission order, keeping the output
+            # deterministic however the work is scheduled.
+            results = executor.map(
+                _run_pooled_file_job,
+                file_jobs(),
+                chunksize=max(1, (num_files or 0) // (jobs * 4))
+            )
+
+        elif pipelined:
+            from playlister.pipeline import StreamStage, pipeline as run_stages
+
+            results = stack.enter_context(closing(run_stages(file_jobs(), [
+                StreamStage(_read_stage),
+                StreamStage(_convert_stage),
+                StreamStage(partial(
+                    _write_stage,
+                    verbose=verbose,
+                    stats=write_stats,
+                    archive=archive
+                ))
+            ])))
 
         else:
-            new_file = Path(os.path.join(
+            results = map(_run_file_job, file_jobs())
+
+        for i, result in enumerate(results):
+            orig_file, fingerprint = queued.popleft()
+            value, error = result[:2]
+            if pooled:
+                state = result[2]
+                hits, misses, evictions = state["cache"]
+                cache.hits += hits
+                cache.misses += misses
+                cache.evictions += evictions
+                run_stats.merge(state["stats"])
+                if verifier:
+                    verifier.merge(state["missing"])
+
+                if relinker:
+                    relinker.relinked.update(state["relinked"])
+
+                for each, unmatched in zip(remappers, state["unmatched"]):
+                    if each:
+                        each.unmatched.update(
+                            (path, None) for path in unmatched
+                        )
+
+                if archived_pool:
+                    value, error = _write_converted(
+                        (value, error),
+                        verbose,
+                        run_stats,
+                        archive
+                    )
+
+            if error:
+                run_stats.count("failed")
+                print(
+                    "Failed to convert {}: {}".format(str(orig_file), error),
+                    file=sys.stderr
+                )
+                continue
+
+            run_stats.count("files")
+
+            if verbose:
+                print("Converted {}, {} of {}".format(
+                    orig_file.name,
+                    i + 1,
+                    num_files or "those found so far"
+                ))
+
+            if fingerprint:
+                manifest.record(orig_file, value, fingerprint)
+
+            yield value
+
+    if pipelined:
+        run_stats.merge(job_stats.as_dict())
+        run_stats.merge(write_stats.as_dict())
+
+    run_stats.merge(find_stats.as_dict())
+
+    if manifest:
+        manifest.save()
+
+    for name, each in zip(names, remappers):
+        report = each.report(verbose) if each else None
+        if report:
+            print(
+                "{}: {}".format(name, report) if name else report,
+                file=sys.stderr
+            )
+
+    for each in (relinker, verifier):
+        report = each.report(verbose) if each else None
+        if report:
+            print(report, file=sys.stderr)
+
+    if verbose and writing:
+        print("Wrote {} playlists, {} unchanged.".format(
+            run_stats.counters["written"],
+            run_stats.counters["unchanged"]
+        ))
+
+    if verbose and cache.hits + cache.misses:
+        print("Track cache: {} hits, {} misses.".format(
+            cache.hits,
+            cache.misses
+        ))
+
+    run_stats.stages["total"][0] += perf_counter() - wall_start
+    run_stats.stages["total"][1] += process_time() - cpu_start
+    if stats:
+        print(run_stats.report(stats), file=sys.stderr)
+
+
+def playlister(
+    target_path: Path,
+    output_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    verbose: Optional[bool] = False,
+    library: Optional[bool] = False,
+    jobs: Optional[int] = 1,
+    incremental: Optional[bool] = False,
+    cache_size: Optional[int] = DEFAULT_CACHE_SIZE,
+    remap: Optional[List[Tuple[str, str]]] = None,
+    remap_file: Optional[Path] = None,
+    stats: Union[str, Stats, None] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    watch: Optional[bool] = False,
+    pipeline: Optional[bool] = False,
+    profiles: Optional[Path] = None,
+    verify: Optional[bool] = False,
+    relink: Optional[bool] = False,
+    archive: Union[str, Path, None] = None,
+    archive_format: Optional[str] = None,
+    recursive: Optional[bool] = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None
+) -> List[Tuple[Path, str]]:
+    """Main function for altering playlists.
+
+        :param target_path: the path to the xml file/directory.
+        :param output_path: the path to write the modified lists to.
+        :param list_type: the list type, one of xspf, m3u, m3u8, or a list
+            of them to write every playlist in each of them, from a single
+            parse of the xml file.
+        :param music_path: the path to the music files, e.g. if converting
+            lists meant to be played on another device.
+        :param verbose: toggles verbose output.
+        :param library: treat each xml file as a full library export and
+            convert every playlist in it, writing them to output_path.
+        :param jobs: number of worker processes to convert files with, less
+            than 1 uses one per CPU. Files that fail to convert are reported
+            on stderr and left out of the results.
+        :param incremental: only used when writing, see write_playlists.
+        :param watch: only used when writing, see write_playlists.
+        :param pipeline: only used when writing, see write_playlists.
+        :param archive: only used when writing, see write_playlists.
+        :param archive_format: only used when writing, see
+            write_playlists.
+        :param cache_size: how many converted tracks to cache across the
+            playlists in this run, 0 disables the cache.
+        :param remap: (source prefix, destination prefix) rules for
+            rewriting track locations, the longest matching prefix wins.
+            Locations that match no rule are reported on stderr.
+        :param remap_file: a file of SOURCE=DESTINATION rules, one per line,
+            applied before the remap rules.
+        :param stats: either text or json to print the time spent in each
+            stage and counts of files, tracks and bytes to stderr at the
+            end of the run, or a Stats object to record them in.
+        :param snapshot: keep a binary snapshot next to each xml file and
+            load from it on later runs while the xml file is unchanged,
+            skipping the xml parse.
+        :param index: an SQLite file to index the xml files in, updating
+            each one only when it has changed, and to convert from with
+            bounded memory. Other tools can query the same file.
+        :param profiles: an INI file of named targets, each with its own
+            output path, list types, music path and remap rules, see
+            playlister.profiles. Every target is rendered from a single
+            parse of each xml file, in place of output_path, list_type and
+            music_path.
+        :param verify: check that every rewritten track location exists
+            under music_path, against an index of it built with a single
+            parallel walk, and report the missing tracks of each playlist
+            on stderr.
+        :param relink: point the rewritten track locations that don't
+            exist under music_path at the file they most likely refer to,
+            looked up by name in the same index, see playlister.relink.
+            The relinked tracks are reported on stderr.
+        :param recursive: when target_path is a directory, search its
+            subdirectories for xml files too, converting them as they're
+            found. Their outputs keep their place in the tree, relative to
+            output_path.
+        :param include: fnmatch patterns, only the xml files whose path
+            relative to target_path, or name, matches one are converted,
+            see files.find_xml_files.
+        :param exclude: fnmatch patterns for the xml files and directories
+            to leave out.
+        :returns: List of tuples in the form (output_filepath, contents)
+        :raises: NoTargetPathError, OSError, UnknownOutputFormatError,
+            InvalidRuleError, NoMusicPathError
+    """
+
+    return [
+        converted
+        for result in _run_files(
+            convert_file,
+            target_path,
+            output_path,
+            list_type,
+            music_path,
+            verbose,
+            library,
+            jobs,
+            False,
+            cache_size,
+            remap,
+            remap_file,
+            stats,
+            snapshot,
+            index,
+            profiles=profiles,
+            verify=verify,
+            relink=relink,
+            recursive=recursive,
+            include=include,
+            exclude=exclude
+        )
+        for converted in result
+    ]
+
+
+def write_playlists(
+    target_path: Path,
+    output_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    verbose: Optional[bool] = False,
+    library: Optional[bool] = False,
+    jobs: Optional[int] = 1,
+    incremental: Optional[bool] = False,
+    cache_size: Optional[int] = DEFAULT_CACHE_SIZE,
+    remap: Optional[List[Tuple[str, str]]] = None,
+    remap_file: Optional[Path] = None,
+    stats: Union[str, Stats, None] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    watch: Optional[bool] = False,
+    pipeline: Optional[bool] = False,
+    profiles: Optional[Path] = None,
+    verify: Optional[bool] = False,
+    relink: Optional[bool] = False,
+    archive: Union[str, Path, None] = None,
+    archive_format: Optional[str] = None,
+    recursive: Optional[bool] = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None
+) -> List[Path]:
+    """Same as playlister, but streams each converted playlist to disk as
+        soon as its file is converted instead of returning the contents.
+        When incremental, a manifest in the output directory records each
+        source's size, mtime, content hash and conversion options, and
+        sources that match it are skipped on later runs.
+
+        :param watch: after converting everything, keep running and
+            reconvert the xml files as they change, see watch_playlists.
+        :param pipeline: read, convert and write in separate threads
+            connected by bounded queues, so each file is parsed as its
+            chunks are read and each playlist is written while the next
+            is converted. Not used with jobs, where the worker processes
+            overlap them already.
+        :param archive: a zip or tar file to stream every playlist into,
+            instead of writing them to output_path, or - for stdout. They
+            keep their paths relative to output_path. Not used with watch
+            or incremental, since an archive is always written whole.
+        :param archive_format: one of zip, tar, tar.gz, tar.bz2 or tar.xz,
+            guessed from the archive's name if not given. Defaults to tar
+            on stdout.
+        :returns: the paths written.
+        :raises: NoTargetPathError, OSError, UnknownOutputFormatError,
+            InvalidRuleError
+    """
+
+    args = (
+        target_path,
+        output_path,
+        list_type,
+        music_path,
+        verbose,
+        library,
+        jobs,
+        incremental and not archive,
+        cache_size,
+        remap,
+        remap_file,
+        stats,
+        snapshot,
+        index,
+        pipeline,
+        profiles,
+        verify,
+        relink
+    )
+    search = {
+        "recursive": recursive,
+        "include": include,
+        "exclude": exclude
+    }
+
+    if archive:
+        from playlister.archive import STDOUT, open_archive
+
+        with ExitStack() as stack:
+            writer = stack.enter_context(
+                open_archive(archive, archive_format)
+            )
+
+            # the archive has stdout to itself
+            if str(archive) == STDOUT:
+                stack.enter_context(redirect_stdout(sys.stderr))
+
+            return [
+                path
+                for result in _run_files(
+                    write_file,
+                    *args,
+                    archive=writer,
+                    **search
+                )
+                for path in result
+            ]
+
+    if watch:
+        return watch_playlists(*args, **search)
+
+    return [
+        path
+        for result in _run_files(write_file, *args, **search)
+        for path in result
+    ]
+
+
+def watch_playlists(
+    target_path: Path,
+    output_path: Path,
+    list_type: Union[str, List[str]],
+    music_path: Optional[Path] = None,
+    verbose: Optional[bool] = False,
+    library: Optional[bool] = False,
+    jobs: Optional[int] = 1,
+    incremental: Optional[bool] = False,
+    cache_size: Optional[int] = DEFAULT_CACHE_SIZE,
+    remap: Optional[List[Tuple[str, str]]] = None,
+    remap_file: Optional[Path] = None,
+    stats: Union[str, Stats, None] = None,
+    snapshot: Optional[bool] = False,
+    index: Optional[Path] = None,
+    pipeline: Optional[bool] = False,
+    profiles: Optional[Path] = None,
+    verify: Optional[bool] = False,
+    relink: Optional[bool] = False,
+    stop: Optional[Callable[[], bool]] = None,
+    recursive: Optional[bool] = False,
+    include: Optional[List[str]] = None,
+    exclude: Optional[List[str]] = None
+) -> List[Path]:
+    """Same as write_playlists, then keeps running and reconverts only the
+        xml files that change, until interrupted with Ctrl-C. Changes are
+        picked up with inotify on Linux and by polling elsewhere, and are
+        debounced so a file is converted once it's done being written. The
+        track cache, remap rules and music directory index are kept warm
+        between conversions.
+
+        :param stop: checked while waiting, watching ends once it returns
+            True.
+        :param recursive: search the subdirectories on the first run, only
+            target_path itself is watched for changes.
+        :returns: the paths written, in the order they were written.
+        :raises: NoTargetPathError, OSError, UnknownOutputFormatError,
+            InvalidRuleError
+    """
+
+    from playlister.watch import open_watcher, watch
+
+    warm = {}  # type: Dict[str, Any]
+
+    def run(only: Optional[List[Path]] = None) -> List[Path]:
+        return [
+            path
+            for result in _run_files(
+                write_file,
+                target_path,
                 output_path,
-                "{}.{}".format(list_name, list_type)
-            ))
+                list_type,
+                music_path,
+                verbose,
+                library,
+                jobs,
+                incremental,
+                cache_size,
+                remap,
+                remap_file,
+                stats,
+                snapshot,
+                index,
+                pipeline,
+                profiles,
+                verify,
+                relink,
+                only,
+                warm,
+                recursive=recursive,
+                include=include,
+                exclude=exclude
+            )
+            for path in result
+        ]
 
-        if verbose:
-            print("Converting tracks...")
+    # watching starts before the first run, so the exports written while
+    # it converts are picked up once it's done
+    watcher = open_watcher(target_path)
+    try:
+        written = run()
 
-        contents = convert_list(list_name, convert(orig_file))
+    except BaseException:
+        watcher.close()
+        raise
+
+    def on_change(changed: List[Path]):
         if verbose:
-            print("done.")
+            print("Changed: {}".format(", ".join(p.name for p in changed)))
 
-        converted.append((new_file, contents))
+        written.extend(run(changed))
 
-    return converted
+    if verbose:
+        print("Watching {} for changes, Ctrl-C to stop.".format(
+            str(target_path)
+        ))
 
+    watch(target_path, on_change, watcher=watcher, stop=stop)
+    return written
 
-def main():
-    cli_args = parse_args(sys.argv[1:])
-    verbose = cli_args["verbose"]
-    converted = playlister(**cli_args)
-    num_files = len(converted)
 
-    for i, data in enumerate(converted):
-        path, contents = data
-        if verbose:
-            print("Writing {} of {}: {}...".format(
-                i + 1,
-                num_files,
-                str(path)
-            ))
+def main():
+    if sys.argv[1:2] == ["serve"]:
+        from playlister.server import serve
 
-        with path.open("w") as f:
-            f.write(contents)
+        serve(**parse_serve_args(sys.argv[2:]))
+        return 0
 
-            if verbose:
-                print("done.")
+    cli_args = parse_args(sys.argv[1:])
+    write_playlists(**cli_args)
 
     return 0
 
@@ -0,0 +1,254 @@
+"""
+.. py:module:: archive
+    :platform: Unix, Windows
+    :synopsis: Streams converted playlists into a single zip or tar file,
+        e.g. to copy them to a phone or over a slow link in one go.
+
+    Each playlist is added as soon as it's converted, so only one is held
+    in memory at a time. Tar archives are written as a stream, and zip
+    archives fall back to data descriptors on streams that can't seek, so
+    either can go to a pipe such as stdout.
+"""
+
+import sys
+import tarfile
+import time
+import zipfile
+
+from io import BytesIO, StringIO
+from pathlib import Path
+from typing import BinaryIO, Optional, Union
+
+# archive format -> tarfile stream mode, zip is handled separately
+TAR_MODES = {
+    "tar": "w|",
+    "tar.gz": "w|gz",
+    "tar.bz2": "w|bz2",
+    "tar.xz": "w|xz"
+}
+
+ARCHIVE_FORMATS = ("zip",) + tuple(TAR_MODES)
+
+# file name suffix -> archive format, for guessing it from the path
+SUFFIXES = (
+    (".zip", "zip"),
+    (".tar", "tar"),
+    (".tar.gz", "tar.gz"),
+    (".tgz", "tar.gz"),
+    (".tar.bz2", "tar.bz2"),
+    (".tbz2", "tar.bz2"),
+    (".tar.xz", "tar.xz"),
+    (".txz", "tar.xz")
+)
+
+# the path that means stdout
+STDOUT = "-"
+
+
+class UnknownArchiveFormatError(ValueError):
+    """Error raised for an archive format that isn't supported."""
+
+    pass
+
+
+def archive_format(path: Union[str, Path]) -> str:
+    """Guesses an archive's format from its file name.
+
+        :param path: the archive's path, or - for stdout, which is a tar.
+        :returns: one of ARCHIVE_FORMATS.
+        :raises: UnknownArchiveFormatError
+    """
+
+    if str(path) == STDOUT:
+        return "tar"
+
+    name = Path(path).name.lower()
+    for suffix, format in SUFFIXES:
+        if name.endswith(suffix):
+            return format
+
+    raise UnknownArchiveFormatError(
+        "Can't tell the archive format of {}, use one of {}.".format(
+            str(path),
+            ", ".join(s for s, _ in SUFFIXES)
+        )
+    )
+
+
+class ArchiveEntry(object):
+    """One playlist on its way into an Archive, with the same interface as
+        output.OutputFile.
+
+        :param archive: the archive to add it to.
+        :param name: its name in the archive.
+    """
+
+    def __init__(self, archive: "Archive", name: str):
+        self.archive = archive
+        self.name = name
+        self.file = None  # type: Optional[StringIO]
+        self.size = 0
+
+    def open(self) -> StringIO:
+        """
+            :returns: the buffer to write the playlist to.
+        """
+
+        self.file = StringIO()
+        return self.file
+
+    def commit(self) -> bool:
+        """Adds the playlist to the archive.
+
+            :returns: True, it's always written.
+            :raises: OSError
+        """
+
+        data = self.file.getvalue().encode("utf-8")
+        self.file = None
+        self.size = len(data)
+        self.archive.add(self.name, data)
+        return True
+
+    def discard(self):
+        """Drops the playlist."""
+
+        self.file = None
+
+
+class Archive(object):
+    """A zip or tar archive being written to a stream.
+
+        :param fileobj: the binary stream to write it to, which needn't be
+            seekable.
+        :param format: one of ARCHIVE_FORMATS.
+        :param base: entries are named by their output path relative to
+            this directory.
+        :param close_file: close fileobj along with the archive.
+        :raises: UnknownArchiveFormatError
+    """
+
+    def __init__(
+        self,
+        fileobj: BinaryIO,
+        format: str = "tar",
+        base: Optional[Path] = None,
+        close_file: bool = False
+    ):
+        if format not in ARCHIVE_FORMATS:
+            raise UnknownArchiveFormatError(
+                "Unknown archive format {!r}, use one of {}.".format(
+                    format,
+                    ", ".join(ARCHIVE_FORMATS)
+                )
+            )
+
+        self.format = format
+        self.base = base
+        self.fileobj = fileobj
+        self.close_file = close_file
+        if format == "zip":
+            self._zip = zipfile.ZipFile(
+                fileobj,
+                "w",
+                compression=zipfile.ZIP_DEFLATED
+            )
+            self._tar = None
+
+        else:
+            self._zip = None
+            self._tar = tarfile.open(fileobj=fileobj, mode=TAR_MODES[format])
+
+    def name_of(self, path: Path) -> str:
+        """
+            :param path: an output path.
+            :returns: its name in the archive.
+        """
+
+        if self.base is not None:
+            try:
+                return path.relative_to(self.base).as_posix()
+
+            except ValueError:
+                pass
+
+        return path.name
+
+    def add(self, name: str, data: bytes):
+        """Adds a file to the archive.
+
+            :param name: the file's name in the archive.
+            :param data: its contents.
+            :raises: OSError
+        """
+
+        now = time.time()
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, time.localtime(now)[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self._zip.writestr(info, data)
+            return
+
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(now)
+        info.mode = 0o644
+        self._tar.addfile(info, BytesIO(data))
+
+    def entry(self, path: Path) -> ArchiveEntry:
+        """
+            :param path: the playlist's output path.
+            :returns: an entry to write the playlist to.
+        """
+
+        return ArchiveEntry(self, self.name_of(path))
+
+    def close(self):
+        """Finishes the archive, and closes its stream if close_file."""
+
+        try:
+            if self._zip is not None:
+                self._zip.close()
+
+            else:
+                self._tar.close()
+
+        finally:
+            if self.close_file:
+                self.fileobj.close()
+
+    def __enter__(self) -> "Archive":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_archive(
+    path: Union[str, Path],
+    format: Optional[str] = None,
+    base: Optional[Path] = None
+) -> Archive:
+    """Opens an archive for writing. Closing it closes the file too, unless
+        it's stdout.
+
+        :param path: the archive's path, or - for stdout.
+        :param format: one of ARCHIVE_FORMATS, guessed from path if not
+            given.
+        :param base: see Archive.
+        :returns: the archive.
+        :raises: OSError, UnknownArchiveFormatError
+    """
+
+    format = format or archive_format(path)
+    if str(path) == STDOUT:
+        return Archive(sys.stdout.buffer, format, base)
+
+    f = Path(path).open("wb")
+    try:
+        return Archive(f, format, base, close_file=True)
+
+    except BaseException:
+        f.close()
+        raise
@@ -0,0 +1,96 @@
+"""
+.. py:module:: cache
+    :platform: Unix, Windows
+    :synopsis: Caches converted tracks so that a track appearing in many
+        playlists is only rendered once per run.
+"""
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+# Plenty for most libraries, at a few hundred bytes per rendered track.
+DEFAULT_CACHE_SIZE = 100000
+
+# The track fields the m3u and xspf converters read.
+RENDERED_FIELDS = (
+    "Location",
+    "Total Time",
+    "Name",
+    "Artist",
+    "Album Artist",
+    "Composer",
+    "Album"
+)
+
+
+class TrackCache(object):
+    """A size-bounded, least-recently-used cache of converted tracks. Tracks
+        are keyed by their Persistent ID (or Track ID if there isn't one)
+        along with whatever context the converter depends on, e.g. the
+        output format and music path. The rendered fields are part of the
+        key too: ids are only unique within one export, and a run may mix
+        exports taken at different times.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE):
+        """
+            :param maxsize: the most entries to keep, 0 disables caching.
+        """
+
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # type: OrderedDict
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def wrap(
+        self,
+        convert: Callable[[Dict[str, Any]], str],
+        *context: Hashable
+    ) -> Callable[[Dict[str, Any]], str]:
+        """Wraps a track converter so that its results are cached.
+
+            :param convert: the track converter to wrap.
+            :param context: everything besides the track that the result of
+                convert depends on.
+            :returns: the caching converter.
+        """
+
+        entries = self._entries
+
+        def cached(track: Dict[str, Any]) -> str:
+            track_id = track.get("Persistent ID") or track.get("Track ID")
+            if track_id is None or not self.maxsize:
+                return convert(track)
+
+            key = (
+                track_id,
+                tuple([track.get(field) for field in RENDERED_FIELDS])
+            ) + context
+            try:
+                result = entries[key]
+                entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+            except KeyError:
+                pass
+
+            self.misses += 1
+            result = entries[key] = convert(track)
+            if len(entries) > self.maxsize:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+            return result
+
+        return cached
+
+    def clear(self):
+        """Empties the cache and resets the counters."""
+
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
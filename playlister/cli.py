@@ -4,17 +4,44 @@
     :synopsis: Defines the command-line interface for the playlister utility.
 """
 
-import subprocess
 import os.path
 
-from argparse import ArgumentParser, ArgumentError
+from argparse import ArgumentParser, ArgumentError, ArgumentTypeError
 from typing import List, Dict, Optional
 from pathlib import Path
 
+from playlister.files import strip_compression
+from playlister.formats import FORMATS
+from playlister.remap import parse_rule
+
 # from __version__ import version
 __version__ = "1.1.0"
 
 
+def parse_list_types(value: str) -> List[str]:
+    """Parses a comma separated list of list types, e.g. m3u,xspf.
+
+        :param value: the list types.
+        :returns: the list types, in order.
+        :raises: ArgumentTypeError
+    """
+
+    list_types = [t.strip() for t in value.split(",") if t.strip()]
+    for list_type in list_types:
+        if list_type not in FORMATS:
+            raise ArgumentTypeError(
+                "invalid list type: {!r} (choose from {})".format(
+                    list_type,
+                    ", ".join(FORMATS)
+                )
+            )
+
+    if not list_types:
+        raise ArgumentTypeError("no list type given")
+
+    return list_types
+
+
 def init_default_parser() -> ArgumentParser:
     """Creates the default argument parser.
 
@@ -39,8 +66,11 @@ def init_default_parser() -> ArgumentParser:
     parser.add_argument(
         "-t",
         "--type",
-        help="type of output list, defaults to m3u.",
-        choices=["m3u", "m3u8", "xspf"],
+        help="type of output list, one of {}, or several separated by "
+             "commas to write each in every one of them, defaults to "
+             "m3u.".format(", ".join(FORMATS)),
+        metavar="TYPE[,TYPE...]",
+        type=parse_list_types,
         default="m3u",
         dest="list_type"
     )
@@ -59,6 +89,183 @@ def init_default_parser() -> ArgumentParser:
         type=Path
     )
 
+    parser.add_argument(
+        "-r",
+        "--remap",
+        help="rewrite track locations starting with SOURCE to start with "
+             "DESTINATION instead, may be repeated, the longest matching "
+             "SOURCE wins. * matches any one directory name",
+        metavar="SOURCE=DESTINATION",
+        type=parse_rule,
+        action="append",
+        dest="remap"
+    )
+
+    parser.add_argument(
+        "--remap-file",
+        help="file of SOURCE=DESTINATION remap rules, one per line",
+        type=Path,
+        dest="remap_file"
+    )
+
+    parser.add_argument(
+        "-l",
+        "--library",
+        help="treat the xml files as full library exports and convert "
+             "every playlist in them, output path is then a directory",
+        dest="library",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "-R",
+        "--recursive",
+        help="search the subdirectories of target_path for xml files too, "
+             "converting them as they're found. Outputs keep their place "
+             "in the tree",
+        dest="recursive",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--include",
+        help="only convert the xml files whose path relative to "
+             "target_path, or name, matches PATTERN, e.g. "
+             "'users/*/Library.xml', may be repeated",
+        metavar="PATTERN",
+        action="append",
+        dest="include"
+    )
+
+    parser.add_argument(
+        "--exclude",
+        help="skip the xml files and directories whose path relative to "
+             "target_path, or name, matches PATTERN, e.g. 'archive', may "
+             "be repeated",
+        metavar="PATTERN",
+        action="append",
+        dest="exclude"
+    )
+
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="number of processes to convert files with, 0 uses one per "
+             "CPU, defaults to 1",
+        type=int,
+        default=1,
+        dest="jobs"
+    )
+
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="skip source files that haven't changed since the last run, "
+             "tracked in a manifest file in the output directory",
+        dest="incremental",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "-s",
+        "--snapshot",
+        help="keep a binary snapshot next to each xml file and load from "
+             "it while the xml file is unchanged, skipping the xml parse",
+        dest="snapshot",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--index",
+        help="SQLite file to index the xml files in and convert from, "
+             "for libraries too large to hold in memory. Only changed xml "
+             "files are re-indexed",
+        metavar="PATH",
+        type=Path,
+        dest="index"
+    )
+
+    parser.add_argument(
+        "--profiles",
+        help="ini file of named targets, each with its own output path, "
+             "list types, music path and remap rules, all rendered from "
+             "one parse of each xml file",
+        metavar="FILE",
+        type=Path,
+        dest="profiles"
+    )
+
+    parser.add_argument(
+        "--verify",
+        help="check that every rewritten track exists under the music "
+             "path and report the missing ones of each playlist",
+        dest="verify",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--relink",
+        help="point tracks that don't exist under the music path at the "
+             "file with the closest name, e.g. after renaming the music",
+        dest="relink",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "-a",
+        "--archive",
+        help="stream every playlist into one zip or tar file instead, "
+             "- for stdout",
+        metavar="PATH",
+        dest="archive"
+    )
+
+    parser.add_argument(
+        "--archive-format",
+        help="zip, tar, tar.gz, tar.bz2 or tar.xz, defaults to the one "
+             "the archive's name ends in, or tar on stdout",
+        metavar="FORMAT",
+        dest="archive_format"
+    )
+
+    parser.add_argument(
+        "-w",
+        "--watch",
+        help="keep running after converting and reconvert the xml files "
+             "as they change, until Ctrl-C",
+        dest="watch",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "-p",
+        "--pipeline",
+        help="read, convert and write in separate threads, so reading and "
+             "writing files overlaps with converting them",
+        dest="pipeline",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        help="number of converted tracks to reuse across playlists, "
+             "0 disables the cache, defaults to 100000",
+        type=int,
+        default=100000,
+        dest="cache_size"
+    )
+
+    parser.add_argument(
+        "--stats",
+        help="print the time spent in each stage and counts of files, "
+             "tracks and bytes to stderr when done, as text (the default) "
+             "or json",
+        choices=["text", "json"],
+        nargs="?",
+        const="text",
+        dest="stats"
+    )
+
     parser.add_argument(
         "--version",
         help="Current version.",
@@ -69,25 +276,126 @@ def init_default_parser() -> ArgumentParser:
     return parser
 
 
+def init_serve_parser() -> ArgumentParser:
+    """Creates the argument parser for playlister serve.
+
+        :returns: an ArgumentParser with the serve options.
+    """
+
+    parser = ArgumentParser(
+        prog="playlister serve",
+        description="Serve converted playlists over HTTP, e.g. "
+                    "GET /Library/Name.m3u8?music_path=/sdcard/Music"
+    )
+    parser.add_argument(
+        "target_path",
+        help="path to the xml file or directory of them",
+        type=Path
+    )
+
+    parser.add_argument(
+        "-v", "--verbose",
+        help="log every request",
+        dest="verbose",
+        action="store_true"
+    )
+
+    parser.add_argument(
+        "--host",
+        help="address to listen on, defaults to 127.0.0.1",
+        default="127.0.0.1",
+        dest="host"
+    )
+
+    parser.add_argument(
+        "--port",
+        help="port to listen on, defaults to 8080",
+        type=int,
+        default=8080,
+        dest="port"
+    )
+
+    parser.add_argument(
+        "--socket",
+        help="Unix socket to listen on instead of --host and --port",
+        metavar="PATH",
+        type=Path,
+        dest="socket_path"
+    )
+
+    parser.add_argument(
+        "-s",
+        "--snapshot",
+        help="load the xml files through binary snapshots kept next to "
+             "them, see playlister --snapshot",
+        dest="snapshot",
+        action="store_true"
+    )
+
+    return parser
+
+
+def parse_serve_args(args: List[str]) -> Dict:
+    """Parses the CLI arguments of playlister serve into a Dict.
+
+        :param args: the arguments after serve.
+        :returns: the parsed args as a Dict.
+        :raises: ArgumentError, OSError
+    """
+
+    parsed_args = init_serve_parser().parse_args(args).__dict__
+    if not parsed_args["target_path"].exists():
+        raise OSError("{} does not exist".format(parsed_args["target_path"]))
+
+    return parsed_args
+
+
 def parse_args(
     args: List[str],
-    parser: Optional[ArgumentParser] = init_default_parser()
+    parser: Optional[ArgumentParser] = None
 ) -> Dict:
     """Parses a list of CLI arguments into a Dict.
 
         :param args: the list of arguments to be parsed, e.g. sys.argv
-        :param parser: the parser to use, defaults to the default parser.
+        :param parser: the parser to use, defaults to the default parser,
+            which is only built when needed.
         :returns: the parsed args as a Dict.
         :raises: ArgumentError, OSError
     """
 
+    parser = parser or init_default_parser()
     ns = parser.parse_args(args)
     parsed_args = ns.__dict__
 
+    if ns.archive and ns.watch:
+        parser.error("--archive can't be used with --watch")
+
+    # only the top level is watched
+    if ns.recursive and ns.watch:
+        parser.error("--recursive can't be used with --watch")
+
+    # a single list type stays a plain string
+    if isinstance(ns.list_type, list) and len(ns.list_type) == 1:
+        parsed_args["list_type"] = ns.list_type[0]
+
     if not ns.output_path:
-        parsed_args["output_path"] = Path(
-            str(ns.target_path).replace("xml", ns.list_type)
-        )
+        if ns.library and not ns.target_path.is_dir():
+            parsed_args["output_path"] = ns.target_path.parent
+
+        # several list types go next to the xml file(s)
+        elif not isinstance(ns.list_type, str):
+            parsed_args["output_path"] = (
+                ns.target_path if ns.target_path.is_dir()
+                else ns.target_path.parent
+            )
+
+        else:
+            parsed_args["output_path"] = Path(
+                str(strip_compression(ns.target_path)).replace(
+                    "xml",
+                    ns.list_type
+                )
+            )
 
     if not ns.target_path.exists():
         raise OSError("{} does not exist".format(ns.target_path))
@@ -5,31 +5,218 @@
         and parses XML/plist playlist files.
 """
 
-import plistlib
+import binascii
+import os
 
 import pathlib
-from typing import Optional, Dict, Any, List, Tuple
+from fnmatch import fnmatch
+from importlib import import_module
+from datetime import datetime
+from xml.parsers.expat import ParserCreate
+from typing import (
+    Optional, Dict, Any, List, Tuple, Iterator, Iterable, BinaryIO, Mapping
+)
+
+from playlister.scan import DEFAULT_WORKERS, scan_files
+from playlister.track import Track
+
+# Event kinds yielded by iter_library.
+TRACK = "track"
+PLAYLIST = "playlist"
+
+# Size of the chunks fed to the XML parser.
+CHUNK_SIZE = 64 * 1024
+
+# Compressed exports, by suffix, and the module that opens them. The
+# modules are only imported when such a file is read.
+COMPRESSIONS = {
+    ".gz": "gzip",
+    ".bz2": "bz2",
+    ".xz": "lzma"
+}
+
+XML_SUFFIXES = (".xml",) + tuple(".xml" + s for s in COMPRESSIONS)
+
+
+def is_xml_file(path: pathlib.Path) -> bool:
+    """
+        :param path: the file to check.
+        :returns: whether it's named like an export, plain or compressed,
+            and isn't hidden.
+    """
+
+    return (
+        path.name.lower().endswith(XML_SUFFIXES) and
+        not path.name.startswith(".")
+    )
+
+
+def strip_compression(path: pathlib.Path) -> pathlib.Path:
+    """
+        :param path: an export, e.g. Library.xml.gz.
+        :returns: the path without its compression suffix, e.g.
+            Library.xml.
+    """
+
+    if path.suffix.lower() in COMPRESSIONS:
+        return path.with_suffix("")
+
+    return path
+
+
+def open_source(
+    file: pathlib.Path,
+    source: Optional[BinaryIO] = None
+) -> BinaryIO:
+    """Opens an export for reading. Compressed exports are decompressed on
+        the fly as they're read, without a temporary file.
+
+        :param file: the file to open.
+        :param source: the file's raw contents, already opened, e.g. as
+            they're read by another thread, to read instead of opening it.
+        :returns: the binary file object to read the xml from.
+        :raises: OSError
+    """
+
+    module = COMPRESSIONS.get(file.suffix.lower())
+    if module is None:
+        return source or file.open("rb")
+
+    return import_module(module).open(source or str(file), "rb")
+
+
+def _matches(relative: str, name: str, patterns: Iterable[str]) -> bool:
+    """
+        :param relative: a path relative to the directory being searched,
+            with / separators.
+        :param name: its last part.
+        :param patterns: fnmatch patterns.
+        :returns: whether the path or its name matches any of them.
+    """
+
+    return any(
+        fnmatch(relative, pattern) or fnmatch(name, pattern)
+        for pattern in patterns
+    )
+
+
+def _included(
+    relative: str,
+    name: str,
+    include: List[str],
+    exclude: List[str]
+) -> bool:
+    """
+        :param relative: a file's path relative to the directory being
+            searched, with / separators.
+        :param name: its last part.
+        :param include: see find_xml_files.
+        :param exclude: see find_xml_files.
+        :returns: whether the file passes the patterns.
+    """
+
+    if include and not _matches(relative, name, include):
+        return False
+
+    return not (exclude and _matches(relative, name, exclude))
+
+
+def is_included(
+    path: pathlib.Path,
+    directory: pathlib.Path,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None
+) -> bool:
+    """Checks a file found some other way, e.g. by a watcher, against the
+        patterns find_xml_files would have searched directory with. Only
+        the file itself is matched, not the directories above it.
+
+        :param path: the xml file.
+        :param directory: the directory it was found in.
+        :param include: see find_xml_files.
+        :param exclude: see find_xml_files.
+        :returns: whether find_xml_files would have included it.
+    """
+
+    try:
+        relative = path.relative_to(directory).as_posix()
+
+    except ValueError:
+        relative = path.name
+
+    return _included(
+        relative, path.name, list(include or []), list(exclude or [])
+    )
+
+
+def find_xml_files(
+    directory: pathlib.Path,
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+    recursive: Optional[bool] = True,
+    workers: Optional[int] = DEFAULT_WORKERS
+) -> Iterator[pathlib.Path]:
+    """Finds the xml files under a directory, see is_xml_file, with one
+        os.scandir call per directory and no stat per file. Subdirectories
+        are listed in parallel, see scan.scan_files, and the files are
+        yielded as they're found, in no particular order, so they can be
+        converted before the walk is done. Hidden directories are skipped.
+
+        Patterns are matched against a path relative to directory, with /
+        separators, and against its name, e.g. ``*.xml.gz``, ``archive``
+        or ``users/*/Library.xml``. As with fnmatch, * also matches /.
+
+        :param directory: the directory to search.
+        :param include: if given, only the files matching one of these.
+        :param exclude: skips the files and directories matching any of
+            these, and everything under the directories.
+        :param recursive: search the subdirectories too.
+        :param workers: how many directories to list at once.
+        :returns: an iterator of the xml files' paths.
+        :raises: OSError if directory isn't a directory.
+    """
+
+    if not directory.is_dir():
+        raise OSError("Error: {} is not a directory".format(directory))
+
+    include = list(include or [])
+    exclude = list(exclude or [])
+    prefix = os.path.join(str(directory), "")
+
+    def relative(entry: os.DirEntry) -> str:
+        return entry.path[len(prefix):].replace(os.sep, "/")
+
+    def skip_dir(entry: os.DirEntry) -> bool:
+        return (
+            not recursive or
+            entry.name.startswith(".") or
+            _matches(relative(entry), entry.name, exclude)
+        )
+
+    def find() -> Iterator[pathlib.Path]:
+        for entry in scan_files(directory, workers, skip_dir):
+            if not is_xml_file(pathlib.PurePath(entry.name)):
+                continue
+
+            if _included(relative(entry), entry.name, include, exclude):
+                yield pathlib.Path(entry.path)
+
+    return find()
 
 
 def glob_xml_files(directory: pathlib.Path) -> List[pathlib.Path]:
     """Takes a path to a xml directory and returns a list containing all of the
-        xml files in the directory.
+        xml files in the directory, including compressed ones.
 
         :param directory: directory to glob.
         :returns: List of file names.
         :raises: OSError
     """
 
-    if directory.exists() and directory.is_dir():
-        return [
-            p for p in directory.glob("*.xml") if not p.name.startswith(".")
-        ]
-
-    else:
-        raise OSError("Error: {} is not a directory".format(directory))
+    return list(find_xml_files(directory, recursive=False, workers=1))
 
 
-def extract_tracks(plist: Dict) -> List[Dict[str, str]]:
+def extract_tracks(plist: Dict) -> List[Track]:
     """Takes a Dict loaded from plistlib and extracts the in-order tracks.
 
         :param plist: the xml plist parsed into a Dict.
@@ -39,28 +226,163 @@ def extract_tracks(plist: Dict) -> List[Dict[str, str]]:
         ordering = [
             str(a["Track ID"]) for a in plist["Playlists"][0]["Playlist Items"]
         ]
-        return [plist["Tracks"][track_id] for track_id in ordering]
+        return [Track(plist["Tracks"][track_id]) for track_id in ordering]
 
     except KeyError:
         return []
 
 
+class _LibraryParser(object):
+    """Incremental plist parser for iTunes® library exports. Rather than
+        building the whole document like plistlib, each track record and
+        each playlist is handed off as soon as it is complete and is never
+        attached to the document tree. Playlist items are reduced to their
+        track ids.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.data = []
+        self.key = None
+
+        # each frame is [container, key of the container in its parent]
+        self.stack = []
+        self.parser = ParserCreate()
+        self.parser.StartElementHandler = self.handle_begin_element
+        self.parser.EndElementHandler = self.handle_end_element
+        self.parser.CharacterDataHandler = self.data.append
+        self.parser.EntityDeclHandler = self.handle_entity_decl
+
+    def feed(self, chunk: bytes, final: bool = False) -> List[Tuple]:
+        """Parses the next chunk of the document.
+
+            :param chunk: the raw bytes to parse.
+            :param final: whether this is the last chunk.
+            :returns: the events completed by this chunk.
+        """
+
+        self.parser.Parse(chunk, final)
+        events = self.events
+        self.events = []
+        return events
+
+    def handle_entity_decl(self, *args):
+        # Same restriction as plistlib, guards against entity expansion.
+        raise ValueError("XML entity declarations are not supported.")
+
+    def handle_begin_element(self, element: str, attrs: Dict[str, str]):
+        del self.data[:]
+        if element == "dict" or element == "array":
+            self.stack.append([{} if element == "dict" else [], self.key])
+            self.key = None
+
+    def handle_end_element(self, element: str):
+        if element == "dict" or element == "array":
+            value, self.key = self.stack.pop()
+            self.add_object(value)
+            return
+
+        raw = "".join(self.data)
+        if element == "key":
+            self.key = raw
+        elif element == "string":
+            self.add_object(raw)
+        elif element == "integer":
+            hexadecimal = raw[:2] in ("0x", "0X")
+            self.add_object(int(raw, 0) if hexadecimal else int(raw))
+        elif element == "real":
+            self.add_object(float(raw))
+        elif element == "true":
+            self.add_object(True)
+        elif element == "false":
+            self.add_object(False)
+        elif element == "date":
+            self.add_object(datetime.strptime(raw, "%Y-%m-%dT%H:%M:%SZ"))
+        elif element == "data":
+            self.add_object(binascii.a2b_base64(raw.encode("ascii")))
+
+    def add_object(self, value: Any):
+        stack = self.stack
+        depth = len(stack)
+        key = self.key
+        self.key = None
+
+        if not depth:
+            return
+
+        # root -> Tracks -> track record, only the fields that are used
+        if depth == 2 and stack[1][1] == "Tracks":
+            self.events.append((TRACK, key, Track(value)))
+
+        # root -> Playlists -> playlist
+        elif depth == 2 and stack[1][1] == "Playlists":
+            self.events.append((PLAYLIST, None, value))
+
+        # root -> Playlists -> playlist -> Playlist Items -> item
+        elif depth == 4 and stack[3][1] == "Playlist Items":
+            stack[3][0].append(str(value.get("Track ID")))
+
+        elif key is not None:
+            stack[-1][0][key] = value
+
+        else:
+            stack[-1][0].append(value)
+
+
+def iter_library(
+    f: BinaryIO
+) -> Iterator[Tuple[str, Optional[str], Mapping[str, Any]]]:
+    """Incrementally parses an iTunes® plist export, yielding records as
+        they are read so that memory stays bounded by a single record.
+        Yields ``(TRACK, track_id, record)`` for each entry of the Tracks
+        dict, with the record trimmed down to a
+        :py:class:`track.Track`, and ``(PLAYLIST, None, playlist)`` for
+        each playlist, where
+        the playlist's Playlist Items are reduced to a list of track ids.
+        Everything else in the document is discarded.
+
+        :param f: the binary file object to read.
+        :returns: an iterator of (kind, track_id, record) tuples.
+        :raises: xml.parsers.expat.ExpatError, ValueError
+    """
+
+    parser = _LibraryParser()
+    chunk = f.read(CHUNK_SIZE)
+    while chunk:
+        yield from parser.feed(chunk)
+        chunk = f.read(CHUNK_SIZE)
+
+    yield from parser.feed(b"", True)
+
+
 def load_plist(
     file: pathlib.Path,
-    verbose: Optional[bool] = False
-) -> List[Dict[str, str]]:
+    verbose: Optional[bool] = False,
+    source: Optional[BinaryIO] = None
+) -> List[Track]:
     """Takes plist xml file binary and returns a List of the track records.
 
         :param file: the file to load
         :param verbose: toggles verbose output.
+        :param source: see open_source.
         :returns: a list of the track records.
     """
 
     if verbose:
         print("Reading {}...".format(file.resolve()))
     try:
-        with file.open("rb") as f:
-            return extract_tracks(plistlib.load(f))
+        tracks = {}
+        with open_source(file, source) as f:
+            for kind, track_id, record in iter_library(f):
+                if kind == TRACK:
+                    tracks[track_id] = record
+
+                # Only the first playlist is converted, stop reading here.
+                elif kind == PLAYLIST:
+                    ordering = record.get("Playlist Items", [])
+                    return [tracks[i] for i in ordering]
+
+        return []
 
     # Don't care here what the problem is: if the file doesn't exist
     # or isn't the right format, either way can't do anything useful.
@@ -68,3 +390,85 @@ def load_plist(
         if verbose:
             print("...not a valid iTunes playlist file. Skipping...")
         return []
+
+
+def read_library(
+    file: pathlib.Path,
+    source: Optional[BinaryIO] = None
+) -> Tuple[Dict[str, Track], List[Dict[str, Any]]]:
+    """Reads the whole track table and every playlist from an export.
+
+        :param file: the file to read.
+        :param source: see open_source.
+        :returns: a tuple of (tracks by track id, playlists), with each
+            playlist's Playlist Items reduced to a list of track ids.
+        :raises: OSError, xml.parsers.expat.ExpatError, ValueError
+    """
+
+    tracks = {}
+    playlists = []
+    with open_source(file, source) as f:
+        for kind, track_id, record in iter_library(f):
+            if kind == TRACK:
+                tracks[track_id] = record
+
+            else:
+                playlists.append(record)
+
+    return tracks, playlists
+
+
+def resolve_playlists(
+    tracks: Dict[str, Track],
+    playlists: List[Dict[str, Any]]
+) -> List[Tuple[str, List[Track]]]:
+    """Resolves playlists against a track table, skipping the master
+        Library playlist and playlist folders. Items that don't resolve to
+        a track are dropped.
+
+        :param tracks: the track records by track id.
+        :param playlists: the playlists, as from read_library.
+        :returns: a list of (playlist name, track records) tuples.
+    """
+
+    resolved = []
+    for playlist in playlists:
+        if playlist.get("Master") or playlist.get("Folder"):
+            continue
+
+        name = playlist.get("Name") or "Playlist {}".format(
+            playlist.get("Playlist ID", len(resolved) + 1)
+        )
+        resolved.append((name, [
+            tracks[i] for i in playlist.get("Playlist Items", [])
+            if i in tracks
+        ]))
+
+    return resolved
+
+
+def load_library(
+    file: pathlib.Path,
+    verbose: Optional[bool] = False,
+    source: Optional[BinaryIO] = None
+) -> List[Tuple[str, List[Track]]]:
+    """Takes a full library export and returns every playlist in it,
+        resolved against the shared track table in a single parse. The
+        master Library playlist and playlist folders are skipped, and
+        items that don't resolve to a track are dropped.
+
+        :param file: the file to load
+        :param verbose: toggles verbose output.
+        :param source: see open_source.
+        :returns: a list of (playlist name, track records) tuples.
+    """
+
+    if verbose:
+        print("Reading library {}...".format(file.resolve()))
+    try:
+        return resolve_playlists(*read_library(file, source))
+
+    except Exception:
+        if verbose:
+            print("...not a valid iTunes library file. Skipping...")
+        return []
@@ -0,0 +1,81 @@
+"""
+.. py:module:: formats
+    :platform: Unix, Windows
+    :synopsis: Registry of the output formats. Each format's module is only
+        imported the first time it's used, so a run only pays for the
+        writer it needs.
+"""
+
+from collections import OrderedDict
+from importlib import import_module
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+Format = NamedTuple("Format", [
+    ("to_track", Callable[[Dict[str, Any]], str]),
+    ("write_list", Callable[..., None])
+])
+
+# name -> (module, track converter, list writer)
+FORMATS = OrderedDict([
+    ("m3u", ("playlister.m3u", "to_m3u_track", "write_m3u_list")),
+    ("m3u8", ("playlister.m3u", "to_m3u_track", "write_m3u_list")),
+    ("xspf", ("playlister.xspf", "to_xspf_track", "write_xspf_list")),
+])  # type: OrderedDict[str, Tuple[str, str, str]]
+
+_loaded = {}  # type: Dict[str, Format]
+
+
+class UnknownOutputFormatError(Exception):
+    """Error raised for unknown playlist type"""
+
+    pass
+
+
+def register_format(
+    name: str,
+    module: str,
+    to_track: str,
+    write_list: str
+):
+    """Registers an output format, replacing any existing one of the same
+        name. Nothing is imported until the format is loaded.
+
+        :param name: the list type, also used as the file extension.
+        :param module: the module defining the format.
+        :param to_track: the name of its track converter.
+        :param write_list: the name of its list writer.
+    """
+
+    FORMATS[name] = (module, to_track, write_list)
+    _loaded.pop(name, None)
+
+
+def load_format(name: str) -> Format:
+    """Imports a format's module, if needed, and returns its functions.
+
+        :param name: the list type.
+        :returns: the format's track converter and list writer.
+        :raises: UnknownOutputFormatError
+    """
+
+    try:
+        return _loaded[name]
+
+    except KeyError:
+        pass
+
+    try:
+        module_name, to_track, write_list = FORMATS[name]
+
+    except KeyError:
+        raise UnknownOutputFormatError(
+            "Unknown list type {}.".format(name)
+        )
+
+    module = import_module(module_name)
+    loaded = _loaded[name] = Format(
+        getattr(module, to_track),
+        getattr(module, write_list)
+    )
+
+    return loaded
@@ -0,0 +1,416 @@
+"""
+.. py:module:: index
+    :platform: Unix, Windows
+    :synopsis: An SQLite index of library exports, for libraries too large
+        to hold in memory and for other tools to query.
+
+    Each export is stored under its own source id, so several exports can
+    share one index file:
+
+    * sources(source_id, path, size, mtime_ns, sha256)
+    * tracks(source_id, track_id, persistent_id, location, total_time,
+      name, artist, album_artist, composer, album)
+    * playlists(source_id, playlist_id, ordinal, persistent_id, name,
+      master, folder)
+    * playlist_items(source_id, playlist_id, position, track_id)
+
+    Tracks are indexed by Track ID and by Persistent ID, and playlist items
+    are read back in order a batch at a time.
+"""
+
+import sqlite3
+
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from playlister.files import TRACK, iter_library, open_source
+from playlister.manifest import file_digest
+from playlister.track import Track
+
+SCHEMA_VERSION = 1
+
+# rows per executemany when loading, and per fetchmany when reading
+BATCH_SIZE = 1000
+
+# (column, plist key) for the track fields the writers use
+TRACK_COLUMNS = (
+    ("persistent_id", "Persistent ID"),
+    ("location", "Location"),
+    ("total_time", "Total Time"),
+    ("name", "Name"),
+    ("artist", "Artist"),
+    ("album_artist", "Album Artist"),
+    ("composer", "Composer"),
+    ("album", "Album")
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    source_id INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    persistent_id TEXT,
+    location TEXT,
+    total_time INTEGER,
+    name TEXT,
+    artist TEXT,
+    album_artist TEXT,
+    composer TEXT,
+    album TEXT,
+    PRIMARY KEY (source_id, track_id)
+);
+CREATE INDEX IF NOT EXISTS tracks_persistent_id ON tracks (persistent_id);
+CREATE TABLE IF NOT EXISTS playlists (
+    source_id INTEGER NOT NULL,
+    playlist_id INTEGER NOT NULL,
+    ordinal INTEGER NOT NULL,
+    persistent_id TEXT,
+    name TEXT,
+    master INTEGER NOT NULL,
+    folder INTEGER NOT NULL,
+    PRIMARY KEY (source_id, playlist_id)
+);
+CREATE TABLE IF NOT EXISTS playlist_items (
+    source_id INTEGER NOT NULL,
+    playlist_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    track_id INTEGER NOT NULL,
+    PRIMARY KEY (source_id, playlist_id, position)
+);
+"""
+
+
+class IndexVersionError(Exception):
+    """Raised when an index file was written by an incompatible version."""
+
+    pass
+
+
+class PlaylistTracks(Sequence):
+    """The tracks of one indexed playlist, in order. Iterating runs a query
+        and fetches the tracks a batch at a time, so only one batch is in
+        memory however long the playlist is.
+    """
+
+    def __init__(
+        self,
+        connection: sqlite3.Connection,
+        source_id: int,
+        playlist_id: int
+    ):
+        self.connection = connection
+        self.source_id = source_id
+        self.playlist_id = playlist_id
+        self._length = None  # type: Optional[int]
+
+    def __len__(self) -> int:
+        if self._length is None:
+            self._length = self.connection.execute(
+                "SELECT count(*) FROM playlist_items AS i JOIN tracks AS t "
+                "USING (source_id, track_id) "
+                "WHERE i.source_id = ? AND i.playlist_id = ?",
+                (self.source_id, self.playlist_id)
+            ).fetchone()[0]
+
+        return self._length
+
+    def __getitem__(self, index):
+        # only here to satisfy Sequence, the writers just iterate
+        return list(self)[index]
+
+    def __iter__(self) -> Iterator[Track]:
+        cursor = self.connection.execute(
+            "SELECT t.track_id, {} FROM playlist_items AS i "
+            "JOIN tracks AS t USING (source_id, track_id) "
+            "WHERE i.source_id = ? AND i.playlist_id = ? "
+            "ORDER BY i.position".format(
+                ", ".join("t." + column for column, _ in TRACK_COLUMNS)
+            ),
+            (self.source_id, self.playlist_id)
+        )
+
+        while True:
+            rows = cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+
+            for row in rows:
+                track = {"Track ID": row[0]}
+                for (_, key), value in zip(TRACK_COLUMNS, row[1:]):
+                    if value is not None:
+                        track[key] = value
+
+                yield Track(track)
+
+
+class LibraryIndex(object):
+    """An SQLite index of library exports.
+
+        :param path: the index file, created if it doesn't exist.
+        :raises: IndexVersionError, sqlite3.Error
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        # several worker processes may update the same index
+        self.connection = sqlite3.connect(str(path), timeout=60)
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            self.connection.close()
+            raise IndexVersionError(
+                "{} has index version {}, expected {}.".format(
+                    str(path), version, SCHEMA_VERSION
+                )
+            )
+
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(
+                "PRAGMA user_version = {}".format(SCHEMA_VERSION)
+            )
+
+    def __enter__(self) -> "LibraryIndex":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def source_id(self, source: Path) -> Optional[int]:
+        """
+            :param source: an xml export.
+            :returns: its id in the index, or None if it isn't indexed.
+        """
+
+        row = self.connection.execute(
+            "SELECT source_id FROM sources WHERE path = ?",
+            (str(source.resolve()),)
+        ).fetchone()
+
+        return row[0] if row else None
+
+    def is_current(self, source: Path) -> bool:
+        """Whether an export is indexed and unchanged since, checked by its
+            size and mtime, or its content hash if only the mtime differs.
+
+            :param source: the xml export.
+        """
+
+        row = self.connection.execute(
+            "SELECT source_id, size, mtime_ns, sha256 FROM sources "
+            "WHERE path = ?",
+            (str(source.resolve()),)
+        ).fetchone()
+
+        if not row:
+            return False
+
+        source_id, size, mtime_ns, digest = row
+        stat = source.stat()
+        if stat.st_size != size:
+            return False
+
+        if stat.st_mtime_ns == mtime_ns:
+            return True
+
+        if file_digest(source) != digest:
+            return False
+
+        with self.connection:
+            self.connection.execute(
+                "UPDATE sources SET mtime_ns = ? WHERE source_id = ?",
+                (stat.st_mtime_ns, source_id)
+            )
+
+        return True
+
+    def update(self, source: Path) -> bool:
+        """Indexes an export, replacing what was indexed from it before.
+            The export is streamed into the index a batch of rows at a
+            time, each batch in its own transaction, so other processes
+            sharing the index only ever wait for one batch. The export is
+            recorded as changed until the last batch is in, so an update
+            that's cut short is redone. Nothing is done if it hasn't
+            changed.
+
+            :param source: the xml export.
+            :returns: whether the export was (re)indexed.
+            :raises: OSError, xml.parsers.expat.ExpatError, ValueError,
+                sqlite3.Error
+        """
+
+        if self.is_current(source):
+            return False
+
+        path = str(source.resolve())
+        stat = source.stat()
+        digest = file_digest(source)
+
+        with self.connection as db:
+            row = db.execute(
+                "SELECT source_id FROM sources WHERE path = ?",
+                (path,)
+            ).fetchone()
+
+            # a size no file has, until the last batch is in
+            if row:
+                source_id = row[0]
+                for table in ("tracks", "playlists", "playlist_items"):
+                    db.execute(
+                        "DELETE FROM {} WHERE source_id = ?".format(table),
+                        (source_id,)
+                    )
+
+                db.execute(
+                    "UPDATE sources SET size = -1, mtime_ns = -1, "
+                    "sha256 = '' WHERE source_id = ?",
+                    (source_id,)
+                )
+
+            else:
+                source_id = db.execute(
+                    "INSERT INTO sources (path, size, mtime_ns, sha256) "
+                    "VALUES (?, -1, -1, '')",
+                    (path,)
+                ).lastrowid
+
+        insert_track = "INSERT OR REPLACE INTO tracks VALUES ({})".format(
+            ", ".join("?" * (len(TRACK_COLUMNS) + 2))
+        )
+        insert_playlist = (
+            "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?, ?, ?)"
+        )
+        insert_item = (
+            "INSERT OR REPLACE INTO playlist_items VALUES (?, ?, ?, ?)"
+        )
+
+        # the rows waiting for the next batch
+        tracks = []  # type: List[Tuple]
+        playlists = []  # type: List[Tuple]
+        items = []  # type: List[Tuple[int, int, int, int]]
+        pending = [
+            (insert_track, tracks),
+            (insert_playlist, playlists),
+            (insert_item, items)
+        ]
+
+        def flush(db: sqlite3.Connection):
+            for statement, rows in pending:
+                db.executemany(statement, rows)
+                del rows[:]
+
+        def added(rows: List[Tuple]):
+            if len(rows) >= BATCH_SIZE:
+                with self.connection as db:
+                    flush(db)
+
+        ordinal = 0
+        with open_source(source) as f:
+            for kind, track_id, record in iter_library(f):
+                if kind == TRACK:
+                    tracks.append((
+                        source_id,
+                        int(record.get("Track ID", track_id))
+                    ) + tuple(
+                        record.get(key) for _, key in TRACK_COLUMNS
+                    ))
+                    added(tracks)
+                    continue
+
+                ordinal += 1
+                playlist_id = int(record.get("Playlist ID", ordinal))
+                playlists.append((
+                    source_id,
+                    playlist_id,
+                    ordinal,
+                    record.get("Playlist Persistent ID"),
+                    record.get("Name"),
+                    bool(record.get("Master")),
+                    bool(record.get("Folder"))
+                ))
+                added(playlists)
+
+                for position, item in enumerate(
+                    record.get("Playlist Items", [])
+                ):
+                    items.append((
+                        source_id, playlist_id, position, int(item)
+                    ))
+                    added(items)
+
+        with self.connection as db:
+            flush(db)
+            db.execute(
+                "UPDATE sources SET size = ?, mtime_ns = ?, sha256 = ? "
+                "WHERE source_id = ?",
+                (stat.st_size, stat.st_mtime_ns, digest, source_id)
+            )
+
+        return True
+
+    def playlists(
+        self,
+        source: Path,
+        library: Optional[bool] = False
+    ) -> List[Tuple[str, PlaylistTracks]]:
+        """The playlists indexed from an export, in export order.
+
+            :param source: the xml export.
+            :param library: every playlist except the master Library
+                playlist and folders, like load_library, instead of only
+                the first one, like load_plist.
+            :returns: a list of (playlist name, tracks) tuples. The tracks
+                are read from the index as they are iterated, so the index
+                must stay open until then. Items that aren't in the track
+                table are dropped, except that like load_plist the first
+                playlist has no tracks at all if it has such an item.
+        """
+
+        source_id = self.source_id(source)
+        if source_id is None:
+            return []
+
+        query = (
+            "SELECT playlist_id, name FROM playlists WHERE source_id = ? " +
+            ("AND NOT master AND NOT folder " if library else "") +
+            "ORDER BY ordinal" +
+            ("" if library else " LIMIT 1")
+        )
+
+        playlists = [
+            (
+                name or "Playlist {}".format(playlist_id),
+                PlaylistTracks(self.connection, source_id, playlist_id)
+            )
+            for playlist_id, name in self.connection.execute(
+                query, (source_id,)
+            )
+        ]
+
+        if playlists and not library and self._has_unresolved(
+            source_id,
+            playlists[0][1].playlist_id
+        ):
+            return []
+
+        return playlists
+
+    def _has_unresolved(self, source_id: int, playlist_id: int) -> bool:
+        """Whether a playlist has an item that isn't in the track table."""
+
+        return bool(self.connection.execute(
+            "SELECT EXISTS (SELECT 1 FROM playlist_items AS i "
+            "LEFT JOIN tracks AS t USING (source_id, track_id) "
+            "WHERE i.source_id = ? AND i.playlist_id = ? "
+            "AND t.track_id IS NULL)",
+            (source_id, playlist_id)
+        ).fetchone()[0])
@@ -4,19 +4,36 @@
     :synopsis: Defines all m3u-related operations for playlister.
 """
 
+from functools import lru_cache
 from urllib.parse import unquote
-from typing import Dict, List
+from typing import Dict, List, Iterable, TextIO
 
-from playlister.playlister_utils import normalize
+from playlister.playlister_utils import (
+    FIELD_CACHE_SIZE, normalize, write_joined
+)
 
 M3U_TEMPLATE = """#EXTM3U
 #name={name}
 {tracks}
 """
 
+M3U_HEAD, M3U_TAIL = M3U_TEMPLATE.split("{tracks}")
+
 M3U_TRACK_TEMPLATE = "#EXTINF:{length},{artist} - {title}\n{path}"
 
 
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def decode_field(value: str) -> str:
+    """Unquotes and normalizes a repeating field such as the artist,
+        remembering the result for the next track with the same value.
+
+        :param value: the field's value.
+        :returns: the value as written to the playlist.
+    """
+
+    return normalize(unquote(value))
+
+
 def to_m3u_track(record: Dict[str, str]) -> str:
     """Converts a single track record into m3u format. Need the
         normalization to fix the way Apple handles e.g. combining
@@ -31,11 +48,11 @@ def to_m3u_track(record: Dict[str, str]) -> str:
     # m3u duration in seconds, not ms
     duration = int(record.get("Total Time")) // 1000
     name = normalize(unquote(record.get("Name")))
-    artist = normalize(unquote(
+    artist = decode_field(
         record.get("Artist") or
         record.get("Album Artist") or
         record.get("Composer", "")
-    ))
+    )
     # print("Location {}".format(location))
     return M3U_TRACK_TEMPLATE.format(
         length=duration,
@@ -54,3 +71,15 @@ def to_m3u_list(list_name: str, tracks: List[str]) -> str:
     """
 
     return M3U_TEMPLATE.format(name=list_name, tracks="\n".join(tracks))
+
+
+def write_m3u_list(f: TextIO, list_name: str, tracks: Iterable[str]) -> None:
+    """Streams a playlist of serialized m3u tracks to a file, writing each
+        track as it is produced. Output is identical to to_m3u_list.
+
+        :param f: the file object to write to.
+        :param list_name: name of the playlist.
+        :param tracks: iterable of m3u tracks to include.
+    """
+
+    write_joined(f, M3U_HEAD.format(name=list_name), tracks, M3U_TAIL)
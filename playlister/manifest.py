@@ -0,0 +1,148 @@
+"""
+.. py:module:: manifest
+    :platform: Unix, Windows
+    :synopsis: Tracks which source files have already been converted, so
+        that incremental runs can skip the ones that haven't changed.
+"""
+
+import os
+import json
+import hashlib
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+MANIFEST_NAME = ".playlister-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_digest(path: Path) -> str:
+    """Hashes a file's contents without reading it all into memory.
+
+        :param path: the file to hash.
+        :returns: the hex sha256 digest of the contents.
+        :raises: OSError
+    """
+
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class Manifest(object):
+    """Records each converted source file's size, mtime and content hash,
+        the options it was converted with and the files it produced. A
+        source is current when the options match, its outputs still exist
+        and either its size and mtime are unchanged or, failing that, its
+        content hash is.
+    """
+
+    def __init__(self, directory: Path, options: Dict[str, Any]):
+        """Loads the manifest from directory, if there is one.
+
+            :param directory: the output directory holding the manifest.
+            :param options: the conversion options for this run, must be
+                json serializable.
+        """
+
+        self.path = directory / MANIFEST_NAME
+        self.options = options
+        self.entries = {}  # type: Dict[str, Dict[str, Any]]
+
+        try:
+            with self.path.open() as f:
+                data = json.load(f)
+
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("sources", {})
+
+        # missing or corrupt, either way everything gets rebuilt
+        except (OSError, ValueError):
+            pass
+
+    def is_current(self, source: Path) -> bool:
+        """Checks whether a source file can be skipped.
+
+            :param source: the source xml file.
+            :returns: True if the recorded outputs are up to date.
+        """
+
+        entry = self.entries.get(str(source.resolve()))
+        if not entry or entry.get("options") != self.options:
+            return False
+
+        if not all(os.path.exists(output) for output in entry["outputs"]):
+            return False
+
+        try:
+            stat = source.stat()
+            if (stat.st_size == entry["size"] and
+                    stat.st_mtime_ns == entry["mtime_ns"]):
+                return True
+
+            # touched but not changed, remember the new mtime
+            if (stat.st_size == entry["size"] and
+                    file_digest(source) == entry["sha256"]):
+                entry["mtime_ns"] = stat.st_mtime_ns
+                return True
+
+        except OSError:
+            pass
+
+        return False
+
+    def fingerprint(self, source: Path) -> Dict[str, Any]:
+        """Takes a source file's size, mtime and content hash, before it's
+            converted, so a change made while converting it isn't
+            recorded as converted.
+
+            :param source: the source xml file.
+            :returns: the fingerprint to pass to record.
+            :raises: OSError
+        """
+
+        stat = source.stat()
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_digest(source)
+        }
+
+    def record(
+        self,
+        source: Path,
+        outputs: List[Path],
+        fingerprint: Dict[str, Any]
+    ):
+        """Records a successful conversion of a source file.
+
+            :param source: the source xml file.
+            :param outputs: the files written from it.
+            :param fingerprint: the source's fingerprint from before it was
+                converted.
+        """
+
+        self.entries[str(source.resolve())] = dict(
+            fingerprint,
+            options=self.options,
+            outputs=[str(output.resolve()) for output in outputs]
+        )
+
+    def save(self):
+        """Writes the manifest back to disk, replacing it atomically.
+
+            :raises: OSError
+        """
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with tmp_path.open("w") as f:
+            json.dump({
+                "version": MANIFEST_VERSION,
+                "sources": self.entries
+            }, f, indent=1, sort_keys=True)
+
+        os.replace(str(tmp_path), str(self.path))
@@ -0,0 +1,162 @@
+"""
+.. py:module:: output
+    :platform: Unix, Windows
+    :synopsis: Writes output files atomically, leaving files whose
+        contents haven't changed untouched.
+
+    Rewriting an identical playlist still wears flash storage, bumps its
+    mtime and makes sync tools copy it again, so each output is compared
+    with the file already there as it's rendered, and nothing is written
+    while they match. Only once they differ is a temporary file created
+    next to it, which is renamed over the old one when done, so readers
+    never see a half-written playlist.
+"""
+
+import io
+import os
+import stat
+
+from pathlib import Path
+from typing import BinaryIO, Optional, TextIO
+
+# how much of the old file is copied at a time once the output differs
+COPY_SIZE = 1024 * 1024
+
+
+class _OutputStream(io.RawIOBase):
+    """The binary stream under an OutputFile's text file."""
+
+    def __init__(self, output: "OutputFile"):
+        self.output = output
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        return self.output._write(bytes(data))
+
+
+class OutputFile(object):
+    """An output file that's only written if its contents change, through
+        a temporary file in the same directory that commit moves into
+        place.
+
+        :param path: where the output goes.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.tmp_path = path.with_name(
+            ".{}.{}.tmp".format(path.name, os.getpid())
+        )
+        self.file = None  # type: Optional[TextIO]
+
+        # the old file while the output matches it, how much of it does,
+        # and the temporary file once it doesn't
+        self._old = None  # type: Optional[BinaryIO]
+        self._matched = 0
+        self._tmp = None  # type: Optional[BinaryIO]
+        self._discarded = False
+
+        # the old file's permissions, which the new one keeps
+        self._mode = None  # type: Optional[int]
+
+    def open(self) -> TextIO:
+        """
+            :returns: the file to write the output to, encoded as a file
+                opened with open(path, "w") would be.
+            :raises: OSError
+        """
+
+        try:
+            self._old = self.path.open("rb")
+            self._mode = stat.S_IMODE(os.fstat(self._old.fileno()).st_mode)
+
+        except FileNotFoundError:
+            self._old = None
+
+        self.file = io.TextIOWrapper(io.BufferedWriter(_OutputStream(self)))
+        return self.file
+
+    def _write(self, data: bytes) -> int:
+        if self._discarded:
+            return len(data)
+
+        if self._tmp is None and self._old is not None:
+            if self._old.read(len(data)) == data:
+                self._matched += len(data)
+                return len(data)
+
+        if self._tmp is None:
+            self._start_tmp()
+
+        self._tmp.write(data)
+        return len(data)
+
+    def _start_tmp(self):
+        """Creates the temporary file, with the part of the old file the
+            output matched so far.
+        """
+
+        self._tmp = self.tmp_path.open("wb")
+        if self._old is not None:
+            self._old.seek(0)
+            left = self._matched
+            while left:
+                chunk = self._old.read(min(left, COPY_SIZE))
+                self._tmp.write(chunk)
+                left -= len(chunk)
+
+            self._old.close()
+            self._old = None
+
+    def commit(self) -> bool:
+        """Finishes the output and replaces the old file with it, unless
+            the old file already had the same contents, in which case
+            nothing was written.
+
+            :returns: whether the output was replaced.
+            :raises: OSError
+        """
+
+        try:
+            self.file.close()
+            if self._tmp is None:
+                # the output so far matched, and the old file ends there
+                if self._old is not None and not self._old.read(1):
+                    self._old.close()
+                    self._old = None
+                    return False
+
+                self._start_tmp()
+
+            self._tmp.close()
+
+            # a new file is left with the umask's permissions, as open
+            # gives it
+            if self._mode is not None:
+                os.chmod(str(self.tmp_path), self._mode)
+
+            os.replace(str(self.tmp_path), str(self.path))
+            return True
+
+        except OSError:
+            self.discard()
+            raise
+
+    def discard(self):
+        """Drops the output and removes the temporary file, if there is
+            one, leaving the old file as it was.
+        """
+
+        self._discarded = True
+        for f in (self.file, self._old, self._tmp):
+            if f:
+                f.close()
+
+        if self._tmp is not None:
+            try:
+                self.tmp_path.unlink()
+
+            except FileNotFoundError:
+                pass
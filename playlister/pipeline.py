@@ -0,0 +1,212 @@
+"""
+.. py:module:: pipeline
+    :platform: Unix, Windows
+    :synopsis: A thread-per-stage pipeline, so that reading and writing
+        files overlaps with converting them.
+
+    Each stage runs in its own thread and hands its results to the next
+    through a bounded queue, so a fast stage only gets a few items ahead of
+    a slow one. Threads are enough here because the reading and writing
+    stages spend their time in I/O, which releases the GIL.
+
+    A stage can also be a StreamStage, which turns the whole stream of the
+    previous stage's results into its own, e.g. a file's chunks into the
+    file's playlists, so big items can pass through a piece at a time.
+"""
+
+import io
+import threading
+
+from queue import Queue, Empty, Full
+from typing import Any, Callable, Iterable, Iterator, List, Sequence, Union
+
+# items each stage may get ahead of the next
+DEFAULT_QUEUE_SIZE = 2
+
+# seconds between checks for the pipeline being torn down
+_POLL = 0.1
+
+_DONE = object()
+
+
+class _Failed(object):
+    """Carries an unexpected error in a stage through to the consumer."""
+
+    __slots__ = ("error",)
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+class StreamStage(object):
+    """A stage that takes the iterator of the previous stage's results,
+        rather than one result at a time, and yields any number of its own.
+
+        :param func: a function from an iterator to an iterator.
+    """
+
+    def __init__(self, func: Callable[[Iterator[Any]], Iterable[Any]]):
+        self.func = func
+
+
+class ChunkReader(io.RawIOBase):
+    """A binary file made of the chunks (bytes) in a stream of items, up to
+        an end marker, for reading a file that's passed through a pipeline
+        in pieces. An exception in place of a chunk is raised when it's
+        read, and ends the file just like the end marker.
+
+        :param items: the stream, shared with whatever reads the items
+            after the end marker.
+        :param end: the end marker.
+    """
+
+    def __init__(self, items: Iterator[Any], end: Any):
+        self._items = items
+        self._end = end
+        self._buffer = memoryview(b"")
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def _next(self) -> Any:
+        item = next(self._items, self._end)
+        if item is self._end or isinstance(item, BaseException):
+            self._done = True
+
+        return item
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            if self._done:
+                return 0
+
+            item = self._next()
+            if isinstance(item, BaseException):
+                raise item
+
+            if item is self._end:
+                return 0
+
+            self._buffer = memoryview(item)
+
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+    def finish(self):
+        """Skips the chunks that weren't read, up to the end marker."""
+
+        self._buffer = memoryview(b"")
+        while not self._done:
+            self._next()
+
+
+def pipeline(
+    items: Iterable[Any],
+    stages: Sequence[Union[Callable[[Any], Any], StreamStage]],
+    maxsize: int = DEFAULT_QUEUE_SIZE
+) -> Iterator[Any]:
+    """Runs every item through each stage in turn, each stage in its own
+        thread, and yields what comes out of the last stage. Each stage
+        handles one item at a time, so results come out in the same order
+        as the items went in.
+
+        Stages are expected to deal with their own per-item errors. Any
+        other error ends the pipeline and is raised here.
+
+        :param items: the items to feed to the first stage.
+        :param stages: functions taking the previous stage's result, or
+            StreamStages.
+        :param maxsize: how many results each stage may queue up for the
+            next.
+        :returns: an iterator of the last stage's results, in order.
+    """
+
+    stop = threading.Event()
+    queues = [Queue(maxsize) for _ in stages]
+
+    def put(queue: Queue, item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=_POLL)
+                return True
+
+            except Full:
+                continue
+
+        return False
+
+    def drain(queue: Queue) -> Iterator[Any]:
+        while not stop.is_set():
+            try:
+                item = queue.get(timeout=_POLL)
+
+            except Empty:
+                continue
+
+            if item is _DONE:
+                return
+
+            yield item
+
+    def run(stage: Any, source: Iterable, out: Queue):
+        # an earlier stage's error ends a stream stage's input, and is
+        # passed on once the stage is done with what came before it
+        failed = []  # type: List[_Failed]
+
+        def upstream() -> Iterator[Any]:
+            for item in source:
+                if isinstance(item, _Failed):
+                    failed.append(item)
+                    return
+
+                yield item
+
+        try:
+            if isinstance(stage, StreamStage):
+                results = stage.func(upstream())
+
+            else:
+                results = (
+                    item if isinstance(item, _Failed) else stage(item)
+                    for item in source
+                )
+
+            for result in results:
+                if not put(out, result):
+                    return
+
+            if failed:
+                put(out, failed[0])
+
+        except BaseException as e:
+            put(out, _Failed(e))
+
+        put(out, _DONE)
+
+    threads = []
+    source = iter(items)  # type: Iterable[Any]
+    for stage, out in zip(stages, queues):
+        threads.append(threading.Thread(
+            target=run,
+            args=(stage, source, out),
+            daemon=True
+        ))
+        source = drain(out)
+
+    for thread in threads:
+        thread.start()
+
+    try:
+        for result in drain(queues[-1]):
+            if isinstance(result, _Failed):
+                raise result.error
+
+            yield result
+
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
@@ -4,13 +4,19 @@
     :synopsis: Generic utility functions for the playlister utility.
 """
 
+import re
+
 from functools import partial
 from unicodedata import normalize as uni_norm
-from typing import Callable, Any, List
+from typing import Callable, Any, List, Iterable, TextIO
 
 # convert combining diacritical marks to combined form
 normalize = partial(uni_norm, "NFC")
 
+# how many distinct artist and album values the writers remember the
+# rendering of, they repeat across a library while names and locations don't
+FIELD_CACHE_SIZE = 16384
+
 
 def pipe(*fs: Callable[..., Any]) -> Callable[..., Any]:
     """Forward function composition. Yes, I know mutation is evil.
@@ -26,4 +32,47 @@ def pipe(*fs: Callable[..., Any]) -> Callable[..., Any]:
         for f in tail:
             result = f(result)
         return result
-    return collect
\ No newline at end of file
+    return collect
+
+
+# characters that aren't allowed in file names on at least one platform
+UNSAFE_FILENAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+
+
+def safe_filename(name: str) -> str:
+    """Makes a playlist name usable as a file name on any platform.
+
+        :param name: the name to clean up.
+        :returns: the name with unsafe characters replaced by underscores.
+    """
+
+    cleaned = UNSAFE_FILENAME_CHARS.sub("_", name).strip().strip(".")
+    return cleaned or "_"
+
+
+def write_joined(
+    f: TextIO,
+    head: str,
+    items: Iterable[str],
+    tail: str,
+    separator: str = "\n"
+) -> None:
+    """Writes head, the items joined by separator and tail to f, the same
+        as f.write(head + separator.join(items) + tail) but one item at a
+        time, so the joined string is never built.
+
+        :param f: the file object to write to.
+        :param head: written before the items.
+        :param items: the strings to join.
+        :param tail: written after the items.
+        :param separator: written between the items.
+    """
+
+    f.write(head)
+    sep = ""
+    for item in items:
+        f.write(sep)
+        f.write(item)
+        sep = separator
+
+    f.write(tail)
@@ -0,0 +1,107 @@
+"""
+.. py:module:: profiles
+    :platform: Unix, Windows
+    :synopsis: Named output targets, e.g. one per device, so a single run
+        can render every target from one parse of each xml file.
+
+    A profiles file is an ini file with a section per profile::
+
+        [phone]
+        music_path = /storage/emulated/0/Music
+        output = ~/Sync/phone
+        type = m3u8
+
+        [car]
+        output = /media/usb/playlists
+        type = m3u
+        remap =
+            /Users/*/Music/iTunes/iTunes Media/Music=/music
+
+    output is required. type defaults to m3u and may list several types
+    separated by commas. remap takes SOURCE=DESTINATION rules, one per line.
+    A relative output is relative to the profiles file, music_path is
+    used as given.
+"""
+
+from pathlib import Path
+from typing import List, NamedTuple, Optional, Tuple
+
+from playlister.formats import FORMATS
+from playlister.remap import parse_rule
+
+Profile = NamedTuple("Profile", [
+    ("name", str),
+    ("output_path", Path),
+    ("list_type", List[str]),
+    ("music_path", Optional[Path]),
+    ("remap", List[Tuple[str, str]])
+])
+
+
+class InvalidProfileError(ValueError):
+    """Error raised for a profiles file that can't be used."""
+
+    pass
+
+
+def load_profiles(path: Path) -> List[Profile]:
+    """Reads the profiles from a profiles file, in file order.
+
+        :param path: the profiles file.
+        :returns: the profiles.
+        :raises: OSError, InvalidProfileError, InvalidRuleError
+    """
+
+    from configparser import ConfigParser, Error
+
+    parser = ConfigParser(interpolation=None)
+    try:
+        with path.open() as f:
+            parser.read_file(f)
+
+    except Error as e:
+        raise InvalidProfileError("{}: {}".format(str(path), e))
+
+    base = path.parent
+
+    def resolve(value: str) -> Path:
+        return base / Path(value).expanduser()
+
+    profiles = []
+    for name in parser.sections():
+        section = parser[name]
+        if not section.get("output", "").strip():
+            raise InvalidProfileError(
+                "Profile {!r} in {} has no output.".format(name, str(path))
+            )
+
+        list_types = [
+            t.strip() for t in section.get("type", "m3u").split(",")
+            if t.strip()
+        ]
+        unknown = [t for t in list_types if t not in FORMATS]
+        if unknown or not list_types:
+            raise InvalidProfileError(
+                "Profile {!r} has an invalid type {!r}.".format(
+                    name,
+                    section.get("type")
+                )
+            )
+
+        music_path = section.get("music_path", "").strip()
+        profiles.append(Profile(
+            name,
+            resolve(section["output"].strip()),
+            list_types,
+            Path(music_path) if music_path else None,
+            [
+                parse_rule(line)
+                for line in section.get("remap", "").splitlines()
+                if line.strip() and not line.lstrip().startswith("#")
+            ]
+        ))
+
+    if not profiles:
+        raise InvalidProfileError("{} has no profiles.".format(str(path)))
+
+    return profiles
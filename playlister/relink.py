@@ -0,0 +1,253 @@
+"""
+.. py:module:: relink
+    :platform: Unix, Windows
+    :synopsis: Repairs rewritten track locations that don't exist on the
+        target, e.g. after the music was renamed or reorganized, by looking
+        the file name up in an index of the music directory.
+
+    Names are matched ignoring case, accents' encoding, punctuation and a
+    leading track number, so ``01 Fins.m4a``, ``fins.m4a`` and
+    ``1-03 Fins.mp3`` all match. When several files share a name, the one
+    whose directories best match the original location's (the album, then
+    the artist) wins. Only the locations that still don't match are tried
+    against similar names, first in the same album and then among the
+    names sharing its rarest word, so most tracks cost a dict lookup and
+    none a scan of the whole library. Outside the album a similar name
+    only counts under a similar album or artist directory.
+"""
+
+import os.path
+import re
+
+from collections import OrderedDict
+from difflib import SequenceMatcher, get_close_matches
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+from urllib.parse import quote
+
+from playlister.playlister_utils import normalize
+from playlister.remap import decode_location
+from playlister.track import Track
+from playlister.verify import MusicIndex, normalize_path
+
+# a leading track number, with an optional disc number: 01, 1-01, 01.
+TRACK_NUMBER = re.compile(r"^(?:\d+-)?\d+(?:[ ._-]+|$)")
+
+SEPARATORS = re.compile(r"[\W_]+")
+
+# how similar a name must be, 0 to 1, to be taken for a renamed file
+FUZZY_CUTOFF = 0.85
+
+# how many directories above the file count towards picking a candidate
+PARENT_DEPTH = 2
+
+# shorter words, e.g. "a" or "of", are too common to narrow anything down
+MIN_WORD_LENGTH = 3
+
+# names sharing a word with a missing one that are compared with it, at
+# most, if every word is more common than this it's left missing
+MAX_CANDIDATES = 1000
+
+
+def name_key(path: str) -> str:
+    """
+        :param path: a file path.
+        :returns: the file name without its extension, track number, case
+            and punctuation, which the index is keyed on. Empty if the name
+            is only punctuation.
+    """
+
+    stem = normalize(os.path.splitext(os.path.basename(path))[0]).casefold()
+
+    # a name that's only a number, e.g. 1999, is kept whole
+    key = SEPARATORS.sub(" ", TRACK_NUMBER.sub("", stem)).strip()
+    return key or SEPARATORS.sub(" ", stem).strip()
+
+
+def parent_keys(path: str) -> List[str]:
+    """
+        :param path: a file path.
+        :returns: the keys of the directories above the file, nearest
+            first, see PARENT_DEPTH.
+    """
+
+    keys = []
+    for _ in range(PARENT_DEPTH):
+        path = os.path.dirname(path)
+        name = os.path.basename(path)
+        if not name:
+            break
+
+        keys.append(SEPARATORS.sub(" ", normalize(name).casefold()).strip())
+
+    return keys
+
+
+class Relinker(object):
+    """Finds the files on the target that missing track locations most
+        likely refer to.
+
+        :param index: the files that exist on the target.
+        :param paths: the same files' paths, as they should be written.
+    """
+
+    def __init__(self, index: MusicIndex, paths: Iterable[str]):
+        self.index = index
+        self.relinked = OrderedDict()  # type: OrderedDict
+
+        # name key -> paths, album key -> name key -> paths and word ->
+        # name keys, for fuzzy matching within an album before trying the
+        # names with a word in common
+        self.by_name = {}  # type: Dict[str, List[str]]
+        self.by_album = {}  # type: Dict[str, Dict[str, List[str]]]
+        self.by_word = {}  # type: Dict[str, Set[str]]
+        for path in paths:
+            key = name_key(path)
+            if not key:
+                continue
+
+            if key not in self.by_name:
+                self.by_name[key] = []
+                for word in key.split():
+                    if len(word) >= MIN_WORD_LENGTH:
+                        self.by_word.setdefault(word, set()).add(key)
+
+            self.by_name[key].append(path)
+
+            parents = parent_keys(path)
+            album = parents[0] if parents else ""
+            self.by_album.setdefault(album, {}).setdefault(key, []).append(
+                path
+            )
+
+        # rewritten location -> relinked location, or None if not found
+        self._found = {}  # type: Dict[str, Optional[str]]
+
+    def _best(self, path: str, candidates: List[str]) -> str:
+        """Picks the candidate whose directories best match the path's."""
+
+        if len(candidates) == 1:
+            return candidates[0]
+
+        wanted = parent_keys(path)
+
+        def score(candidate: str) -> List[float]:
+            return [
+                SequenceMatcher(None, want, have).ratio()
+                for want, have in zip(wanted, parent_keys(candidate))
+            ]
+
+        return max(candidates, key=score)
+
+    def _near(self, parents: List[str], candidate: str) -> bool:
+        """Whether the candidate's album or artist directory is like the
+            missing path's.
+        """
+
+        return any(
+            SequenceMatcher(None, want, have).ratio() >= FUZZY_CUTOFF
+            for want, have in zip(parents, parent_keys(candidate))
+        )
+
+    def find(self, path: str) -> Optional[str]:
+        """Looks up the file a missing path most likely refers to.
+
+            :param path: the unquoted path that doesn't exist.
+            :returns: the file's path, or None if nothing is close enough.
+        """
+
+        key = name_key(path)
+        if not key:
+            return None
+
+        candidates = self.by_name.get(key)
+        if candidates:
+            return self._best(path, candidates)
+
+        # a renamed file in the same album
+        parents = parent_keys(path)
+        album = self.by_album.get(parents[0] if parents else "", {})
+        matches = get_close_matches(key, album, 1, FUZZY_CUTOFF)
+        if matches:
+            return self._best(path, album[matches[0]])
+
+        # then anywhere in the library, but only under a similar album or
+        # artist, since a similar name alone is often another song, e.g.
+        # Revolution 1 and Revolution 9
+        similar = min(
+            (self.by_word.get(word, ()) for word in key.split()),
+            key=lambda names: len(names) or MAX_CANDIDATES + 1,
+            default=()
+        )
+        if not similar or len(similar) > MAX_CANDIDATES:
+            return None
+
+        matches = get_close_matches(key, similar, len(similar), FUZZY_CUTOFF)
+        for match in matches:
+            candidates = [
+                candidate for candidate in self.by_name[match]
+                if self._near(parents, candidate)
+            ]
+            if candidates:
+                return self._best(path, candidates)
+
+        return None
+
+    def relink_location(self, location: str) -> str:
+        """
+            :param location: a rewritten track location, quoted.
+            :returns: the location, or a quoted path to the file it most
+                likely refers to if it doesn't exist.
+        """
+
+        path = decode_location(location)
+        if normalize_path(path) in self.index.paths:
+            return location
+
+        if path not in self._found:
+            self._found[path] = self.find(path)
+
+        found = self._found[path]
+        if found is None:
+            return location
+
+        self.relinked[path] = found
+        return quote(found)
+
+    def report(self, verbose: Optional[bool] = False) -> Optional[str]:
+        """Summarizes the relinked locations.
+
+            :param verbose: list every relinked location instead of the
+                first few.
+            :returns: the report, or None if nothing was relinked.
+        """
+
+        if not self.relinked:
+            return None
+
+        relinked = list(self.relinked.items())
+        shown = relinked if verbose else relinked[:10]
+        lines = [
+            "{} missing track locations were relinked:".format(len(relinked))
+        ] + ["    {} -> {}".format(old, new) for old, new in shown]
+
+        if len(shown) < len(relinked):
+            lines.append("    ...and {} more, --verbose lists them.".format(
+                len(relinked) - len(shown)
+            ))
+
+        return "\n".join(lines)
+
+    def relink_track(self, track: Mapping[str, Any]) -> Mapping[str, Any]:
+        """Takes a rewritten track record and relinks its location, see
+            relink_location. The record is copied if it changes.
+
+            :param track: the record for the track, a Track or a plist dict.
+            :returns: the track, or a relinked copy of it as a Track.
+        """
+
+        location = track.get("Location", "")
+        relinked = self.relink_location(location)
+        if relinked is location:
+            return track
+
+        return Track(track, Location=relinked)
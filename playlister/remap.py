@@ -0,0 +1,264 @@
+"""
+.. py:module:: remap
+    :platform: Unix, Windows
+    :synopsis: Rewrites track locations from one directory layout to
+        another with a table of prefix rules.
+"""
+
+import re
+import os.path
+
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import unquote, quote
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+)
+
+from playlister.track import Track
+
+# A path component, either separator counts since exports come from
+# both macOS and Windows.
+COMPONENT = re.compile(r"[^\\/]+")
+
+# Matches any single path component in a rule's source prefix.
+WILDCARD = "*"
+
+# Where iTunes® and Music.app keep their media, used when only a music
+# path is given.
+LIBRARY_LAYOUTS = [
+    # windows uses 'My ', mac just Music
+    "/Users/*/Music/iTunes/iTunes Media/Music",
+    "/Users/*/My Music/iTunes/iTunes Media/Music",
+
+    # optionally url encoded
+    "/Users/*/Music/iTunes/iTunes%20Media/Music",
+    "/Users/*/My Music/iTunes/iTunes%20Media/Music",
+
+    # Music.app
+    "/Users/*/Music/Music/Media.localized/Music",
+    "/Users/*/Music/Music/Media/Music",
+]
+
+# same again behind a windows drive letter
+LIBRARY_LAYOUTS += ["*" + layout for layout in LIBRARY_LAYOUTS]
+
+
+class InvalidRuleError(ValueError):
+    """Error raised for a remap rule that can't be parsed."""
+
+    pass
+
+
+def parse_rule(rule: str) -> Tuple[str, str]:
+    """Parses a rule of the form SOURCE=DESTINATION. Paths containing '='
+        need it in the destination, the first one splits the rule.
+
+        :param rule: the rule to parse.
+        :returns: a tuple of (source prefix, destination prefix).
+        :raises: InvalidRuleError
+    """
+
+    source, sep, destination = rule.partition("=")
+    if not sep or not COMPONENT.search(source) or not destination.strip():
+        raise InvalidRuleError("Invalid remap rule {!r}.".format(rule))
+
+    return source.strip(), destination.strip()
+
+
+def load_rules(path: Path) -> List[Tuple[str, str]]:
+    """Reads remap rules from a file, one SOURCE=DESTINATION per line.
+        Blank lines and lines starting with # are ignored.
+
+        :param path: the rules file.
+        :returns: a list of (source prefix, destination prefix) tuples.
+        :raises: OSError, InvalidRuleError
+    """
+
+    with path.open() as f:
+        return [
+            parse_rule(line) for line in f
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+
+def decode_location(location: str) -> str:
+    """Reduces a track location to a plain, unquoted path. File urls are
+        reduced to paths since Android doesn't like them.
+
+        :param location: the quoted location from the track record.
+        :returns: the unquoted path.
+    """
+
+    if location.startswith("file://"):
+        location = location[7:]
+        if location.startswith("localhost/"):
+            location = location[10:]
+
+    return unquote(location)
+
+
+class LocationDecoder(object):
+    """Memoizes decode_location, so that remappers sharing one decoder,
+        e.g. one per output profile, each decode a location only once.
+
+        :param maxsize: how many locations to remember, the memo is
+            emptied when it fills up.
+    """
+
+    def __init__(self, maxsize: int = 100000):
+        self.maxsize = maxsize
+        self.decoded = {}  # type: Dict[str, str]
+
+    def __call__(self, location: str) -> str:
+        path = self.decoded.get(location)
+        if path is None:
+            if len(self.decoded) >= self.maxsize:
+                self.decoded.clear()
+
+            path = self.decoded[location] = decode_location(location)
+
+        return path
+
+
+class _Node(object):
+    __slots__ = ("children", "destination")
+
+    def __init__(self):
+        self.children = {}  # type: Dict[str, _Node]
+        self.destination = None  # type: Optional[str]
+
+
+class Remapper(object):
+    """Compiles a table of source prefix -> destination prefix rules into a
+        trie of path components, so each location is resolved with a
+        single longest-prefix walk. Later rules win over earlier ones with
+        the same source. Locations that match no rule are left as they
+        are and collected in unmatched.
+    """
+
+    def __init__(
+        self,
+        rules: Iterable[Tuple[str, str]] = (),
+        music_path: Optional[Path] = None,
+        decode: Optional[Callable[[str], str]] = None,
+        collect_unmatched: bool = True
+    ):
+        """
+            :param rules: (source prefix, destination prefix) tuples.
+            :param music_path: if given, the standard library layouts are
+                mapped to it, ahead of the rules.
+            :param decode: turns a location into a path, defaults to
+                decode_location. Remappers can share a LocationDecoder.
+            :param collect_unmatched: collect the locations that match no
+                rule for report. Without it unmatched is None, e.g. for a
+                remapper that's never reported and would only grow.
+        """
+
+        rules = list(rules)
+        if music_path:
+            rules = [
+                (layout, str(music_path)) for layout in LIBRARY_LAYOUTS
+            ] + rules
+
+        self.rules = tuple(rules)
+        self.decode = decode or decode_location
+        self.unmatched = (
+            OrderedDict() if collect_unmatched else None
+        )  # type: Optional[OrderedDict]
+        self._root = _Node()
+
+        for source, destination in rules:
+            node = self._root
+            for component in COMPONENT.findall(source):
+                node = node.children.setdefault(component, _Node())
+
+            node.destination = destination
+
+    def lookup(self, path: str) -> Optional[Tuple[str, int]]:
+        """Finds the longest rule prefix of a path.
+
+            :param path: the unquoted path to look up.
+            :returns: a tuple of (destination, offset of the end of the
+                matched prefix in path), or None if no rule matches.
+        """
+
+        best = None
+        active = [self._root]
+        for component in COMPONENT.finditer(path):
+            matched = []
+            for node in active:
+                for key in (component.group(), WILDCARD):
+                    child = node.children.get(key)
+                    if child is not None:
+                        matched.append(child)
+
+            if not matched:
+                break
+
+            for node in matched:
+                if node.destination is not None:
+                    best = (node.destination, component.end())
+                    break
+
+            active = matched
+
+        return best
+
+    def remap_location(self, location: str) -> str:
+        """Rewrites a track location. File urls are reduced to plain paths
+            since Android doesn't like them.
+
+            :param location: the quoted location from the track record.
+            :returns: the quoted, remapped path.
+        """
+
+        path = self.decode(location)
+        match = self.lookup(path)
+        if match is None:
+            if self.unmatched is not None:
+                self.unmatched[path] = None
+
+            return quote(path)
+
+        destination, end = match
+        return quote(os.path.join(destination, path[end:].lstrip("\\/")))
+
+    def remap_track(self, track: Mapping[str, Any]) -> Track:
+        """Takes a track record and remaps its location. The record is
+            copied rather than modified, as it may be shared between
+            playlists.
+
+            :param track: the record for the track to update, a Track or a
+                plist dict.
+            :returns: the updated copy of the track record, as a Track.
+        """
+
+        return Track(
+            track,
+            Location=self.remap_location(track.get("Location", ""))
+        )
+
+    def report(self, verbose: Optional[bool] = False) -> Optional[str]:
+        """Summarizes the locations that matched no rule.
+
+            :param verbose: list every location instead of the first few.
+            :returns: the report, or None if everything matched.
+        """
+
+        if not self.unmatched:
+            return None
+
+        paths = list(self.unmatched)
+        shown = paths if verbose else paths[:10]
+        lines = [
+            "{} track locations matched no remap rule and were left "
+            "unchanged:".format(len(paths))
+        ] + ["    " + path for path in shown]
+
+        if len(shown) < len(paths):
+            lines.append("    ...and {} more, --verbose lists them.".format(
+                len(paths) - len(shown)
+            ))
+
+        return "\n".join(lines)
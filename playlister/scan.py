@@ -0,0 +1,97 @@
+"""
+.. py:module:: scan
+    :platform: Unix, Windows
+    :synopsis: Walks directory trees with os.scandir, listing directories
+        in parallel, since on network mounts each listing mostly waits on
+        the server.
+"""
+
+import os
+
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+# directory listings are mostly spent waiting on the disk or the network,
+# so more threads than cores still helps
+DEFAULT_WORKERS = 16
+
+
+def _list_dir(
+    path: str,
+    skip_dir: Optional[Callable[[os.DirEntry], bool]] = None
+) -> Tuple[List[os.DirEntry], List[str]]:
+    """Lists one directory.
+
+        :param path: the directory to list.
+        :param skip_dir: called with each subdirectory's entry, true leaves
+            it out.
+        :returns: a tuple of (file entries, subdirectory paths). Both are
+            empty if the directory can't be read.
+    """
+
+    files = []
+    directories = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    # symlinked directories could loop, don't follow them
+                    if entry.is_dir(follow_symlinks=False):
+                        if not (skip_dir and skip_dir(entry)):
+                            directories.append(entry.path)
+
+                    elif entry.is_file():
+                        files.append(entry)
+
+                except OSError:
+                    continue
+
+    except OSError:
+        pass
+
+    return files, directories
+
+
+def scan_files(
+    root: Union[str, Path],
+    workers: Optional[int] = DEFAULT_WORKERS,
+    skip_dir: Optional[Callable[[os.DirEntry], bool]] = None
+) -> Iterator[os.DirEntry]:
+    """Walks a directory tree, one os.scandir call per directory, with the
+        directories listed by a pool of threads. Files are yielded as each
+        directory's listing comes in, so in no particular order. Unreadable
+        directories are skipped, as with os.walk.
+
+        :param root: the directory to walk.
+        :param workers: how many directories to list at once, 1 or None
+            lists them one at a time in this thread.
+        :param skip_dir: called with the entry of every directory found,
+            true skips the directory and everything under it. Runs in the
+            listing threads.
+        :returns: an iterator of the os.DirEntry of every file in the tree.
+    """
+
+    if not workers or workers < 2:
+        pending = [str(root)]
+        while pending:
+            files, directories = _list_dir(pending.pop(), skip_dir)
+            yield from files
+            pending.extend(directories)
+
+        return
+
+    from concurrent.futures import (
+        FIRST_COMPLETED, ThreadPoolExecutor, wait
+    )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(_list_dir, str(root), skip_dir)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, directories = future.result()
+                pending.update(
+                    pool.submit(_list_dir, path, skip_dir)
+                    for path in directories
+                )
+                yield from files
@@ -0,0 +1,385 @@
+"""
+.. py:module:: server
+    :platform: Unix, Windows
+    :synopsis: Serves converted playlists over HTTP, keeping the parsed
+        libraries in memory between requests.
+
+    Run with ``playlister serve TARGET``, where TARGET is an xml file or a
+    directory of them. Each xml file is a library, named after the file,
+    and its playlists are named as in library mode::
+
+        GET /                                  libraries and their playlists
+        GET /Library                           the playlists in Library.xml
+        GET /Library/Road%20Trip.m3u8?music_path=/sdcard/Music
+
+    A library is parsed on its first request and kept until its file's
+    size or mtime changes, so most requests only convert one playlist.
+    Requests are handled in threads, and a Unix socket can be served
+    instead of a TCP port.
+"""
+
+import socket
+import sys
+import threading
+
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from io import StringIO
+from pathlib import Path
+from socketserver import TCPServer, ThreadingMixIn
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from playlister.app import get_converters, unique_file_name
+from playlister.files import glob_xml_files, read_library, resolve_playlists
+from playlister.formats import FORMATS, UnknownOutputFormatError
+from playlister.remap import Remapper
+from playlister.track import Track
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# a playlist's name and tracks
+Playlist = Tuple[str, List[Track]]
+
+# list type -> Content-Type
+CONTENT_TYPES = {
+    "m3u": "audio/x-mpegurl",
+    "m3u8": "application/vnd.apple.mpegurl",
+    "xspf": "application/xspf+xml"
+}
+
+
+def library_name(path: Path) -> str:
+    """
+        :param path: an xml file.
+        :returns: the library's name in urls, e.g. Library for
+            Library.xml.gz.
+    """
+
+    return path.name.split(".")[0]
+
+
+class LibraryCache(object):
+    """The parsed libraries under a target, each reloaded when its file
+        changes. Safe to use from several threads.
+
+        :param target: an xml file or a directory of them.
+        :param snapshot: load the xml files through their snapshots, see
+            playlister.snapshot.
+    """
+
+    def __init__(self, target: Path, snapshot: Optional[bool] = False):
+        self.target = target
+        self.snapshot = snapshot
+        self._lock = threading.Lock()
+
+        # name -> source, and source -> ((size, mtime), playlists)
+        self._sources = {}  # type: Dict[str, Path]
+        self._loaded = {}  # type: Dict[Path, Tuple[Tuple[int, int], Any]]
+        self._loading = {}  # type: Dict[Path, threading.Lock]
+
+    def sources(self) -> Dict[str, Path]:
+        """Finds the libraries, again on every call so new files show up.
+
+            :returns: the xml files by library name.
+        """
+
+        if self.target.is_dir():
+            paths = sorted(glob_xml_files(self.target))
+
+        else:
+            paths = [self.target]
+
+        sources = OrderedDict((library_name(p), p) for p in paths)
+        with self._lock:
+            self._sources = sources
+
+        return sources
+
+    def _load(self, source: Path) -> "OrderedDict[str, Playlist]":
+        if self.snapshot:
+            from playlister.snapshot import load_playlists
+
+            playlists = load_playlists(source, True)
+
+        else:
+            playlists = resolve_playlists(*read_library(source))
+
+        names = set()
+        return OrderedDict(
+            (unique_file_name(name, names), (name, tracks))
+            for name, tracks in playlists
+        )
+
+    def playlists(self, name: str) -> "OrderedDict[str, Playlist]":
+        """Gets a library's playlists, parsing it if it's new or changed.
+            Requests for a library that's being parsed wait for it rather
+            than parsing it again.
+
+            :param name: the library's name.
+            :returns: the (name, tracks) of each playlist, by file name
+                without an extension.
+            :raises: KeyError if there's no such library, OSError,
+                xml.parsers.expat.ExpatError
+        """
+
+        source = self._sources.get(name) or self.sources()[name]
+        stat = source.stat()
+        version = (stat.st_size, stat.st_mtime_ns)
+
+        with self._lock:
+            loading = self._loading.setdefault(source, threading.Lock())
+
+        with loading:
+            loaded = self._loaded.get(source)
+            if loaded is None or loaded[0] != version:
+                loaded = self._loaded[source] = (version, self._load(source))
+
+        return loaded[1]
+
+
+class ConverterCache(object):
+    """The track converter and list writer for each (list type, music
+        path) asked for, built once. Safe to use from several threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._converters = {}  # type: Dict[Tuple[str, Optional[str]], Any]
+
+    def get(
+        self,
+        list_type: str,
+        music_path: Optional[str] = None
+    ) -> Tuple[Callable[..., str], Callable[..., None]]:
+        """
+            :param list_type: the list type.
+            :param music_path: the path to the music files, if relocating
+                them.
+            :returns: a tuple of (track converter, list writer).
+            :raises: UnknownOutputFormatError
+        """
+
+        key = (list_type, music_path)
+        with self._lock:
+            converters = self._converters.get(key)
+            if converters is None:
+                # shared by every request and never reported, so the
+                # remapper doesn't collect the unmatched locations
+                converters = self._converters[key] = get_converters(
+                    list_type,
+                    remapper=Remapper(
+                        music_path=Path(music_path),
+                        collect_unmatched=False
+                    ) if music_path else None
+                )
+
+        return converters
+
+
+class PlaylistHandler(BaseHTTPRequestHandler):
+    """Answers the requests, see the module docs for the urls."""
+
+    server_version = "Playlister"
+
+    def address_string(self) -> str:
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "-"
+
+    def log_message(self, format: str, *args: Any):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, body: str, content_type: str):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header(
+            "Content-Type",
+            "{}; charset=utf-8".format(content_type)
+        )
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _send_json(self, value: Any):
+        import json
+
+        self._send(200, json.dumps(value, indent=2), "application/json")
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        libraries = self.server.libraries
+
+        try:
+            if not parts:
+                self._send_json(OrderedDict(
+                    (name, list(libraries.playlists(name)))
+                    for name in libraries.sources()
+                ))
+
+            elif len(parts) == 1:
+                self._send_json(list(libraries.playlists(parts[0])))
+
+            elif len(parts) == 2:
+                self._send_playlist(
+                    parts[0],
+                    parts[1],
+                    query.get("music_path", [None])[0]
+                )
+
+            else:
+                self._send(404, "Not found.\n", "text/plain")
+
+        except (KeyError, UnknownOutputFormatError):
+            self._send(404, "Not found.\n", "text/plain")
+
+        except Exception as e:
+            self._send(
+                500,
+                "{}: {}\n".format(type(e).__name__, e),
+                "text/plain"
+            )
+
+    do_HEAD = do_GET
+
+    def _send_playlist(
+        self,
+        library: str,
+        file_name: str,
+        music_path: Optional[str]
+    ):
+        name, _, list_type = file_name.rpartition(".")
+        if list_type not in FORMATS:
+            raise UnknownOutputFormatError(list_type)
+
+        list_name, tracks = self.server.libraries.playlists(library)[name]
+        convert_track, write_list = self.server.converters.get(
+            list_type,
+            music_path
+        )
+
+        buffer = StringIO()
+        write_list(buffer, list_name, map(convert_track, tracks))
+        self._send(
+            200,
+            buffer.getvalue(),
+            CONTENT_TYPES.get(list_type, "text/plain")
+        )
+
+
+class PlaylistServer(ThreadingMixIn, HTTPServer):
+    """Serves a LibraryCache over TCP, a thread per request.
+
+        :param address: the (host, port) to listen on, port 0 picks a free
+            one.
+        :param libraries: the libraries to serve.
+        :param verbose: log every request to stderr.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        address: Any,
+        libraries: LibraryCache,
+        verbose: Optional[bool] = False
+    ):
+        self.libraries = libraries
+        self.converters = ConverterCache()
+        self.verbose = verbose
+        super().__init__(address, PlaylistHandler)
+
+
+class UnixPlaylistServer(PlaylistServer):
+    """Serves a LibraryCache over a Unix socket, a thread per request.
+
+        :param address: the socket's path.
+    """
+
+    address_family = getattr(socket, "AF_UNIX", None)
+
+    def server_bind(self):
+        # HTTPServer's expects a (host, port) address
+        TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def make_server(
+    target_path: Path,
+    host: Optional[str] = DEFAULT_HOST,
+    port: Optional[int] = DEFAULT_PORT,
+    socket_path: Optional[Path] = None,
+    snapshot: Optional[bool] = False,
+    verbose: Optional[bool] = False
+) -> PlaylistServer:
+    """Builds the server, listening but not yet serving.
+
+        :param target_path: an xml file or a directory of them.
+        :param host: the address to listen on.
+        :param port: the port to listen on.
+        :param socket_path: a Unix socket to listen on instead of host and
+            port. A stale socket file is replaced.
+        :param snapshot: load the xml files through their snapshots.
+        :param verbose: log every request to stderr.
+        :returns: the server.
+        :raises: OSError
+    """
+
+    libraries = LibraryCache(target_path, snapshot)
+    if socket_path is None:
+        return PlaylistServer((host, port), libraries, verbose)
+
+    if socket_path.is_socket():
+        socket_path.unlink()
+
+    return UnixPlaylistServer(str(socket_path), libraries, verbose)
+
+
+def serve(
+    target_path: Path,
+    host: Optional[str] = DEFAULT_HOST,
+    port: Optional[int] = DEFAULT_PORT,
+    socket_path: Optional[Path] = None,
+    snapshot: Optional[bool] = False,
+    verbose: Optional[bool] = False
+):
+    """Serves the playlists until interrupted with Ctrl-C, see
+        make_server for the parameters.
+    """
+
+    server = make_server(
+        target_path,
+        host,
+        port,
+        socket_path,
+        snapshot,
+        verbose
+    )
+    address = str(socket_path) if socket_path else "http://{}:{}/".format(
+        *server.server_address[:2]
+    )
+    print("Serving {} on {}, Ctrl-C to stop.".format(
+        str(target_path),
+        address
+    ), file=sys.stderr)
+
+    try:
+        server.serve_forever()
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        server.server_close()
+        if socket_path:
+            try:
+                socket_path.unlink()
+
+            except OSError:
+                pass
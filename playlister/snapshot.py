@@ -0,0 +1,394 @@
+"""
+.. py:module:: snapshot
+    :platform: Unix, Windows
+    :synopsis: Binary snapshots of parsed library exports, so repeat runs
+        can skip parsing the XML while the export is unchanged.
+
+    A snapshot holds only what the writers use: the Track ID, Total Time
+    and string fields of each track, and each playlist's name, flags and
+    item order. Strings are stored once each in a utf-8 pool that the
+    fixed-size tables point into, and the file is memory-mapped when read
+    so only the tracks that are actually used get decoded.
+"""
+
+import os
+import sys
+import mmap
+import struct
+
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from playlister.files import read_library, resolve_playlists
+from playlister.manifest import file_digest
+from playlister.track import Track
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+MAGIC = b"PLSNAP\x00\x02"
+
+# magic, source size, source mtime_ns, source sha256, track count,
+# playlist count, playlist item count, string pool size
+HEADER = struct.Struct("<8sQq32sIIIQ")
+
+STRING_FIELDS = (
+    "Persistent ID",
+    "Location",
+    "Name",
+    "Artist",
+    "Album Artist",
+    "Composer",
+    "Album"
+)
+
+# (offset, length) pairs per track
+STRING_WIDTH = 2 * len(STRING_FIELDS)
+
+# name offset, name length, flags, playlist id, first item, item count
+PLAYLIST_WIDTH = 6
+
+MASTER = 1
+FOLDER = 2
+
+# a playlist item that isn't in the track table, which leaves a single
+# export's playlist empty as with load_plist
+UNRESOLVED = 4
+
+# where the source mtime is in the header, to refresh it
+MTIME_OFFSET = 16
+MTIME = struct.Struct("<q")
+
+# length of a field the track doesn't have
+MISSING = 0xFFFFFFFF
+
+
+def snapshot_path(source: Path) -> Path:
+    """
+        :param source: the xml export.
+        :returns: where the export's snapshot is kept.
+    """
+
+    return source.with_name(source.name + SNAPSHOT_SUFFIX)
+
+
+def _to_little_endian(table: array) -> bytes:
+    if sys.byteorder != "little":
+        table = array(table.typecode, table)
+        table.byteswap()
+
+    return table.tobytes()
+
+
+def write_snapshot(
+    source: Path,
+    tracks: Dict[str, Track],
+    playlists: List[Dict[str, Any]]
+):
+    """Writes a snapshot of a parsed export next to it.
+
+        :param source: the xml export that was parsed.
+        :param tracks: the track records by track id, from read_library.
+        :param playlists: the playlists, from read_library.
+        :raises: OSError
+    """
+
+    stat = source.stat()
+    digest = bytes.fromhex(file_digest(source))
+
+    pool = bytearray()
+    interned = {}  # type: Dict[str, Tuple[int, int]]
+
+    def intern(value: Any) -> Tuple[int, int]:
+        if value is None:
+            return 0, MISSING
+
+        value = str(value)
+        location = interned.get(value)
+        if location is None:
+            data = value.encode("utf-8")
+            location = interned[value] = (len(pool), len(data))
+            pool.extend(data)
+
+        return location
+
+    positions = {}
+    numbers = array("q")
+    strings = array("I")
+    for position, (track_id, record) in enumerate(tracks.items()):
+        positions[track_id] = position
+        numbers.append(int(record.get("Track ID", track_id)))
+        numbers.append(int(record.get("Total Time", -1)))
+        for field in STRING_FIELDS:
+            strings.extend(intern(record.get(field)))
+
+    meta = array("I")
+    items = array("I")
+    for playlist in playlists:
+        playlist_items = playlist.get("Playlist Items", [])
+        ordering = [positions[i] for i in playlist_items if i in positions]
+        flags = (
+            (MASTER if playlist.get("Master") else 0) |
+            (FOLDER if playlist.get("Folder") else 0) |
+            (UNRESOLVED if len(ordering) < len(playlist_items) else 0)
+        )
+
+        meta.extend(intern(playlist.get("Name")))
+        meta.extend((
+            flags,
+            int(playlist.get("Playlist ID", 0)),
+            len(items),
+            len(ordering)
+        ))
+        items.extend(ordering)
+
+    path = snapshot_path(source)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as f:
+        f.write(HEADER.pack(
+            MAGIC,
+            stat.st_size,
+            stat.st_mtime_ns,
+            digest,
+            len(tracks),
+            len(playlists),
+            len(items),
+            len(pool)
+        ))
+        for table in (numbers, strings, meta, items):
+            f.write(_to_little_endian(table))
+
+        f.write(pool)
+
+    os.replace(str(tmp_path), str(path))
+
+
+def _table(view: memoryview, typecode: str) -> Any:
+    """Views a section of the snapshot as an array of numbers, without
+        copying unless the platform isn't little-endian.
+    """
+
+    if sys.byteorder == "little":
+        return view.cast(typecode)
+
+    table = array(typecode, view.tobytes())
+    table.byteswap()
+    return table
+
+
+def _resolve(
+    view: memoryview,
+    counts: Tuple[int, int, int, int],
+    library: bool
+) -> List[Tuple[str, List[Track]]]:
+    """Decodes the playlists needed from a mapped snapshot, and the tracks
+        in them. Each track is decoded once and shared between playlists.
+    """
+
+    num_tracks, num_playlists, num_items, pool_size = counts
+
+    # every view into the mapping must be released before it's closed
+    offset = HEADER.size
+    sections = []  # type: List[memoryview]
+    tables = []  # type: List[Any]
+    try:
+        for size in (
+            num_tracks * 2 * 8,
+            num_tracks * STRING_WIDTH * 4,
+            num_playlists * PLAYLIST_WIDTH * 4,
+            num_items * 4,
+            pool_size
+        ):
+            sections.append(view[offset:offset + size])
+            offset += size
+
+        if offset != len(view):
+            raise ValueError("Truncated or corrupt snapshot.")
+
+        tables = [
+            _table(section, typecode)
+            for section, typecode in zip(sections, "qIII")
+        ]
+        numbers, strings, meta, items = tables
+        pool = sections[4]
+
+        def text(start: int, length: int) -> str:
+            return str(pool[start:start + length], "utf-8")
+
+        decoded = {}  # type: Dict[int, Track]
+
+        def track(position: int) -> Track:
+            record = decoded.get(position)
+            if record is None:
+                fields = {"Track ID": numbers[position * 2]}
+                total_time = numbers[position * 2 + 1]
+                if total_time >= 0:
+                    fields["Total Time"] = total_time
+
+                base = position * STRING_WIDTH
+                for i, field in enumerate(STRING_FIELDS):
+                    length = strings[base + i * 2 + 1]
+                    if length != MISSING:
+                        fields[field] = text(strings[base + i * 2], length)
+
+                record = decoded[position] = Track(fields)
+
+            return record
+
+        playlists = []
+        for i in range(num_playlists):
+            name_start, name_length, flags, playlist_id, first, count = (
+                meta[i * PLAYLIST_WIDTH:(i + 1) * PLAYLIST_WIDTH]
+            )
+
+            if library and flags & (MASTER | FOLDER):
+                continue
+
+            # like load_plist, a single export's playlist with an item
+            # that isn't a track has no tracks
+            if not library and flags & UNRESOLVED:
+                return []
+
+            if name_length != MISSING and name_length:
+                name = text(name_start, name_length)
+
+            else:
+                name = "Playlist {}".format(
+                    playlist_id or len(playlists) + 1
+                )
+
+            playlists.append((
+                name,
+                [track(p) for p in items[first:first + count]]
+            ))
+
+            # like load_plist, only the first playlist of a single export
+            if not library:
+                break
+
+        return playlists
+
+    finally:
+        for table in tables:
+            if isinstance(table, memoryview):
+                table.release()
+
+        for section in sections:
+            section.release()
+
+
+def _refresh_mtime(path: Path, mtime_ns: int):
+    """Records an export's new mtime in its snapshot's header, in place.
+        It's only a hint, so a snapshot that can't be written is left.
+    """
+
+    try:
+        with path.open("r+b") as f:
+            f.seek(MTIME_OFFSET)
+            f.write(MTIME.pack(mtime_ns))
+
+    except OSError:
+        pass
+
+
+def read_snapshot(
+    source: Path,
+    library: Optional[bool] = False
+) -> Optional[List[Tuple[str, List[Track]]]]:
+    """Loads the playlists from an export's snapshot, if it has an up to
+        date one. A snapshot is up to date when the export's size and mtime
+        match, or failing that its content hash does, in which case the
+        new mtime is recorded so the export isn't hashed again.
+
+        :param source: the xml export.
+        :param library: return every playlist except the master Library
+            playlist and folders, like load_library, instead of only the
+            first one, like load_plist.
+        :returns: a list of (playlist name, track records) tuples, or None
+            if there's no usable snapshot.
+    """
+
+    path = snapshot_path(source)
+    try:
+        with path.open("rb") as f:
+            magic, size, mtime_ns, digest, *counts = HEADER.unpack(
+                f.read(HEADER.size)
+            )
+
+            if magic != MAGIC:
+                return None
+
+            stat = source.stat()
+            if stat.st_size != size:
+                return None
+
+            if stat.st_mtime_ns != mtime_ns:
+                if bytes.fromhex(file_digest(source)) != digest:
+                    return None
+
+                _refresh_mtime(path, stat.st_mtime_ns)
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return _resolve(view, tuple(counts), bool(library))
+
+    except (OSError, ValueError, IndexError, struct.error):
+        return None
+
+
+def load_playlists(
+    source: Path,
+    library: Optional[bool] = False,
+    verbose: Optional[bool] = False
+) -> List[Tuple[str, List[Track]]]:
+    """Loads the playlists from an export, from its snapshot if that's up
+        to date, otherwise by parsing it and writing a new snapshot. If the
+        snapshot can't be written, e.g. the export is on read-only storage,
+        the parsed playlists are still returned.
+
+        :param source: the xml export.
+        :param library: as for read_snapshot.
+        :param verbose: toggles verbose output.
+        :returns: a list of (playlist name, track records) tuples.
+    """
+
+    playlists = read_snapshot(source, library)
+    if playlists is not None:
+        if verbose:
+            print("Read snapshot of {}.".format(source.resolve()))
+
+        return playlists
+
+    if verbose:
+        print("Reading {}...".format(source.resolve()))
+
+    try:
+        tracks, parsed = read_library(source)
+
+    # same as load_plist, an unreadable export just has no tracks
+    except Exception:
+        if verbose:
+            print("...not a valid iTunes playlist file. Skipping...")
+        return []
+
+    try:
+        write_snapshot(source, tracks, parsed)
+
+    except OSError:
+        if verbose:
+            print("...couldn't write a snapshot of it.")
+
+    if library:
+        return resolve_playlists(tracks, parsed)
+
+    if not parsed:
+        return []
+
+    try:
+        first = parsed[0]
+        return [(first.get("Name", ""), [
+            tracks[i] for i in first.get("Playlist Items", [])
+        ])]
+
+    except KeyError:
+        return []
@@ -0,0 +1,193 @@
+"""
+.. py:module:: stats
+    :platform: Unix, Windows
+    :synopsis: Per-stage timings and counters for a playlister run.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter, process_time
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO
+
+STAGES = (
+    "glob", "scan", "parse", "convert", "relink", "verify", "render", "write"
+)
+
+COUNTERS = (
+    "files",
+    "skipped",
+    "failed",
+    "playlists",
+    "tracks",
+    "missing",
+    "bytes_read",
+    "bytes_written",
+    "written",
+    "unchanged"
+)
+
+
+class Stats(object):
+    """Collects the wall and CPU time spent in each stage of a run, along
+        with counts of files, tracks and bytes. Stage times are exclusive:
+        time spent in a stage nested inside another, e.g. converting tracks
+        while rendering a list, only counts towards the inner one.
+
+        Timing individual tracks adds a little overhead, so the per-call
+        wrappers from timed are only installed when enabled.
+    """
+
+    def __init__(self, enabled: bool = True):
+        """
+            :param enabled: whether to time the per-track work.
+        """
+
+        self.enabled = enabled
+        self.stages = OrderedDict(
+            (stage, [0.0, 0.0]) for stage in STAGES + ("total",)
+        )
+        self.counters = OrderedDict((counter, 0) for counter in COUNTERS)
+
+        # [start wall, start cpu, nested wall, nested cpu] per open timer
+        self._running = []
+
+    def _start(self):
+        self._running.append([perf_counter(), process_time(), 0.0, 0.0])
+
+    def _stop(self, stage: str):
+        wall_start, cpu_start, nested_wall, nested_cpu = self._running.pop()
+        wall = perf_counter() - wall_start
+        cpu = process_time() - cpu_start
+
+        totals = self.stages[stage]
+        totals[0] += wall - nested_wall
+        totals[1] += cpu - nested_cpu
+
+        if self._running:
+            self._running[-1][2] += wall
+            self._running[-1][3] += cpu
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Times the enclosed block as part of a stage.
+
+            :param stage: the stage to count the time towards.
+        """
+
+        self._start()
+        try:
+            yield
+
+        finally:
+            self._stop(stage)
+
+    def timed(
+        self,
+        stage: str,
+        func: Callable[..., Any]
+    ) -> Callable[..., Any]:
+        """Wraps a function so that every call is timed as part of a stage,
+            if enabled.
+
+            :param stage: the stage to count the time towards.
+            :param func: the function to time.
+            :returns: the wrapped function, or func itself if not enabled.
+        """
+
+        if not self.enabled:
+            return func
+
+        def timed_call(*args, **kwargs):
+            self._start()
+            try:
+                return func(*args, **kwargs)
+
+            finally:
+                self._stop(stage)
+
+        return timed_call
+
+    def count(self, counter: str, n: int = 1):
+        """Adds n to a counter.
+
+            :param counter: the counter to increment.
+            :param n: the amount to add.
+        """
+
+        self.counters[counter] += n
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+            :returns: the timings and counters as plain, json serializable
+                dicts.
+        """
+
+        return {
+            "stages": OrderedDict(
+                (stage, {"wall": wall, "cpu": cpu})
+                for stage, (wall, cpu) in self.stages.items()
+            ),
+            "counters": OrderedDict(self.counters)
+        }
+
+    def merge(self, other: Dict[str, Any]):
+        """Adds in the timings and counters from another run, e.g. one done
+            in a worker process.
+
+            :param other: the other run's stats, from as_dict.
+        """
+
+        for stage, times in other["stages"].items():
+            self.stages[stage][0] += times["wall"]
+            self.stages[stage][1] += times["cpu"]
+
+        for counter, n in other["counters"].items():
+            self.counters[counter] += n
+
+    def report(self, format: Optional[str] = "text") -> str:
+        """Formats the stats for printing.
+
+            :param format: either text or json.
+            :returns: the formatted report.
+        """
+
+        if format == "json":
+            import json
+
+            return json.dumps(self.as_dict(), indent=2)
+
+        lines = ["{:<10} {:>10} {:>10}".format("stage", "wall (s)", "cpu (s)")]
+        for stage, (wall, cpu) in self.stages.items():
+            lines.append("{:<10} {:>10.3f} {:>10.3f}".format(stage, wall, cpu))
+
+        counters = self.counters
+        lines += [
+            "files: {} converted, {} skipped, {} failed".format(
+                counters["files"],
+                counters["skipped"],
+                counters["failed"]
+            ),
+            "playlists: {}, tracks: {}, missing: {}".format(
+                counters["playlists"],
+                counters["tracks"],
+                counters["missing"]
+            ),
+            "bytes: {} read, {} written".format(
+                counters["bytes_read"],
+                counters["bytes_written"]
+            ),
+            "outputs: {} written, {} unchanged".format(
+                counters["written"],
+                counters["unchanged"]
+            )
+        ]
+
+        return "\n".join(lines)
+
+
+class TimedWriter(object):
+    """Wraps a file object so that its writes are timed as the write stage.
+    """
+
+    def __init__(self, f: TextIO, stats: Stats):
+        self.write = stats.timed("write", f.write)
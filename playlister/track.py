@@ -0,0 +1,93 @@
+"""
+.. py:module:: track
+    :platform: Unix, Windows
+    :synopsis: A compact track record for playlister, keeping only the
+        fields the playlist writers use out of the 30-odd in an export.
+"""
+
+from collections.abc import Mapping
+from sys import intern
+from typing import Any, Iterator, Optional
+
+# plist key -> attribute, for every field that's kept
+FIELDS = (
+    ("Track ID", "track_id"),
+    ("Persistent ID", "persistent_id"),
+    ("Location", "location"),
+    ("Total Time", "total_time"),
+    ("Name", "name"),
+    ("Artist", "artist"),
+    ("Album Artist", "album_artist"),
+    ("Composer", "composer"),
+    ("Album", "album")
+)
+
+# fields whose values repeat across a library, e.g. a few hundred artists
+# over 100k tracks, each value is kept as one shared string
+INTERNED = frozenset(("Artist", "Album Artist", "Composer", "Album"))
+
+_ATTRIBUTES = dict(FIELDS)
+_INIT_FIELDS = tuple(
+    (key, attribute, key in INTERNED) for key, attribute in FIELDS
+)
+
+
+class Track(Mapping):
+    """A read-only track record. It's a Mapping with the same keys as the
+        plist record it was made from, so it can be used anywhere a track
+        dict was, but other fields are dropped and the rest are kept in
+        slots rather than a dict. Missing fields are left out, as they
+        would be from the dict.
+
+        Like dict, it's made from a record and/or keyword arguments, so a
+        copy with a new location is ``Track(track, Location=location)``.
+        The INTERNED fields are interned, so equal values share one string.
+
+        :param record: the track record to copy the fields from.
+        :param changes: fields to set instead of the record's.
+    """
+
+    __slots__ = tuple(attribute for _, attribute in FIELDS)
+
+    def __init__(self, record: Optional[Mapping] = None, **changes: Any):
+        get = record.get if record is not None else changes.get
+        copied = isinstance(record, Track)
+        for key, attribute, interned in _INIT_FIELDS:
+            if key in changes:
+                value = changes[key]
+
+            else:
+                value = get(key)
+                # a Track's values are interned already
+                if copied:
+                    setattr(self, attribute, value)
+                    continue
+
+            if interned and type(value) is str:
+                value = intern(value)
+
+            setattr(self, attribute, value)
+
+    def __getitem__(self, key: str) -> Any:
+        value = getattr(self, _ATTRIBUTES[key])
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def get(self, key: str, default: Any = None) -> Any:
+        # the writers call this a lot, skip Mapping's try/except
+        attribute = _ATTRIBUTES.get(key)
+        value = getattr(self, attribute) if attribute else None
+        return default if value is None else value
+
+    def __iter__(self) -> Iterator[str]:
+        for key, attribute in FIELDS:
+            if getattr(self, attribute) is not None:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return "Track({!r})".format(dict(self))
@@ -0,0 +1,172 @@
+"""
+.. py:module:: verify
+    :platform: Unix, Windows
+    :synopsis: Checks that the rewritten track locations exist on the
+        target, against an index of the music directory built with a
+        single scan rather than a stat per track.
+"""
+
+import os.path
+
+from collections import OrderedDict
+from pathlib import Path
+from typing import (
+    Any, Dict, Iterable, Iterator, List, Mapping, Optional, Union
+)
+
+from playlister.playlister_utils import normalize
+from playlister.remap import decode_location
+from playlister.scan import DEFAULT_WORKERS, scan_files
+
+
+def normalize_path(path: str) -> str:
+    """
+        :param path: an unquoted path.
+        :returns: the path in the form it's indexed under, so that e.g.
+            decomposed accents from a mac still match.
+    """
+
+    return normalize(os.path.normpath(path))
+
+
+class MusicIndex(object):
+    """The set of files under a music directory, checked in memory.
+
+        :param paths: the file paths in the directory.
+        :param root: the directory, for reporting.
+    """
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        root: Union[str, Path, None] = None
+    ):
+        self.root = root
+        self.paths = frozenset(normalize_path(path) for path in paths)
+
+    @classmethod
+    def scan(
+        cls,
+        root: Union[str, Path],
+        workers: Optional[int] = DEFAULT_WORKERS
+    ) -> "MusicIndex":
+        """Indexes every file under a directory, see scan.scan_files.
+
+            :param root: the music directory.
+            :param workers: how many directories to list at once.
+            :returns: the index.
+        """
+
+        return cls(
+            (entry.path for entry in scan_files(root, workers)),
+            root
+        )
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __contains__(self, location: str) -> bool:
+        """
+            :param location: a track location, quoted or a file url.
+            :returns: whether the file is in the index.
+        """
+
+        return normalize_path(decode_location(location)) in self.paths
+
+
+class Verifier(object):
+    """Records the tracks of each playlist whose location isn't in a
+        MusicIndex.
+
+        :param index: the files that exist on the target.
+    """
+
+    def __init__(self, index: MusicIndex):
+        self.index = index
+        self.missing = OrderedDict()  # type: OrderedDict
+
+    def check(
+        self,
+        playlist: str,
+        tracks: Iterable[Mapping[str, Any]]
+    ) -> List[str]:
+        """Checks the rewritten tracks of one playlist.
+
+            :param playlist: the playlist, as it's to be reported.
+            :param tracks: the tracks, after their locations are rewritten.
+            :returns: the locations that don't exist, unquoted.
+        """
+
+        missing = []  # type: List[str]
+        for _ in self.checking(playlist, tracks, missing):
+            pass
+
+        return missing
+
+    def checking(
+        self,
+        playlist: str,
+        tracks: Iterable[Mapping[str, Any]],
+        missing: List[str]
+    ) -> Iterator[Mapping[str, Any]]:
+        """Same as check, but passes each track on once it's checked, so
+            a playlist can be written out as it's verified. The missing
+            tracks are recorded when the tracks run out.
+
+            :param playlist: the playlist, as it's to be reported.
+            :param tracks: the tracks, after their locations are rewritten.
+            :param missing: the locations that don't exist are added to it,
+                unquoted.
+            :returns: an iterator of the same tracks.
+        """
+
+        paths = self.index.paths
+        for track in tracks:
+            path = decode_location(track.get("Location", ""))
+            if normalize_path(path) not in paths:
+                missing.append(path)
+
+            yield track
+
+        if missing:
+            self.missing[playlist] = missing
+
+    def merge(self, missing: Dict[str, List[str]]) -> None:
+        """Adds the missing tracks found by another Verifier, e.g. in a
+            worker process.
+
+            :param missing: its missing attribute.
+        """
+
+        self.missing.update(missing)
+
+    def report(self, verbose: Optional[bool] = False) -> Optional[str]:
+        """Summarizes the missing tracks, per playlist.
+
+            :param verbose: list every missing track instead of the first
+                few of each playlist.
+            :returns: the report, or None if every track was found.
+        """
+
+        if not self.missing:
+            return None
+
+        count = sum(len(paths) for paths in self.missing.values())
+        lines = ["{} tracks in {} playlists are missing from {}:".format(
+            count,
+            len(self.missing),
+            str(self.index.root or "the music path")
+        )]
+
+        for playlist, paths in self.missing.items():
+            shown = paths if verbose else paths[:5]
+            lines.append("  {} ({} missing)".format(playlist, len(paths)))
+            lines.extend("    " + path for path in shown)
+            if len(shown) < len(paths):
+                lines.append(
+                    "    ...and {} more, --verbose lists them.".format(
+                        len(paths) - len(shown)
+                    )
+                )
+
+        return "\n".join(lines)
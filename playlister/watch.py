@@ -0,0 +1,242 @@
+"""
+.. py:module:: watch
+    :platform: Unix, Windows
+    :synopsis: Watches xml exports for changes, so playlister can keep
+        running and reconvert only the files that change.
+
+    On Linux the watch uses inotify through libc, elsewhere (or if that
+    isn't available) it polls the files' sizes and mtimes. Changes are
+    debounced: a batch is handed off once no more changes have come in for
+    a short while, so a file that is still being written, or a whole
+    directory being re-exported, is converted once rather than repeatedly.
+"""
+
+import os
+import sys
+import time
+import select
+import struct
+
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from playlister.files import glob_xml_files, is_xml_file
+
+# seconds without changes before a batch is converted
+DEFAULT_DEBOUNCE = 0.5
+
+# seconds between scans when polling
+DEFAULT_INTERVAL = 1.0
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0)
+
+# wd, mask, cookie, length of the name that follows
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher(object):
+    """Finds changed exports by comparing their sizes and mtimes with the
+        last scan. New files count as changed, removed ones are ignored.
+
+        :param target: an xml file or a directory of them.
+        :param interval: seconds between scans.
+    """
+
+    def __init__(self, target: Path, interval: float = DEFAULT_INTERVAL):
+        self.target = target
+        self.interval = interval
+        self.state = self.scan()
+
+    def scan(self) -> Dict[Path, Tuple[int, int]]:
+        """
+            :returns: the (size, mtime) of each watched file by path.
+        """
+
+        paths = (
+            glob_xml_files(self.target) if self.target.is_dir()
+            else [self.target]
+        )
+
+        state = {}
+        for path in paths:
+            try:
+                stat = path.stat()
+
+            # removed since the glob
+            except OSError:
+                continue
+
+            state[path] = (stat.st_size, stat.st_mtime_ns)
+
+        return state
+
+    def poll(self, timeout: float) -> Set[Path]:
+        """Waits for the next scan and returns what changed since the last.
+
+            :param timeout: the most seconds to wait.
+            :returns: the changed files.
+        """
+
+        time.sleep(min(timeout, self.interval))
+        state = self.scan()
+        changed = {
+            path for path, signature in state.items()
+            if self.state.get(path) != signature
+        }
+
+        self.state = state
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher(object):
+    """Finds changed exports with inotify, which reports each file as it's
+        closed after writing or moved into place.
+
+        :param target: an xml file or a directory of them.
+        :raises: OSError if inotify isn't available.
+    """
+
+    def __init__(self, target: Path):
+        import ctypes
+        import ctypes.util
+
+        self.target = target
+        self.directory = target if target.is_dir() else target.parent
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        try:
+            init = libc.inotify_init1
+            add_watch = libc.inotify_add_watch
+
+        except AttributeError:
+            raise OSError("inotify is not available.")
+
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        if add_watch(
+            self.fd,
+            os.fsencode(str(self.directory)),
+            IN_CLOSE_WRITE | IN_MOVED_TO
+        ) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), str(self.directory))
+
+    def poll(self, timeout: float) -> Set[Path]:
+        """Waits for events and returns the files they were for.
+
+            :param timeout: the most seconds to wait.
+            :returns: the changed files.
+        """
+
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            path = self.directory / os.fsdecode(name)
+            if not is_xml_file(path):
+                continue
+
+            if self.target.is_dir() or path == self.target:
+                changed.add(path)
+
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def open_watcher(
+    target: Path,
+    interval: float = DEFAULT_INTERVAL
+):
+    """
+        :param target: an xml file or a directory of them.
+        :param interval: seconds between scans, if polling.
+        :returns: an InotifyWatcher on Linux, or a PollingWatcher if
+            inotify isn't available.
+    """
+
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(target)
+
+        except OSError:
+            pass
+
+    return PollingWatcher(target, interval)
+
+
+def watch(
+    target: Path,
+    on_change: Callable[[List[Path]], None],
+    debounce: float = DEFAULT_DEBOUNCE,
+    interval: float = DEFAULT_INTERVAL,
+    watcher=None,
+    stop: Optional[Callable[[], bool]] = None
+):
+    """Calls on_change with each debounced batch of changed exports, until
+        interrupted. Changes that come in while a batch is waiting push it
+        back and are coalesced into it, so each file appears once.
+
+        :param target: an xml file or a directory of them.
+        :param on_change: called with the sorted paths of each batch.
+        :param debounce: seconds without changes before a batch is handed
+            off.
+        :param interval: seconds between scans, if polling.
+        :param watcher: the watcher to use, defaults to open_watcher's.
+        :param stop: checked between waits, watching ends once it returns
+            True. Otherwise watching ends with Ctrl-C.
+    """
+
+    watcher = watcher or open_watcher(target, interval)
+    pending = set()  # type: Set[Path]
+    deadline = None
+
+    try:
+        while not (stop and stop()):
+            timeout = (
+                interval if deadline is None
+                else max(0.0, deadline - time.monotonic())
+            )
+
+            changed = watcher.poll(timeout)
+            if changed:
+                pending |= changed
+                deadline = time.monotonic() + debounce
+
+            elif pending and time.monotonic() >= deadline:
+                batch = sorted(pending)
+                pending = set()
+                deadline = None
+                on_change(batch)
+
+    except KeyboardInterrupt:
+        pass
+
+    finally:
+        watcher.close()
@@ -4,12 +4,41 @@
     :synopsis: Defines all xspf-related operations for playlister.
 """
 
+from functools import lru_cache
 from urllib.parse import unquote, quote
 from unicodedata import normalize as uni_norm
-from xml.sax.saxutils import escape as esc_xml
-from typing import Dict, List
+from typing import Dict, List, Iterable, TextIO
+
+from playlister.playlister_utils import (
+    FIELD_CACHE_SIZE, pipe, normalize, write_joined
+)
+
+
+def esc_xml(data: str) -> str:
+    """Escapes &, < and > in a string of data, same as
+        xml.sax.saxutils.escape without the cost of importing it, which
+        drags in urllib.request.
+
+        :param data: the string to escape.
+        :returns: the escaped string.
+    """
+
+    # & has to go first so the others aren't escaped twice
+    data = data.replace("&", "&amp;")
+    return data.replace("<", "&lt;").replace(">", "&gt;")
+
+
+@lru_cache(maxsize=FIELD_CACHE_SIZE)
+def esc_field(value: str) -> str:
+    """Escapes a repeating field such as the artist or album, remembering
+        the result for the next track with the same value.
+
+        :param value: the field's value.
+        :returns: the escaped value.
+    """
+
+    return esc_xml(value)
 
-from playlister.playlister_utils import pipe, normalize
 
 escape_xspf_path = pipe(unquote, normalize, quote, esc_xml)
 
@@ -29,6 +58,8 @@ XSPF_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
 </playlist>
 """
 
+XSPF_HEAD, XSPF_TAIL = XSPF_TEMPLATE.split("{tracks}")
+
 
 def to_xspf_track(record: Dict[str, str]) -> str:
     """Converts a single track record into xspf format.
@@ -38,9 +69,9 @@ def to_xspf_track(record: Dict[str, str]) -> str:
     """
     location = "file://" + escape_xspf_path(record.get("Location"))
     duration = record.get("Total Time", "")
-    album = esc_xml(record.get("Album", ""))
+    album = esc_field(record.get("Album", ""))
     name = esc_xml(record.get("Name", ""))
-    artist = esc_xml(
+    artist = esc_field(
         record.get("Artist") or
         record.get("Album Artist") or
         record.get("Composer", "")
@@ -64,3 +95,15 @@ def to_xspf_list(list_name: str, tracks: List[str]) -> str:
     """
 
     return XSPF_TEMPLATE.format(name=list_name, tracks="\n".join(tracks))
+
+
+def write_xspf_list(f: TextIO, list_name: str, tracks: Iterable[str]) -> None:
+    """Streams a playlist of serialized xspf tracks to a file, writing each
+        track as it is produced. Output is identical to to_xspf_list.
+
+        :param f: the file object to write to.
+        :param list_name: name of the playlist.
+        :param tracks: iterable of xspf tracks to include.
+    """
+
+    write_joined(f, XSPF_HEAD, tracks, XSPF_TAIL)
@@ -12,3 +12,20 @@ import playlister.m3u as m3u
 import playlister.xspf as xspf
 import playlister.playlister_utils as utils
 import playlister.app as playlister
+import playlister.manifest as manifest
+import playlister.cache as cache
+import playlister.remap as remap
+import playlister.stats as stats
+import playlister.formats as formats
+import playlister.snapshot as snapshot
+import playlister.index as index
+import playlister.track as track
+import playlister.watch as watch
+import playlister.pipeline as pipeline
+import playlister.output as output
+import playlister.profiles as profiles
+import playlister.scan as scan
+import playlister.verify as verify
+import playlister.relink as relink
+import playlister.archive as archive
+import playlister.server as server
@@ -0,0 +1,85 @@
+"""
+.. py:module:: test_archive
+    :platform: Unix, Windows
+    :synopsis: tests streaming playlists into archives for playlister.
+"""
+
+import io
+import tarfile
+import zipfile
+
+from pathlib import Path
+
+import pytest
+
+from .context import archive
+
+
+class Unseekable(io.RawIOBase):
+    """A write-only stream that can't seek, like a pipe."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self.data += b
+        return len(b)
+
+
+class TestArchive(object):
+    """Groups the tests of archive output."""
+
+    def test_archive_format(self):
+        """Formats are guessed from the name, stdout is a tar."""
+
+        for name, format in [
+            ("lists.zip", "zip"),
+            ("lists.TAR", "tar"),
+            ("lists.tgz", "tar.gz"),
+            ("lists.tar.xz", "tar.xz"),
+            ("-", "tar")
+        ]:
+            assert(archive.archive_format(name) == format)
+
+        with pytest.raises(archive.UnknownArchiveFormatError):
+            archive.archive_format("lists.rar")
+
+        with pytest.raises(archive.UnknownArchiveFormatError):
+            archive.Archive(io.BytesIO(), "rar")
+
+    @pytest.mark.parametrize("format", archive.ARCHIVE_FORMATS)
+    def test_stream(self, format):
+        """Every format can be written to a stream that can't seek."""
+
+        stream = Unseekable()
+        with archive.Archive(stream, format, Path("/out")) as lists:
+            for path in [Path("/out/a.m3u"), Path("/out/lib/b.m3u")]:
+                entry = lists.entry(path)
+                entry.open().write("#EXTM3U\n{}\n".format(path.stem))
+                assert(entry.commit())
+
+            entry = lists.entry(Path("/elsewhere/c.m3u"))
+            entry.open().write("dropped")
+            entry.discard()
+
+        data = io.BytesIO(bytes(stream.data))
+        if format == "zip":
+            with zipfile.ZipFile(data) as f:
+                contents = {n: f.read(n) for n in f.namelist()}
+
+        else:
+            with tarfile.open(fileobj=data) as f:
+                contents = {
+                    m.name: f.extractfile(m).read() for m in f.getmembers()
+                }
+
+        assert(contents == {
+            "a.m3u": b"#EXTM3U\na\n",
+            "lib/b.m3u": b"#EXTM3U\nb\n"
+        })
+        assert(archive.Archive(io.BytesIO(), format).name_of(
+            Path("/elsewhere/c.m3u")
+        ) == "c.m3u")
@@ -0,0 +1,84 @@
+"""
+.. py:module:: test_cache
+    :platform: Unix, Windows
+    :synopsis: tests the converted track cache for playlister.
+"""
+
+import pytest
+
+from .context import cache
+
+
+def track(persistent_id: str, name: str = "testing123") -> dict:
+    return {"Persistent ID": persistent_id, "Name": name, "Location": "/a"}
+
+
+class TestTrackCache(object):
+    """Groups the tests of the converted track cache."""
+
+    def test_hits_and_misses(self):
+        """Each distinct track is only converted once."""
+
+        calls = []
+        track_cache = cache.TrackCache()
+        convert = track_cache.wrap(
+            lambda t: calls.append(t) or t["Name"], "m3u", None
+        )
+
+        results = [convert(track(i)) for i in ["A", "B", "A", "A", "B"]]
+        assert(results == ["testing123"] * 5)
+        assert(len(calls) == 2)
+        assert((track_cache.hits, track_cache.misses) == (3, 2))
+
+    def test_context(self):
+        """Converters with different contexts don't share results."""
+
+        track_cache = cache.TrackCache()
+        m3u = track_cache.wrap(lambda t: "m3u", "m3u", None)
+        xspf = track_cache.wrap(lambda t: "xspf", "xspf", None)
+
+        assert(m3u(track("A")) == "m3u")
+        assert(xspf(track("A")) == "xspf")
+
+    def test_changed_track(self):
+        """The same id with different metadata is converted again."""
+
+        track_cache = cache.TrackCache()
+        convert = track_cache.wrap(lambda t: t["Name"])
+
+        assert(convert(track("A", "old")) == "old")
+        assert(convert(track("A", "new")) == "new")
+
+    def test_eviction(self):
+        """The least recently used entry is evicted when full."""
+
+        track_cache = cache.TrackCache(2)
+        convert = track_cache.wrap(lambda t: t["Persistent ID"])
+
+        convert(track("A"))
+        convert(track("B"))
+        convert(track("A"))
+        convert(track("C"))
+
+        assert(len(track_cache) == 2)
+        assert(track_cache.evictions == 1)
+
+        convert(track("A"))
+        assert(track_cache.hits == 2)
+
+    def test_disabled(self):
+        """A cache of size 0 and tracks without ids are never cached."""
+
+        track_cache = cache.TrackCache(0)
+        convert = track_cache.wrap(lambda t: "x")
+        convert(track("A"))
+        convert(track("A"))
+
+        assert(len(track_cache) == 0)
+        assert(track_cache.hits == 0)
+
+        track_cache = cache.TrackCache()
+        convert = track_cache.wrap(lambda t: "x")
+        convert({"Name": "no id"})
+
+        assert(len(track_cache) == 0)
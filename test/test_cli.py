@@ -45,3 +45,54 @@ class TestCLI(object):
         assert(str(args["target_path"]) == resource_dir)
         assert(args["verbose"] == False)
         assert(args["list_type"] == "m3u")
+
+    def test_remap(self):
+        """Remap rules are parsed into (source, destination) tuples."""
+
+        args = cli.parse_args([
+            resource_dir,
+            "-r", "/Volumes/NAS=/mnt/nas",
+            "--remap", "/a=/b"
+        ])
+
+        assert(args["remap"] == [("/Volumes/NAS", "/mnt/nas"), ("/a", "/b")])
+
+        with pytest.raises(SystemExit):
+            cli.parse_args([resource_dir, "-r", "/Volumes/NAS"])
+
+    def test_list_types(self):
+        """Several list types are given separated by commas."""
+
+        args = cli.parse_args([resource_dir, "-t", "m3u,xspf"])
+        assert(args["list_type"] == ["m3u", "xspf"])
+
+        with pytest.raises(SystemExit):
+            cli.parse_args([resource_dir, "-t", "m3u,foo"])
+
+    def test_serve(self):
+        """serve takes its own options."""
+
+        args = cli.parse_serve_args([resource_dir, "--port", "0"])
+        assert(args["port"] == 0)
+        assert(args["host"] == "127.0.0.1")
+        assert(args["socket_path"] is None)
+
+        with pytest.raises(OSError):
+            cli.parse_serve_args([os.path.join(resource_dir, "nothing")])
+
+    def test_recursive(self):
+        """Patterns may be repeated, and only the top level is watched."""
+
+        args = cli.parse_args([
+            resource_dir,
+            "-R",
+            "--include", "users/*",
+            "--exclude", "archive",
+            "--exclude", "old"
+        ])
+        assert(args["recursive"] == True)
+        assert(args["include"] == ["users/*"])
+        assert(args["exclude"] == ["archive", "old"])
+
+        with pytest.raises(SystemExit):
+            cli.parse_args([resource_dir, "-R", "--watch"])
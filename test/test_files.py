@@ -5,14 +5,20 @@
 """
 
 import os.path
+import plistlib
 
 from unittest import mock
-from datetime import datetime
 from io import BytesIO
+from pathlib import Path
+from typing import List
 
 import pytest
 
-from test.context import files
+from test.context import files, track
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
 
 
 class TestFiles(object):
@@ -24,7 +30,7 @@ class TestFiles(object):
 
     def test_load_plist(self):
         """Tests converting a plist file to a list of track
-            records as dicts.
+            records.
         """
 
         test_plist = """<?xml version="1.0" encoding="UTF-8"?>
@@ -101,43 +107,17 @@ class TestFiles(object):
             </plist>
         """.encode()
 
+        # only the fields the writers use are kept
         expected = [{
             "Album": "Son of a Son of a Sailor",
             "Album Artist": "Jimmy Buffett",
             "Artist": "Jimmy Buffett",
-            "Artwork Count": 1,
-            "Bit Rate": 256,
             "Composer": "Jimmy Buffett",
-            "Date Added": datetime(2014, 1, 21, 23, 43, 47),
-            "Date Modified": datetime(2014, 1, 21, 23, 44, 49),
-            "Disc Count": 1,
-            "Disc Number": 1,
-            "File Folder Count": 5,
-            "Genre": "Rock",
-            "Kind": "Purchased AAC audio file",
-            "Library Folder Count": 1,
             "Location": "file:///Users/jared/Music/iTunes/iTunes%20Media/Music/Jimmy%20Buffett/Son%20of%20a%20Son%20of%20a%20Sailor/01%20Son%20of%20a%20Son%20of%20a%20Sailor.m4a",
             "Name": "Son of a Son of a Sailor",
-            "Normalization": 328,
             "Persistent ID": "E91DEF8ED62D53CD",
-            "Play Count": 12,
-            "Play Date": 3538303254,
-            "Play Date UTC": datetime(2016, 2, 14, 19, 0, 54),
-            "Purchased": True,
-            "Release Date": datetime(1978, 3, 1, 0, 0),
-            "Sample Rate": 44100,
-            "Size": 7839010,
-            "Skip Count": 2,
-            "Skip Date": datetime(2016, 2, 14, 18, 57, 29),
-            "Sort Album": "Son of a Son of a Sailor",
-            "Sort Artist": "Jimmy Buffett",
-            "Sort Name": "Son of a Son of a Sailor",
             "Total Time": 205250,
-            "Track Count": 9,
-            "Track ID": 5230,
-            "Track Number": 1,
-            "Track Type": "File",
-            "Year": 1978
+            "Track ID": 5230
         }]
 
         mock_file = BytesIO(test_plist)
@@ -145,4 +125,182 @@ class TestFiles(object):
         path_mock = mock.MagicMock()
         path_mock.open.return_value.__enter__.return_value = mock_file
 
-        assert(files.load_plist(path_mock) == expected)
+        tracks = files.load_plist(path_mock)
+        assert(tracks == expected)
+        assert(all(isinstance(t, track.Track) for t in tracks))
+
+    def test_load_plist_matches_plistlib(self):
+        """The streaming reader extracts the same records as plistlib."""
+
+        path = Path(os.path.join(resource_dir, "Buffett.xml"))
+        with path.open("rb") as f:
+            expected = files.extract_tracks(plistlib.load(f))
+
+        assert(files.load_plist(path) == expected)
+
+    def test_compressed(self, tmp_path):
+        """Compressed exports are found and read like plain ones."""
+
+        import bz2
+        import gzip
+        import lzma
+
+        path = Path(os.path.join(resource_dir, "Buffett.xml"))
+        data = path.read_bytes()
+        for suffix, module in [(".gz", gzip), (".bz2", bz2), (".xz", lzma)]:
+            (tmp_path / ("Buffett.xml" + suffix)).write_bytes(
+                module.compress(data)
+            )
+
+        (tmp_path / "Buffett.txt.gz").write_bytes(gzip.compress(data))
+        (tmp_path / ".Buffett.xml.gz").write_bytes(gzip.compress(data))
+
+        found = sorted(p.name for p in files.glob_xml_files(tmp_path))
+        assert(found == ["Buffett.xml.bz2", "Buffett.xml.gz", "Buffett.xml.xz"])
+
+        expected = files.load_plist(path)
+        for name in found:
+            assert(files.load_plist(tmp_path / name) == expected)
+
+        assert(files.strip_compression(Path("a/L.xml.xz")) == Path("a/L.xml"))
+        assert(files.strip_compression(Path("a/L.xml")) == Path("a/L.xml"))
+
+    def test_find_xml_files(self, tmp_path):
+        """Exports are found throughout the tree, filtered by pattern."""
+
+        for path in [
+            "top.xml",
+            "users/a/Library.xml",
+            "users/b/Library.xml.gz",
+            "users/b/notes.txt",
+            "users/c/old/Library.xml",
+            "archive/Library.xml",
+            ".hidden/Library.xml"
+        ]:
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).write_text("")
+
+        def find(*args, **kwargs) -> List[str]:
+            return sorted(
+                p.relative_to(tmp_path).as_posix()
+                for p in files.find_xml_files(tmp_path, *args, **kwargs)
+            )
+
+        assert(find() == [
+            "archive/Library.xml",
+            "top.xml",
+            "users/a/Library.xml",
+            "users/b/Library.xml.gz",
+            "users/c/old/Library.xml"
+        ])
+        assert(find(recursive=False, workers=1) == ["top.xml"])
+        assert(find(exclude=["archive", "old"]) == [
+            "top.xml",
+            "users/a/Library.xml",
+            "users/b/Library.xml.gz"
+        ])
+        assert(find(["users/*"], ["*.gz"]) == [
+            "users/a/Library.xml",
+            "users/c/old/Library.xml"
+        ])
+
+        # files found some other way are checked against the same patterns
+        for path, included in [
+            ("top.xml", True),
+            ("users/a/Library.xml", True),
+            ("users/b/Library.xml.gz", False),
+            ("elsewhere/Library.xml", False)
+        ]:
+            assert(files.is_included(
+                tmp_path / path, tmp_path, ["top.xml", "users/*"], ["*.gz"]
+            ) == included)
+
+        assert(files.is_included(tmp_path / "top.xml", tmp_path))
+
+        # found lazily, and only a directory can be searched
+        assert(not isinstance(files.find_xml_files(tmp_path), list))
+        with pytest.raises(OSError):
+            files.find_xml_files(tmp_path / "top.xml")
+
+    def test_iter_library(self):
+        """Tracks and playlists are yielded as they are read, with the
+            playlist items reduced to track ids.
+        """
+
+        path = Path(os.path.join(resource_dir, "Buffett.xml"))
+        with path.open("rb") as f:
+            events = list(files.iter_library(f))
+
+        kinds = [kind for kind, _, _ in events]
+        assert(kinds.count(files.PLAYLIST) == 1)
+        assert(kinds.index(files.PLAYLIST) == len(kinds) - 1)
+
+        _, _, playlist = events[-1]
+        assert(playlist["Name"] == "Buffett")
+        assert(playlist["Playlist Items"][0] == "5230")
+        assert(all(
+            track_id == str(record["Track ID"])
+            for kind, track_id, record in events if kind == files.TRACK
+        ))
+
+    def test_load_library(self):
+        """Every playlist is resolved against one shared track table,
+            skipping the master library playlist.
+        """
+
+        test_plist = """<?xml version="1.0" encoding="UTF-8"?>
+            <plist version="1.0">
+            <dict>
+                <key>Tracks</key>
+                <dict>
+                    <key>1</key>
+                    <dict><key>Track ID</key><integer>1</integer></dict>
+                    <key>2</key>
+                    <dict><key>Track ID</key><integer>2</integer></dict>
+                </dict>
+                <key>Playlists</key>
+                <array>
+                    <dict>
+                        <key>Name</key><string>Library</string>
+                        <key>Master</key><true/>
+                        <key>Playlist Items</key>
+                        <array>
+                            <dict><key>Track ID</key><integer>1</integer></dict>
+                            <dict><key>Track ID</key><integer>2</integer></dict>
+                        </array>
+                    </dict>
+                    <dict>
+                        <key>Name</key><string>First</string>
+                        <key>Playlist Items</key>
+                        <array>
+                            <dict><key>Track ID</key><integer>2</integer></dict>
+                            <dict><key>Track ID</key><integer>1</integer></dict>
+                        </array>
+                    </dict>
+                    <dict>
+                        <key>Name</key><string>Second</string>
+                        <key>Playlist Items</key>
+                        <array>
+                            <dict><key>Track ID</key><integer>2</integer></dict>
+                        </array>
+                    </dict>
+                    <dict>
+                        <key>Name</key><string>Empty</string>
+                    </dict>
+                </array>
+            </dict>
+            </plist>
+        """.encode()
+
+        path_mock = mock.MagicMock()
+        path_mock.open.return_value.__enter__.return_value = BytesIO(
+            test_plist
+        )
+
+        playlists = files.load_library(path_mock)
+        assert([name for name, _ in playlists] == ["First", "Second", "Empty"])
+
+        first, second, empty = [tracks for _, tracks in playlists]
+        assert([t["Track ID"] for t in first] == [2, 1])
+        assert(second[0] is first[0])
+        assert(empty == [])
@@ -0,0 +1,39 @@
+"""
+.. py:module:: test_formats
+    :platform: Unix, Windows
+    :synopsis: tests the output format registry for playlister.
+"""
+
+import pytest
+
+from .context import formats, m3u
+
+
+class TestFormats(object):
+    """Groups the tests of the output format registry."""
+
+    def test_load_format(self):
+        """Formats resolve to their module's functions."""
+
+        loaded = formats.load_format("m3u8")
+        assert(loaded.to_track is m3u.to_m3u_track)
+        assert(loaded.write_list is m3u.write_m3u_list)
+        assert(formats.load_format("m3u8") is loaded)
+
+    def test_unknown_format(self):
+        with pytest.raises(formats.UnknownOutputFormatError):
+            formats.load_format("wpl")
+
+    def test_register_format(self):
+        """Registered formats are loaded on first use."""
+
+        formats.register_format(
+            "test", "playlister.m3u", "to_m3u_track", "write_m3u_list"
+        )
+
+        try:
+            assert(formats.load_format("test").to_track is m3u.to_m3u_track)
+
+        finally:
+            del formats.FORMATS["test"]
+            formats._loaded.pop("test", None)
@@ -0,0 +1,149 @@
+"""
+.. py:module:: test_index
+    :platform: Unix, Windows
+    :synopsis: tests the SQLite library index for playlister.
+"""
+
+import os
+import shutil
+import sqlite3
+
+import pytest
+
+from .context import index, files, playlister, cli
+from .test_snapshot import add_unresolved_item
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
+
+
+def copy_export(tmp_path):
+    source = tmp_path / "Buffett.xml"
+    shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+    return source
+
+
+class TestLibraryIndex(object):
+    """Groups the tests of the SQLite library index."""
+
+    def test_playlists(self, tmp_path):
+        """Indexed playlists read back like the parsed ones."""
+
+        source = copy_export(tmp_path)
+        with index.LibraryIndex(tmp_path / "library.db") as db:
+            assert(db.update(source))
+            assert(not db.update(source))
+
+            ((name, tracks),) = db.playlists(source, library=True)
+            ((expected_name, expected),) = files.load_library(source)
+
+            assert(name == expected_name)
+            assert(len(tracks) == len(expected))
+
+            columns = [key for _, key in index.TRACK_COLUMNS]
+            for track, record in zip(tracks, expected):
+                assert(track["Track ID"] == int(record["Track ID"]))
+                for key in columns:
+                    assert(track.get(key) == record.get(key))
+
+    def test_unresolved(self, tmp_path):
+        """Items that aren't tracks resolve as they do without an index."""
+
+        source = copy_export(tmp_path)
+        add_unresolved_item(source)
+        with index.LibraryIndex(tmp_path / "library.db") as db:
+            db.update(source)
+
+            assert(db.playlists(source) == [])
+            ((_, tracks),) = db.playlists(source, library=True)
+            assert(len(tracks) == 18)
+
+    def test_update(self, tmp_path):
+        """A changed export replaces what was indexed from it."""
+
+        source = copy_export(tmp_path)
+        path = tmp_path / "library.db"
+        with index.LibraryIndex(path) as db:
+            db.update(source)
+
+        source.write_text(source.read_text().replace("Buffett", "Bufett"))
+        with index.LibraryIndex(path) as db:
+            assert(db.update(source))
+            assert(db.playlists(source)[0][0] == "Bufett")
+
+        # other tools can query the same file
+        connection = sqlite3.connect(str(path))
+        assert(connection.execute(
+            "SELECT count(*) FROM sources"
+        ).fetchone()[0] == 1)
+        assert(connection.execute(
+            "SELECT count(*) FROM tracks WHERE persistent_id IS NOT NULL"
+        ).fetchone()[0] > 0)
+        connection.close()
+
+    def test_batches(self, tmp_path, monkeypatch):
+        """Each batch is committed on its own, so other processes can
+            write to the index while an export is being loaded, and an
+            update that's cut short is redone.
+        """
+
+        source = copy_export(tmp_path)
+        path = tmp_path / "library.db"
+        monkeypatch.setattr(index, "BATCH_SIZE", 5)
+
+        iter_library = index.iter_library
+        locked = []
+
+        def checking_iter_library(f):
+            other = sqlite3.connect(str(path), timeout=0)
+            try:
+                for event in iter_library(f):
+                    try:
+                        other.execute("BEGIN IMMEDIATE")
+                        other.rollback()
+
+                    except sqlite3.OperationalError:
+                        locked.append(event[1])
+
+                    yield event
+
+            finally:
+                other.close()
+
+        def failing_iter_library(f):
+            for i, event in enumerate(iter_library(f)):
+                if i == 10:
+                    raise ValueError("cut short")
+
+                yield event
+
+        monkeypatch.setattr(index, "iter_library", failing_iter_library)
+        with index.LibraryIndex(path) as db:
+            with pytest.raises(ValueError):
+                db.update(source)
+
+            assert(not db.is_current(source))
+
+        monkeypatch.setattr(index, "iter_library", checking_iter_library)
+        with index.LibraryIndex(path) as db:
+            assert(db.update(source))
+            assert(not locked)
+
+            ((_, tracks),) = db.playlists(source)
+            assert(len(list(tracks)) == 18)
+
+    def test_playlister(self, tmp_path):
+        """Conversions from the index match the ones that parse the xml."""
+
+        source = copy_export(tmp_path)
+        args = [str(source), "-t", "xspf", "-m", "/home/jsmith/Music"]
+        indexed = args + ["--index", str(tmp_path / "library.db")]
+
+        expected = playlister.playlister(**cli.parse_args(args))
+        assert(playlister.playlister(**cli.parse_args(indexed)) == expected)
+
+        ((_, contents),) = playlister.playlister(**cli.parse_args(
+            indexed + ["--library"]
+        ))
+        assert(contents == expected[0][1])
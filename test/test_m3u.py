@@ -4,6 +4,8 @@
     :synopsis: tests the m3u-related functions for the playlister utility.
 """
 
+from io import StringIO
+
 import pytest
 
 from .context import m3u
@@ -23,4 +25,32 @@ class TestM3U(object):
         }
 
         result = "#EXTINF:192,Kool Kat - testing123\n/foo/bar/baz.mp3"
-        assert(m3u.to_m3u_track(test_track) == result)
\ No newline at end of file
+        assert(m3u.to_m3u_track(test_track) == result)
+
+    def test_decode_field(self):
+        """Repeated artists are decoded once."""
+
+        m3u.decode_field.cache_clear()
+        for name in ["a", "b", "c"]:
+            m3u.to_m3u_track({
+                "Location": "/foo/{}.mp3".format(name),
+                "Total Time": "192000",
+                "Name": name,
+                "Artist": "Kool%20Kat"
+            })
+
+        assert(m3u.decode_field("Kool%20Kat") == "Kool Kat")
+        assert(m3u.decode_field.cache_info().misses == 1)
+
+    def test_write_m3u_list(self):
+        """Streaming a playlist gives the same output as building it."""
+
+        tracks = [
+            "#EXTINF:192,Kool Kat - testing123\n/foo/bar/baz.mp3",
+            "#EXTINF:100,Kool Kat - testing456\n/foo/bar/qux.mp3"
+        ]
+
+        for items in [tracks, tracks[:1], []]:
+            f = StringIO()
+            m3u.write_m3u_list(f, "test", iter(items))
+            assert(f.getvalue() == m3u.to_m3u_list("test", items))
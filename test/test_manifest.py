@@ -0,0 +1,69 @@
+"""
+.. py:module:: test_manifest
+    :platform: Unix, Windows
+    :synopsis: tests the incremental rebuild manifest for playlister.
+"""
+
+import os
+
+import pytest
+
+from .context import manifest
+
+OPTIONS = {"list_type": "m3u", "music_path": None, "library": False}
+
+
+class TestManifest(object):
+    """Groups the tests of the incremental rebuild manifest."""
+
+    def test_is_current(self, tmp_path):
+        """A recorded source is current until its contents, the options
+            or its outputs change.
+        """
+
+        source = tmp_path / "list.xml"
+        output = tmp_path / "list.m3u"
+        source.write_text("<plist/>")
+        output.write_text("#EXTM3U")
+
+        first = manifest.Manifest(tmp_path, OPTIONS)
+        assert(not first.is_current(source))
+
+        first.record(source, [output], first.fingerprint(source))
+        first.save()
+
+        assert(manifest.Manifest(tmp_path, OPTIONS).is_current(source))
+        assert(not manifest.Manifest(
+            tmp_path, dict(OPTIONS, list_type="xspf")
+        ).is_current(source))
+
+        # touched, same contents
+        stat = source.stat()
+        os.utime(str(source), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert(manifest.Manifest(tmp_path, OPTIONS).is_current(source))
+
+        source.write_text("<plist></plist>")
+        assert(not manifest.Manifest(tmp_path, OPTIONS).is_current(source))
+
+    def test_missing_output(self, tmp_path):
+        """A source is rebuilt when its output has gone missing."""
+
+        source = tmp_path / "list.xml"
+        output = tmp_path / "list.m3u"
+        source.write_text("<plist/>")
+        output.write_text("#EXTM3U")
+
+        recorded = manifest.Manifest(tmp_path, OPTIONS)
+        recorded.record(source, [output], recorded.fingerprint(source))
+        output.unlink()
+
+        assert(not recorded.is_current(source))
+
+    def test_corrupt_manifest(self, tmp_path):
+        """An unreadable manifest is treated as empty."""
+
+        (tmp_path / manifest.MANIFEST_NAME).write_text("{not json")
+        source = tmp_path / "list.xml"
+        source.write_text("<plist/>")
+
+        assert(not manifest.Manifest(tmp_path, OPTIONS).is_current(source))
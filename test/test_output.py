@@ -0,0 +1,115 @@
+"""
+.. py:module:: test_output
+    :platform: Unix, Windows
+    :synopsis: tests the atomic output files for playlister.
+"""
+
+import os
+
+import pytest
+
+from .context import output
+
+
+class TestOutputFile(object):
+    """Groups the tests of the atomic output files."""
+
+    def test_unchanged(self, tmp_path):
+        """Identical output leaves the existing file alone."""
+
+        path = tmp_path / "list.m3u"
+        path.write_text("#EXTM3U\n")
+        stat = path.stat()
+        os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns - 10**9))
+        mtime = path.stat().st_mtime_ns
+
+        out = output.OutputFile(path)
+        out.open().write("#EXTM3U\n")
+
+        assert(not out.commit())
+        assert(path.stat().st_mtime_ns == mtime)
+        assert(os.listdir(str(tmp_path)) == ["list.m3u"])
+
+    def test_unchanged_writes_nothing(self, tmp_path, monkeypatch):
+        """No temporary file is created for identical output, however it's
+            written.
+        """
+
+        path = tmp_path / "list.m3u"
+        contents = "#EXTM3U\n" + "/music/ünïcode.m4a\n" * 100000
+        path.write_text(contents)
+
+        def fail(self):
+            raise AssertionError("wrote unchanged output")
+
+        monkeypatch.setattr(output.OutputFile, "_start_tmp", fail)
+        out = output.OutputFile(path)
+        f = out.open()
+        for line in contents.splitlines(True):
+            f.write(line)
+
+        assert(not out.commit())
+
+    def test_changed(self, tmp_path):
+        """Changed or new output replaces the file, wherever it differs."""
+
+        path = tmp_path / "list.m3u"
+        long = "#EXTM3U\n" + "/music/a.m4a\n" * 100000
+        for contents in [
+            "#EXTM3U\n",
+            "#EXTM3U\n#name=x\n",
+            "#EXTM3U\n",
+            "",
+            long,
+            long[:-2] + "3\n",
+            long[:-1],
+            long
+        ]:
+            out = output.OutputFile(path)
+            out.open().write(contents)
+
+            assert(out.commit())
+            assert(path.read_text() == contents)
+
+        assert(os.listdir(str(tmp_path)) == ["list.m3u"])
+
+    @pytest.mark.skipif(os.name == "nt", reason="needs Unix permissions")
+    def test_mode(self, tmp_path):
+        """A replaced file keeps its permissions, a new one gets the
+            umask's.
+        """
+
+        def write(contents: str):
+            out = output.OutputFile(path)
+            out.open().write(contents)
+            assert(out.commit())
+
+        umask = os.umask(0)
+        os.umask(umask)
+
+        path = tmp_path / "list.m3u"
+        write("#EXTM3U\n")
+        assert(path.stat().st_mode & 0o7777 == 0o666 & ~umask)
+
+        path.chmod(0o640)
+        write("#EXTM3U\n#name=x\n")
+        assert(path.stat().st_mode & 0o7777 == 0o640)
+
+    def test_discard(self, tmp_path):
+        """A failed write leaves the existing file as it was."""
+
+        path = tmp_path / "list.m3u"
+        path.write_text("#EXTM3U\n")
+
+        out = output.OutputFile(path)
+        with pytest.raises(RuntimeError):
+            try:
+                out.open().write("#EXT")
+                raise RuntimeError("failed mid-write")
+
+            except RuntimeError:
+                out.discard()
+                raise
+
+        assert(path.read_text() == "#EXTM3U\n")
+        assert(os.listdir(str(tmp_path)) == ["list.m3u"])
@@ -0,0 +1,88 @@
+"""
+.. py:module:: test_pipeline
+    :platform: Unix, Windows
+    :synopsis: tests the threaded pipeline for playlister.
+"""
+
+import threading
+
+import pytest
+
+from .context import pipeline
+
+
+class TestPipeline(object):
+    """Groups the tests of the threaded pipeline."""
+
+    def test_order(self):
+        """Items come out of every stage in the order they went in."""
+
+        results = pipeline.pipeline(
+            range(50),
+            [lambda x: x + 1, lambda x: x * 2, str],
+            maxsize=1
+        )
+
+        assert(list(results) == [str((x + 1) * 2) for x in range(50)])
+
+    def test_error(self):
+        """An error in a stage ends the pipeline and is raised."""
+
+        def fail_on_three(x):
+            if x == 3:
+                raise ValueError("three")
+
+            return x
+
+        with pytest.raises(ValueError):
+            list(pipeline.pipeline(range(10), [fail_on_three, str]))
+
+    def test_close(self):
+        """Stopping early shuts the stage threads down."""
+
+        before = threading.active_count()
+        results = pipeline.pipeline(range(1000), [str, len])
+
+        assert(next(results) == 1)
+        results.close()
+        assert(threading.active_count() == before)
+
+    def test_stream_stage(self):
+        """Stream stages turn the items into any number of results, and a
+            ChunkReader reads a file's chunks up to its end marker.
+        """
+
+        end = object()
+
+        def split(items):
+            for item in items:
+                yield item
+                yield from (c.encode() for c in item)
+                yield end
+
+        def join(items):
+            for name in items:
+                reader = pipeline.ChunkReader(items, end)
+                # what isn't read is skipped
+                yield name, reader.read(1)
+                reader.finish()
+
+        results = pipeline.pipeline(
+            ["abc", "", "d"],
+            [pipeline.StreamStage(split), pipeline.StreamStage(join)],
+            maxsize=1
+        )
+
+        assert(list(results) == [("abc", b"a"), ("", b""), ("d", b"d")])
+
+    def test_chunk_reader_error(self):
+        """An error in place of a chunk is raised by the read."""
+
+        end = object()
+        reader = pipeline.ChunkReader(iter([b"a", OSError("gone")]), end)
+        assert(reader.read(1) == b"a")
+        with pytest.raises(OSError):
+            reader.read(1)
+
+        reader.finish()
+        assert(reader.read(1) == b"")
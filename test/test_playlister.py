@@ -5,11 +5,20 @@
         start to finish.
 """
 
+import gzip
+import io
+import json
 import os.path
+import shutil
+import sys
+import tarfile
+import zipfile
 
 from pathlib import Path
 
-from .context import playlister, cli
+import pytest
+
+from .context import playlister, cli, index, stats, verify
 
 test_dir = os.path.dirname(os.path.realpath(__file__))
 root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
@@ -47,3 +56,546 @@ class TestPlaylister(object):
         path, contents = playlister.playlister(**cli.parse_args(args))[0]
         assert(path == Path(os.path.join(resource_dir, "Buffett.xspf")))
         assert(contents == xspf_result)
+
+    def test_library(self):
+        args = [
+            os.path.join(resource_dir, "Buffett.xml"),
+            "-t", "m3u",
+            "--library",
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music")
+        ]
+
+        converted = playlister.playlister(**cli.parse_args(args))
+        assert(len(converted) == 1)
+
+        path, contents = converted[0]
+        assert(path == Path(os.path.join(resource_dir, "Buffett.m3u")))
+        assert(contents == m3u_result)
+
+    def test_list_types(self, tmp_path):
+        args = [
+            os.path.join(resource_dir, "Buffett.xml"),
+            "-t", "m3u,xspf",
+            "-o", str(tmp_path),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music")
+        ]
+
+        assert(playlister.playlister(**cli.parse_args(args)) == [
+            (tmp_path / "Buffett.m3u", m3u_result),
+            (tmp_path / "Buffett.xspf", xspf_result)
+        ])
+
+        written = playlister.write_playlists(**cli.parse_args(args + ["-l"]))
+        assert(written == [
+            tmp_path / "Buffett.m3u",
+            tmp_path / "Buffett.xspf"
+        ])
+        assert(written[1].read_text() == xspf_result)
+
+    def test_profiles(self, tmp_path):
+        music = os.path.join(os.path.sep, "home", "jsmith", "Music")
+        profiles = tmp_path / "profiles.ini"
+        profiles.write_text(
+            "[phone]\noutput = phone\nmusic_path = {0}\n\n"
+            "[car]\noutput = car\ntype = xspf\nmusic_path = {0}\n".format(
+                music
+            )
+        )
+
+        args = [
+            os.path.join(resource_dir, "Buffett.xml"),
+            "--profiles", str(profiles)
+        ]
+
+        assert(playlister.playlister(**cli.parse_args(args)) == [
+            (tmp_path / "phone" / "Buffett.m3u", m3u_result),
+            (tmp_path / "car" / "Buffett.xspf", xspf_result)
+        ])
+
+        (tmp_path / "phone").mkdir()
+        (tmp_path / "car").mkdir()
+        written = playlister.write_playlists(**cli.parse_args(args + ["-l"]))
+        assert(written == [
+            tmp_path / "phone" / "Buffett.m3u",
+            tmp_path / "car" / "Buffett.xspf"
+        ])
+        assert(written[1].read_text() == xspf_result)
+
+    def test_verify(self, tmp_path, capsys):
+        music = tmp_path / "Music"
+        for line in m3u_result.splitlines():
+            if line.startswith("/") and not line.endswith("Volcano.m4a"):
+                track = music / line.split("/Music/")[1]
+                track.parent.mkdir(parents=True, exist_ok=True)
+                track.write_text("")
+
+        args = [
+            os.path.join(resource_dir, "Buffett.xml"),
+            "-t", "m3u",
+            "-o", str(tmp_path / "Buffett.m3u"),
+            "-m", str(music),
+            "--verify"
+        ]
+
+        converted = playlister.playlister(**cli.parse_args(args))
+        assert(converted[0][1] == m3u_result.replace(
+            "/home/jsmith/Music", str(music)
+        ))
+
+        err = capsys.readouterr().err
+        assert(err.startswith("1 tracks in 1 playlists are missing"))
+        assert("13 Volcano.m4a" in err)
+
+    def test_verify_streamed(self, tmp_path, monkeypatch):
+        music = tmp_path / "Music"
+        for line in m3u_result.splitlines():
+            if line.startswith("/") and not line.endswith("Volcano.m4a"):
+                track = music / line.split("/Music/")[1]
+                track.parent.mkdir(parents=True, exist_ok=True)
+                track.write_text("")
+
+        args = cli.parse_args([
+            os.path.join(resource_dir, "Buffett.xml"),
+            "-t", "m3u,xspf",
+            "-o", str(tmp_path),
+            "-m", str(music),
+            "--verify",
+            "--index", str(tmp_path / "library.db")
+        ])
+
+        # the tracks are counted as they're written, not queried for
+        def no_len(tracks):
+            raise AssertionError("counted the playlist up front")
+
+        monkeypatch.setattr(index.PlaylistTracks, "__len__", no_len)
+
+        # every output is written, but the tracks are verified once
+        run_stats = stats.Stats()
+        args["stats"] = run_stats
+        assert(playlister.write_playlists(**args) == [
+            tmp_path / "Buffett.m3u",
+            tmp_path / "Buffett.xspf"
+        ])
+        assert(run_stats.counters["tracks"] == 2 * 18)
+        assert(run_stats.counters["missing"] == 1)
+
+        args["stats"] = None
+        converted = playlister.playlister(**args)
+        assert(converted[0][1] == m3u_result.replace(
+            "/home/jsmith/Music", str(music)
+        ))
+
+        # nothing to rewrite, the indexed tracks are passed straight on
+        args.update(list_type="m3u", music_path=None, verify=False)
+        converted = playlister.playlister(**args)
+        args["index"] = None
+        assert(converted == playlister.playlister(**args))
+
+        # the tracks aren't prepared until they're written
+        verifier = verify.Verifier(verify.MusicIndex.scan(music))
+        outputs = list(playlister._iter_outputs(
+            Path(resource_dir) / "Buffett.xml",
+            tmp_path / "Buffett.m3u",
+            ["m3u", "xspf"],
+            music,
+            verifier=verifier
+        ))
+        assert(not verifier.missing)
+
+        for _, _, tracks, _, _ in outputs:
+            assert(len(list(tracks)) == 18)
+            assert(len(verifier.missing[str(tmp_path / "Buffett.m3u")]) == 1)
+
+    def test_relink(self, tmp_path, capsys):
+        music = tmp_path / "Music"
+        expected = m3u_result.replace("/home/jsmith/Music", str(music))
+        for line in expected.splitlines():
+            if line.startswith("/"):
+                track = Path(line)
+                track.parent.mkdir(parents=True, exist_ok=True)
+                track.write_text("")
+
+        # reorganized since the export
+        volcano = music / "Jimmy Buffett" / "Songs You Know By Heart"
+        (volcano / "13 Volcano.m4a").rename(music / "volcano.m4a")
+
+        args = [
+            os.path.join(resource_dir, "Buffett.xml"),
+            "-t", "m3u",
+            "-o", str(tmp_path / "Buffett.m3u"),
+            "-m", str(music),
+            "--relink",
+            "--verify"
+        ]
+
+        converted = playlister.playlister(**cli.parse_args(args))
+        assert(converted[0][1] == expected.replace(
+            str(volcano / "13 Volcano.m4a"),
+            str(music / "volcano.m4a")
+        ))
+
+        err = capsys.readouterr().err
+        assert(err.startswith("1 missing track locations were relinked:"))
+        assert("are missing" not in err)
+
+    def test_archive(self, tmp_path, monkeypatch):
+        with open(os.path.join(resource_dir, "Buffett.xml")) as f:
+            source = f.read()
+
+        for name in ["a", "b"]:
+            (tmp_path / "{}.xml".format(name)).write_text(source)
+
+        lists = tmp_path / "lists.zip"
+        args = [
+            str(tmp_path),
+            "-t", "m3u",
+            "-o", str(tmp_path / "out"),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music"),
+            "--archive", str(lists)
+        ]
+
+        for extra in [[], ["-j", "2"], ["--pipeline"]]:
+            written = playlister.write_playlists(
+                **cli.parse_args(args + extra)
+            )
+            assert(sorted(p.name for p in written) == ["a.m3u", "b.m3u"])
+            assert(not (tmp_path / "out").exists())
+
+            with zipfile.ZipFile(str(lists)) as f:
+                assert(sorted(f.namelist()) == ["a.m3u", "b.m3u"])
+                assert(f.read("b.m3u").decode("utf-8") == m3u_result.replace(
+                    "#name=Buffett", "#name=b"
+                ))
+
+        # stdout only gets the archive
+        stdout = io.TextIOWrapper(io.BytesIO())
+        monkeypatch.setattr(sys, "stdout", stdout)
+        playlister.write_playlists(**cli.parse_args(
+            args[:-1] + ["-", "-v", "--archive-format", "tar.gz"]
+        ))
+
+        stdout.flush()
+        with tarfile.open(fileobj=io.BytesIO(stdout.buffer.getvalue())) as f:
+            assert(sorted(f.getnames()) == ["a.m3u", "b.m3u"])
+
+    def test_compressed(self, tmp_path):
+        with open(os.path.join(resource_dir, "Buffett.xml"), "rb") as f:
+            source = f.read()
+
+        compressed = tmp_path / "Buffett.xml.gz"
+        compressed.write_bytes(gzip.compress(source))
+
+        args = cli.parse_args([
+            str(compressed),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music")
+        ])
+        assert(args["output_path"] == tmp_path / "Buffett.m3u")
+
+        for snapshot in [False, True]:
+            args["snapshot"] = snapshot
+            assert(playlister.playlister(**args) == [
+                (tmp_path / "Buffett.m3u", m3u_result)
+            ])
+
+        args["index"] = tmp_path / "library.db"
+        assert(playlister.playlister(**args)[0][1] == m3u_result)
+
+    def test_recursive(self, tmp_path):
+        with open(os.path.join(resource_dir, "Buffett.xml")) as f:
+            source = f.read()
+
+        exports = tmp_path / "exports"
+        for user in ["a", "b", "c"]:
+            (exports / "users" / user).mkdir(parents=True)
+            (exports / "users" / user / "Buffett.xml").write_text(source)
+
+        (exports / "archive").mkdir()
+        (exports / "archive" / "Buffett.xml").write_text(source)
+
+        out = tmp_path / "out"
+        args = [
+            str(exports),
+            "-o", str(out),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music"),
+            "-R",
+            "--exclude", "archive"
+        ]
+        expected = [
+            (out / "users" / user / "Buffett.m3u", m3u_result)
+            for user in ["a", "b", "c"]
+        ]
+
+        for extra in [[], ["-j", "2"], ["-p"]]:
+            converted = playlister.playlister(**cli.parse_args(args + extra))
+            assert(sorted(converted) == expected)
+
+        # the tree is mirrored on disk too, and reruns skip the files
+        args.append("-i")
+        written = playlister.write_playlists(**cli.parse_args(args))
+        assert(sorted(written) == [path for path, _ in expected])
+        assert(playlister.write_playlists(**cli.parse_args(args)) == [])
+
+        # a directory's playlists can't go to a file
+        (tmp_path / "file.m3u").write_text("")
+        args[args.index("-o") + 1] = str(tmp_path / "file.m3u")
+        with pytest.raises(OSError):
+            playlister.playlister(**cli.parse_args(args))
+
+    def test_jobs(self, tmp_path, capsys):
+        with open(os.path.join(resource_dir, "Buffett.xml")) as f:
+            source = f.read()
+
+        for name in ["c", "a", "b"]:
+            (tmp_path / "{}.xml".format(name)).write_text(source)
+
+        # a track without a duration can't be converted
+        (tmp_path / "bad.xml").write_text(
+            source.replace("<key>Total Time</key>", "<key>Time</key>")
+        )
+
+        args = [str(tmp_path), "-t", "m3u", "-o", str(tmp_path), "-j", "2"]
+        converted = playlister.playlister(**cli.parse_args(args))
+        serial = playlister.playlister(**cli.parse_args(args[:-2]))
+
+        assert(converted == serial)
+        assert(sorted(path.name for path, _ in converted) == [
+            "a.m3u", "b.m3u", "c.m3u"
+        ])
+        assert("bad.xml" in capsys.readouterr().err)
+
+    def test_jobs_stats(self, tmp_path):
+        with open(os.path.join(resource_dir, "Buffett.xml")) as f:
+            source = f.read()
+
+        # enough files for several jobs in each chunk sent to a worker
+        for i in range(24):
+            (tmp_path / "{}.xml".format(i)).write_text(source)
+
+        counters = []
+        for jobs in ["1", "2"]:
+            run_stats = stats.Stats()
+            args = cli.parse_args([
+                str(tmp_path),
+                "-o", str(tmp_path / jobs),
+                "-m", os.path.join(os.path.sep, "home", "jsmith", "Music"),
+                "-j", jobs
+            ])
+            args["stats"] = run_stats
+            playlister.write_playlists(**args)
+            counters.append(run_stats.counters)
+
+        assert(counters[1] == counters[0])
+        assert(counters[1]["playlists"] == 24)
+        assert(counters[1]["tracks"] == 24 * 18)
+
+    def test_write_playlists(self, tmp_path):
+        args = [
+            resource_dir,
+            "-t", "xspf",
+            "-o", str(tmp_path),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music")
+        ]
+
+        written = playlister.write_playlists(**cli.parse_args(args))
+        assert(written == [tmp_path / "Buffett.xspf"])
+        assert(written[0].read_text() == xspf_result)
+
+        # a rerun with the same output leaves the file alone
+        mtime = written[0].stat().st_mtime_ns
+        run_stats = stats.Stats()
+        parsed = cli.parse_args(args)
+        parsed["stats"] = run_stats
+
+        assert(playlister.write_playlists(**parsed) == written)
+        assert(written[0].stat().st_mtime_ns == mtime)
+        assert(run_stats.counters["written"] == 0)
+        assert(run_stats.counters["unchanged"] == 1)
+
+    def test_default_output(self, tmp_path):
+        source = tmp_path / "Buffett.xml"
+        shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+
+        args = cli.parse_args([
+            str(source),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music"),
+            "--incremental"
+        ])
+
+        # the default output path is the playlist file itself
+        written = playlister.write_playlists(**args)
+        assert(written == [tmp_path / "Buffett.m3u"])
+        assert(written[0].is_file())
+        assert(written[0].read_text() == m3u_result)
+        assert(
+            sorted(path.name for path in tmp_path.iterdir()) ==
+            [".playlister-manifest.json", "Buffett.m3u", "Buffett.xml"]
+        )
+
+    def test_incremental(self, tmp_path):
+        args = cli.parse_args([
+            resource_dir,
+            "-t", "m3u",
+            "-o", str(tmp_path),
+            "--incremental"
+        ])
+
+        assert(playlister.write_playlists(**args) == [tmp_path / "Buffett.m3u"])
+        assert(playlister.write_playlists(**args) == [])
+
+        args["music_path"] = Path(os.path.join(os.path.sep, "home", "jsmith"))
+        assert(playlister.write_playlists(**args) == [tmp_path / "Buffett.m3u"])
+
+    def test_incremental_changed(self, tmp_path, monkeypatch):
+        source = tmp_path / "Buffett.xml"
+        shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+        args = cli.parse_args([
+            str(source),
+            "-o", str(tmp_path / "Buffett.m3u"),
+            "--incremental"
+        ])
+
+        written = [tmp_path / "Buffett.m3u"]
+        load_plist = playlister.load_plist
+
+        def changing_load_plist(*load_args, **load_kwargs):
+            tracks = load_plist(*load_args, **load_kwargs)
+            source.write_text(source.read_text().replace("Buffett", "Parrot"))
+            return tracks
+
+        # the file recorded is the one read, not the one left afterwards
+        monkeypatch.setattr(playlister, "load_plist", changing_load_plist)
+        assert(playlister.write_playlists(**args) == written)
+
+        monkeypatch.undo()
+        assert(playlister.write_playlists(**args) == written)
+        assert(playlister.write_playlists(**args) == [])
+
+    def test_pipeline(self, tmp_path, capsys, monkeypatch):
+        with open(os.path.join(resource_dir, "Buffett.xml")) as f:
+            source = f.read()
+
+        sources = tmp_path / "xml"
+        sources.mkdir()
+        for name in ["c", "a", "b"]:
+            (sources / "{}.xml".format(name)).write_text(source)
+
+        (sources / "bad.xml").write_text(
+            source.replace("<key>Total Time</key>", "<key>Time</key>")
+        )
+
+        serial, pipelined = tmp_path / "serial", tmp_path / "pipelined"
+        serial.mkdir()
+        pipelined.mkdir()
+
+        args = [str(sources), "-t", "m3u", "-o"]
+        expected = playlister.write_playlists(
+            **cli.parse_args(args + [str(serial)])
+        )
+
+        # each xml file is read once, by the read stage
+        opened = []
+        path_open = Path.open
+
+        def counting_open(self, *args, **kwargs):
+            if self.suffix == ".xml":
+                opened.append(self.name)
+
+            return path_open(self, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "open", counting_open)
+
+        run_stats = stats.Stats()
+        parsed = cli.parse_args(args + [str(pipelined), "--pipeline"])
+        parsed["stats"] = run_stats
+        written = playlister.write_playlists(**parsed)
+        monkeypatch.undo()
+
+        assert(sorted(opened) == ["a.xml", "b.xml", "bad.xml", "c.xml"])
+
+        assert([p.name for p in written] == [p.name for p in expected])
+        for path in written:
+            assert(path.read_text() == (serial / path.name).read_text())
+
+        assert("bad.xml" in capsys.readouterr().err)
+        assert(run_stats.counters["files"] == 3)
+        assert(run_stats.counters["failed"] == 1)
+
+    def test_pipeline_unreadable(self, tmp_path, capsys, monkeypatch):
+        sources = tmp_path / "xml"
+        sources.mkdir()
+        for name in ["a", "locked"]:
+            shutil.copy(
+                os.path.join(resource_dir, "Buffett.xml"),
+                str(sources / "{}.xml".format(name))
+            )
+
+        path_open = Path.open
+
+        def locked_open(self, *args, **kwargs):
+            if self.name == "locked.xml":
+                raise PermissionError("locked")
+
+            return path_open(self, *args, **kwargs)
+
+        monkeypatch.setattr(Path, "open", locked_open)
+
+        # the files after one that can't be read are still converted, the
+        # same as without the pipeline
+        for pipeline in [False, True]:
+            written = list(playlister._run_files(
+                playlister.write_file,
+                sources,
+                tmp_path / str(pipeline),
+                "m3u",
+                pipeline=pipeline,
+                only=[
+                    sources / "missing.xml",
+                    sources / "locked.xml",
+                    sources / "a.xml"
+                ]
+            ))
+            assert(written == [
+                [tmp_path / str(pipeline) / "locked.m3u"],
+                [tmp_path / str(pipeline) / "a.m3u"]
+            ])
+            assert("missing.xml" in capsys.readouterr().err)
+
+        for name in ["locked.m3u", "a.m3u"]:
+            assert(
+                (tmp_path / "True" / name).read_text() ==
+                (tmp_path / "False" / name).read_text()
+            )
+
+    def test_replace_music_path(self):
+        track = {
+            "Location": "file:///Users/jared/Music/iTunes/iTunes%20Media/"
+                        "Music/Kool%20Kat/baz.mp3"
+        }
+
+        replaced = playlister.replace_music_path(Path("/home/jsmith"), track)
+        assert(replaced["Location"] == "/home/jsmith/Kool%20Kat/baz.mp3")
+
+        # the original may be shared with other playlists
+        assert(track["Location"].startswith("file://"))
+
+    def test_stats(self, tmp_path, capsys):
+        run_stats = stats.Stats()
+        args = cli.parse_args([
+            resource_dir,
+            "-o", str(tmp_path),
+            "-m", os.path.join(os.path.sep, "home", "jsmith", "Music")
+        ])
+
+        args["stats"] = run_stats
+        playlister.write_playlists(**args)
+        assert(run_stats.counters["files"] == 1)
+        assert(run_stats.counters["tracks"] == 18)
+        assert(run_stats.counters["bytes_written"] ==
+               (tmp_path / "Buffett.m3u").stat().st_size)
+        assert(run_stats.counters["bytes_read"] > 0)
+        assert(run_stats.stages["convert"][0] > 0)
+
+        args["stats"] = "json"
+        playlister.write_playlists(**args)
+        report = json.loads(capsys.readouterr().err)
+        assert(report["counters"]["playlists"] == 1)
@@ -0,0 +1,61 @@
+"""
+.. py:module:: test_profiles
+    :platform: Unix, Windows
+    :synopsis: tests reading profiles files for playlister.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from .context import profiles, remap
+
+
+class TestProfiles(object):
+    """Groups the tests of profiles files."""
+
+    def test_load_profiles(self, tmp_path):
+        """Profiles keep file order and fill in the defaults."""
+
+        path = tmp_path / "profiles.ini"
+        path.write_text(
+            "[phone]\n"
+            "output = out/phone\n"
+            "type = m3u8, xspf\n"
+            "music_path = /storage/Music\n"
+            "remap =\n"
+            "    # NAS\n"
+            "    /Volumes/NAS=/mnt/nas\n"
+            "\n"
+            "[car]\n"
+            "output = /media/usb\n"
+        )
+
+        assert(profiles.load_profiles(path) == [
+            profiles.Profile(
+                "phone",
+                tmp_path / "out" / "phone",
+                ["m3u8", "xspf"],
+                Path("/storage/Music"),
+                [("/Volumes/NAS", "/mnt/nas")]
+            ),
+            profiles.Profile("car", Path("/media/usb"), ["m3u"], None, [])
+        ])
+
+    def test_invalid(self, tmp_path):
+        """Missing outputs, unknown types and empty files are rejected."""
+
+        path = tmp_path / "profiles.ini"
+        for text in [
+            "",
+            "[phone]\ntype = m3u\n",
+            "[phone]\noutput = out\ntype = wpl\n",
+            "output = out\n"
+        ]:
+            path.write_text(text)
+            with pytest.raises(profiles.InvalidProfileError):
+                profiles.load_profiles(path)
+
+        path.write_text("[phone]\noutput = out\nremap = /a\n")
+        with pytest.raises(remap.InvalidRuleError):
+            profiles.load_profiles(path)
@@ -0,0 +1,85 @@
+"""
+.. py:module:: test_relink
+    :platform: Unix, Windows
+    :synopsis: tests relinking missing track locations for playlister.
+"""
+
+from urllib.parse import quote
+
+from .context import relink, verify
+
+MUSIC = [
+    "/music/Jimmy Buffett/Songs You Know By Heart/03 Fins.m4a",
+    "/music/Jimmy Buffett/Volcano/01 Volcano.m4a",
+    "/music/Jimmy Buffett/Songs You Know By Heart/13 Volcano.m4a",
+    "/music/Jimmy Buffett/Son of a Son of a Sailor/Cheeseburger.m4a",
+    "/music/Jimmy Buffett/Living and Dying/01 Come Monday (Live).mp3",
+    "/music/The Beatles/White Album/09 Revolution 9.mp3",
+    "/music/Various/Untitled/01.mp3"
+]
+
+
+def relinker() -> relink.Relinker:
+    return relink.Relinker(verify.MusicIndex(MUSIC, "/music"), MUSIC)
+
+
+class TestRelink(object):
+    """Groups the tests of relinking."""
+
+    def test_name_key(self):
+        """Track numbers, case, punctuation and extensions are ignored."""
+
+        for path in [
+            "/a/01 Fins.m4a",
+            "/b/fins.mp3",
+            "/c/1-03 Fins.m4a",
+            "/d/03. FINS!.flac"
+        ]:
+            assert(relink.name_key(path) == "fins")
+
+        # only a number is kept, and only punctuation has no key
+        assert(relink.name_key("/a/1999.mp3") == "1999")
+        assert(relink.name_key("/a/01.mp3") == "01")
+        assert(relink.name_key("/a/!!.mp3") == "")
+        assert(relink.name_key("/a/Come_Monday.mp3") == "come monday")
+
+    def test_relink(self):
+        """Existing locations are kept, renamed files found."""
+
+        relinking = relinker()
+        track = {"Location": quote(MUSIC[0])}
+        assert(relinking.relink_track(track) is track)
+
+        moved = "/music/Jimmy Buffett/Fins.m4a"
+        assert(relinking.relink_location(quote(moved)) == quote(MUSIC[0]))
+
+        # the copy in the same album wins
+        for album, expected in [("Volcano", 1), ("Songs You Know", 2)]:
+            location = "/music/Jimmy Buffett/{}/Volcano.m4a".format(album)
+            assert(relinking.find(location) == MUSIC[expected])
+
+        assert(list(relinking.relinked.values()) == [MUSIC[0]])
+        assert(relinking.report().startswith(
+            "1 missing track locations were relinked:"
+        ))
+
+    def test_fuzzy(self):
+        """Names that were changed are matched if they're close."""
+
+        relinking = relinker()
+        assert(relinking.find(
+            "/x/Son of a Son of a Sailor/05 Cheeseburgers.m4a"
+        ) == MUSIC[3])
+        assert(relinking.find(
+            "/x/Jimmy Buffett/Live/Come Mondays (Live).m4a"
+        ) == MUSIC[4])
+
+        # outside the album, a similar name alone isn't enough
+        assert(relinking.find("/x/Live/Come Mondays (Live).m4a") is None)
+        assert(relinking.find("/music/X/Y/07 Revolution 1.mp3") is None)
+        assert(relinking.find("/music/Prince/1999/1999.mp3") is None)
+        assert(relinking.find("/music/Prince/1999/!!.mp3") is None)
+
+        missing = quote("/music/Margaritaville.m4a")
+        assert(relinking.relink_location(missing) == missing)
+        assert(relinking.report() is None)
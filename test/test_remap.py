@@ -0,0 +1,125 @@
+"""
+.. py:module:: test_remap
+    :platform: Unix, Windows
+    :synopsis: tests the track location remapping rules for playlister.
+"""
+
+import os.path
+
+from urllib.parse import quote
+
+import pytest
+
+from .context import remap
+
+ITUNES_LOCATION = (
+    "file:///Users/jared/Music/iTunes/iTunes%20Media/Music/"
+    "Jimmy%20Buffett/Volcano.m4a"
+)
+
+
+class TestRemap(object):
+    """Groups the tests of the remapping engine."""
+
+    def test_parse_rule(self):
+        """Rules split on the first '='."""
+
+        assert(remap.parse_rule("/a/b=/c=d") == ("/a/b", "/c=d"))
+
+        for rule in ["/a/b", "=/c", "/a="]:
+            with pytest.raises(remap.InvalidRuleError):
+                remap.parse_rule(rule)
+
+    def test_load_rules(self, tmp_path):
+        """Rules files skip blank lines and comments."""
+
+        rules = tmp_path / "rules.txt"
+        rules.write_text("# NAS\n/Volumes/NAS=/mnt/nas\n\n/a=/b\n")
+
+        assert(remap.load_rules(rules) == [
+            ("/Volumes/NAS", "/mnt/nas"),
+            ("/a", "/b")
+        ])
+
+    def test_longest_prefix(self):
+        """The most specific rule wins, whatever the order."""
+
+        remapper = remap.Remapper([
+            ("/Volumes/Music/Lossless", "/mnt/flac"),
+            ("/Volumes/Music", "/mnt/music")
+        ])
+
+        assert(remapper.remap_location(
+            "file:///Volumes/Music/Lossless/a%20b.flac"
+        ) == "/mnt/flac/a%20b.flac")
+        assert(remapper.remap_location(
+            "file:///Volumes/Music/Rock/c.mp3"
+        ) == "/mnt/music/Rock/c.mp3")
+
+        # components must match whole
+        assert(remapper.remap_location(
+            "file:///Volumes/MusicBackup/c.mp3"
+        ) == "/Volumes/MusicBackup/c.mp3")
+
+    def test_later_rules_win(self):
+        """A later rule with the same source replaces an earlier one."""
+
+        remapper = remap.Remapper([("/a", "/b"), ("/a/", "/c")])
+        assert(remapper.remap_location("/a/x.mp3") == "/c/x.mp3")
+
+    def test_music_path(self):
+        """The standard iTunes and Music.app layouts map to music_path,
+            for any user, on mac or windows.
+        """
+
+        music = os.path.join(os.path.sep, "home", "jsmith", "Music")
+        expected = os.path.join(music, "Jimmy Buffett/Volcano.m4a")
+        remapper = remap.Remapper(music_path=music)
+
+        for location in [
+            ITUNES_LOCATION,
+            ITUNES_LOCATION.replace("jared", "someone.else"),
+            ITUNES_LOCATION.replace("iTunes/iTunes%20Media", "Music/Media"),
+            ITUNES_LOCATION.replace("file:///", "file://localhost/C:/")
+        ]:
+            assert(remapper.remap_location(location) == quote(expected))
+
+        assert(not remapper.unmatched)
+
+    def test_unmatched(self):
+        """Locations that match no rule are kept and reported."""
+
+        remapper = remap.Remapper([("/Volumes/NAS", "/mnt/nas")])
+        track = {"Location": "file:///Users/jared/Desktop/a.mp3"}
+
+        assert(remapper.remap_track(track)["Location"] ==
+               "/Users/jared/Desktop/a.mp3")
+        assert(track["Location"].startswith("file://"))
+        assert(list(remapper.unmatched) == ["/Users/jared/Desktop/a.mp3"])
+        assert(remapper.report().startswith("1 track locations"))
+        assert(remap.Remapper().report() is None)
+
+        # or not, for a long-lived remapper that's never reported
+        quiet = remap.Remapper(
+            [("/Volumes/NAS", "/mnt/nas")],
+            collect_unmatched=False
+        )
+        assert(quiet.remap_track(track)["Location"] ==
+               "/Users/jared/Desktop/a.mp3")
+        assert(quiet.unmatched is None)
+        assert(quiet.report() is None)
+
+    def test_shared_decoder(self):
+        """Remappers sharing a decoder decode each location once."""
+
+        decode = remap.LocationDecoder(maxsize=1)
+        phone = remap.Remapper([("/Users/jared", "/sdcard")], decode=decode)
+        car = remap.Remapper([("/Users/jared", "/usb")], decode=decode)
+
+        assert(phone.remap_location(ITUNES_LOCATION).startswith("/sdcard/"))
+        assert(car.remap_location(ITUNES_LOCATION).startswith("/usb/"))
+        assert(list(decode.decoded) == [ITUNES_LOCATION])
+
+        # a full decoder starts over
+        decode("/a%20b")
+        assert(decode.decoded == {"/a%20b": "/a b"})
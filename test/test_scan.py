@@ -0,0 +1,67 @@
+"""
+.. py:module:: test_scan
+    :platform: Unix, Windows
+    :synopsis: tests the parallel directory walk for playlister.
+"""
+
+import os
+
+import pytest
+
+from .context import scan
+
+
+class TestScan(object):
+    """Groups the tests of the directory walk."""
+
+    def test_scan_files(self, tmp_path):
+        """Every file is found once, however many threads list them."""
+
+        expected = set()
+        for artist in ["a", "b", "c"]:
+            for album in ["x", "y"]:
+                directory = tmp_path / artist / album
+                directory.mkdir(parents=True)
+                for track in ["1.mp3", "2.mp3"]:
+                    (directory / track).write_text("")
+                    expected.add(str(directory / track))
+
+        (tmp_path / "cover.jpg").write_text("")
+        expected.add(str(tmp_path / "cover.jpg"))
+
+        for workers in [None, 1, 4]:
+            found = [e.path for e in scan.scan_files(tmp_path, workers)]
+            assert(len(found) == len(expected))
+            assert(set(found) == expected)
+
+    @pytest.mark.skipif(not hasattr(os, "symlink"), reason="no symlinks")
+    def test_symlink_loop(self, tmp_path):
+        """Symlinked directories aren't followed, so loops end."""
+
+        (tmp_path / "a").mkdir()
+        (tmp_path / "a" / "1.mp3").write_text("")
+        os.symlink(str(tmp_path), str(tmp_path / "a" / "loop"))
+
+        assert([e.name for e in scan.scan_files(tmp_path)] == ["1.mp3"])
+        assert(list(scan.scan_files(tmp_path / "missing")) == [])
+
+    def test_skip_dir(self, tmp_path):
+        """Skipped directories aren't listed, nor is anything under them."""
+
+        for directory in ["keep", "skip", "skip/deeper"]:
+            (tmp_path / directory).mkdir()
+            (tmp_path / directory / "1.mp3").write_text("")
+
+        listed = []
+
+        def skip_dir(entry: os.DirEntry) -> bool:
+            listed.append(entry.name)
+            return entry.name == "skip"
+
+        for workers in [1, 4]:
+            del listed[:]
+            found = scan.scan_files(tmp_path, workers, skip_dir)
+            assert(
+                [e.path for e in found] == [str(tmp_path / "keep" / "1.mp3")]
+            )
+            assert(sorted(listed) == ["keep", "skip"])
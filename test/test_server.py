@@ -0,0 +1,185 @@
+"""
+.. py:module:: test_server
+    :platform: Unix, Windows
+    :synopsis: tests serving playlists over HTTP for playlister.
+"""
+
+import json
+import os
+import os.path
+import shutil
+import socket
+import threading
+
+from http.client import HTTPConnection
+from pathlib import Path
+
+import pytest
+
+from .context import server
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
+music_path = os.path.join(os.path.sep, "home", "jsmith", "Music")
+
+with open(os.path.join(resource_dir, "Buffett.m3u")) as f:
+    m3u_result = f.read()
+
+with open(os.path.join(resource_dir, "Buffett.xspf")) as f:
+    xspf_result = f.read()
+
+
+@pytest.fixture
+def serving():
+    """Starts servers in a background thread, and stops them after the
+        test.
+    """
+
+    servers = []
+
+    def start(*args, **kwargs) -> server.PlaylistServer:
+        playlist_server = server.make_server(*args, **kwargs)
+        servers.append(playlist_server)
+        threading.Thread(
+            target=playlist_server.serve_forever,
+            daemon=True
+        ).start()
+        return playlist_server
+
+    yield start
+
+    for playlist_server in servers:
+        playlist_server.shutdown()
+        playlist_server.server_close()
+
+
+def get(playlist_server: server.PlaylistServer, url: str):
+    connection = HTTPConnection(*playlist_server.server_address[:2])
+    try:
+        connection.request("GET", url)
+        response = connection.getresponse()
+        return response.status, response.read().decode("utf-8")
+
+    finally:
+        connection.close()
+
+
+class TestServer(object):
+    """Groups the tests of serve mode."""
+
+    def test_playlist(self, serving):
+        """Playlists are rendered in the requested type and music path."""
+
+        playlist_server = serving(Path(resource_dir), port=0)
+        url = "/Buffett/Buffett.{}?music_path=" + music_path
+
+        assert(get(playlist_server, url.format("m3u")) == (200, m3u_result))
+        assert(
+            get(playlist_server, url.format("xspf")) == (200, xspf_result)
+        )
+
+    def test_unmatched(self, serving, monkeypatch):
+        """The shared converters don't collect unmatched locations, which
+            would only grow with every request.
+        """
+
+        remappers = []
+        remapper = server.Remapper
+
+        def recording_remapper(*args, **kwargs):
+            remappers.append(remapper(*args, **kwargs))
+            return remappers[-1]
+
+        monkeypatch.setattr(server, "Remapper", recording_remapper)
+        playlist_server = serving(Path(resource_dir), port=0)
+
+        for _ in range(2):
+            status, _ = get(
+                playlist_server,
+                "/Buffett/Buffett.m3u?music_path=/elsewhere"
+            )
+            assert(status == 200)
+
+        convert_track, _ = server.ConverterCache().get("m3u", "/music")
+        assert(convert_track({
+            "Location": "/nowhere/a.mp3",
+            "Total Time": "1000",
+            "Name": "a",
+            "Artist": "b"
+        }).endswith("\n/nowhere/a.mp3"))
+        assert(len(remappers) == 2)
+        assert(all(each.unmatched is None for each in remappers))
+
+    def test_index(self, serving):
+        """The libraries and their playlists are listed as JSON."""
+
+        playlist_server = serving(Path(resource_dir), port=0)
+
+        status, body = get(playlist_server, "/")
+        assert(status == 200)
+        assert(json.loads(body) == {"Buffett": ["Buffett"]})
+        assert(
+            json.loads(get(playlist_server, "/Buffett")[1]) == ["Buffett"]
+        )
+
+    def test_not_found(self, serving):
+        """Unknown libraries, playlists and list types are 404s."""
+
+        playlist_server = serving(Path(resource_dir), port=0)
+
+        for url in [
+            "/Nothing",
+            "/Nothing/Buffett.m3u",
+            "/Buffett/Nothing.m3u",
+            "/Buffett/Buffett.pls",
+            "/Buffett/Buffett/m3u"
+        ]:
+            assert(get(playlist_server, url)[0] == 404)
+
+    def test_reload(self, tmp_path):
+        """A library is parsed once, and again only when its file
+            changes.
+        """
+
+        source = tmp_path / "Library.xml"
+        shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+        libraries = server.LibraryCache(tmp_path)
+
+        playlists = libraries.playlists("Library")
+        assert(libraries.playlists("Library") is playlists)
+
+        source.write_text(source.read_text().replace(
+            "<string>Buffett</string>",
+            "<string>Parrots</string>"
+        ))
+        os.utime(str(source), ns=(0, 0))
+        assert(list(libraries.playlists("Library")) == ["Parrots"])
+
+        with pytest.raises(KeyError):
+            libraries.playlists("Nothing")
+
+    @pytest.mark.skipif(
+        not hasattr(socket, "AF_UNIX"),
+        reason="needs Unix sockets"
+    )
+    def test_unix_socket(self, serving, tmp_path):
+        """A Unix socket can be served instead, replacing a stale one."""
+
+        path = tmp_path / "playlister.sock"
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(str(path))
+        stale.close()
+
+        serving(Path(resource_dir), socket_path=path)
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(str(path))
+        with client, client.makefile("rb") as response:
+            client.sendall(
+                "GET /Buffett/Buffett.m3u?music_path={} HTTP/1.0\r\n\r\n"
+                .format(music_path).encode("utf-8")
+            )
+            data = response.read().decode("utf-8")
+
+        assert(data.startswith("HTTP/1.0 200"))
+        assert(data.endswith(m3u_result))
@@ -0,0 +1,111 @@
+"""
+.. py:module:: test_snapshot
+    :platform: Unix, Windows
+    :synopsis: tests the binary library snapshots for playlister.
+"""
+
+import os
+import shutil
+
+from .context import snapshot, files, playlister, cli
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
+
+
+def copy_export(tmp_path):
+    source = tmp_path / "Buffett.xml"
+    shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+    return source
+
+
+def add_unresolved_item(source):
+    """Adds a playlist item whose track isn't in the export."""
+
+    source.write_text(source.read_text().replace(
+        "<key>Playlist Items</key>\n\t\t\t<array>",
+        "<key>Playlist Items</key>\n\t\t\t<array>\n\t\t\t\t<dict>"
+        "<key>Track ID</key><integer>99999</integer></dict>"
+    ))
+
+
+class TestSnapshot(object):
+    """Groups the tests of the library snapshots."""
+
+    def test_round_trip(self, tmp_path):
+        """A snapshot loads the same playlists as parsing the export."""
+
+        source = copy_export(tmp_path)
+        parsed = snapshot.load_playlists(source, library=True)
+        assert(snapshot.snapshot_path(source).is_file())
+
+        loaded = snapshot.read_snapshot(source, library=True)
+        assert([name for name, _ in loaded] == [name for name, _ in parsed])
+
+        tracks = snapshot.read_snapshot(source)[0][1]
+        full = files.load_plist(source)
+        assert(len(tracks) == len(full))
+        fields = ("Track ID", "Total Time") + snapshot.STRING_FIELDS
+        for track, record in zip(tracks, full):
+            assert(track == {f: record[f] for f in fields if f in record})
+
+    def test_stale(self, tmp_path):
+        """A snapshot survives a touch, but not a change of contents."""
+
+        source = copy_export(tmp_path)
+        snapshot.load_playlists(source)
+
+        stat = source.stat()
+        os.utime(str(source), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        assert(snapshot.read_snapshot(source) is not None)
+
+        # the new mtime is recorded, so it isn't hashed again
+        path = snapshot.snapshot_path(source)
+        header = snapshot.HEADER.unpack(
+            path.read_bytes()[:snapshot.HEADER.size]
+        )
+        assert(header[2] == stat.st_mtime_ns + 10**9)
+
+        source.write_text(source.read_text().replace("Buffett", "Bufett"))
+        assert(snapshot.read_snapshot(source) is None)
+        assert(snapshot.load_playlists(source, library=True)[0][0] == "Bufett")
+
+    def test_unresolved(self, tmp_path):
+        """Items that aren't tracks resolve as they do without a snapshot,
+            on the first run and after.
+        """
+
+        source = copy_export(tmp_path)
+        add_unresolved_item(source)
+
+        assert(files.load_plist(source) == [])
+        for _ in range(2):
+            assert(snapshot.load_playlists(source) == [])
+            ((_, tracks),) = snapshot.load_playlists(source, library=True)
+            assert(len(tracks) == 18)
+
+    def test_corrupt(self, tmp_path):
+        """An unreadable snapshot is ignored and rewritten."""
+
+        source = copy_export(tmp_path)
+        snapshot.load_playlists(source)
+
+        path = snapshot.snapshot_path(source)
+        path.write_bytes(path.read_bytes()[:-10])
+        assert(snapshot.read_snapshot(source) is None)
+
+        assert(snapshot.load_playlists(source))
+        assert(snapshot.read_snapshot(source) is not None)
+
+    def test_playlister(self, tmp_path):
+        """Conversions via a snapshot match the ones that parse the xml."""
+
+        source = copy_export(tmp_path)
+        args = [str(source), "-t", "m3u", "-m", "/home/jsmith/Music"]
+
+        expected = playlister.playlister(**cli.parse_args(args))
+        first = playlister.playlister(**cli.parse_args(args + ["-s"]))
+        second = playlister.playlister(**cli.parse_args(args + ["-s"]))
+
+        assert(expected == first == second)
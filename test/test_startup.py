@@ -0,0 +1,79 @@
+"""
+.. py:module:: test_startup
+    :platform: Unix, Windows
+    :synopsis: keeps the playlister import time in check, since it's paid
+        on every invocation.
+"""
+
+import os.path
+import subprocess
+import sys
+
+import pytest
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
+
+# microseconds, as reported by -X importtime. Generous, a cold import is
+# about a third of this.
+IMPORT_BUDGET = 100000
+
+# only needed by some runs, must not be imported up front
+LAZY_MODULES = [
+    "playlister.xspf",
+    "playlister.manifest",
+    "concurrent.futures.process",
+    "xml.sax.saxutils",
+    "urllib.request",
+    "json",
+    "subprocess",
+    "gzip",
+    "tarfile",
+    "playlister.server",
+    "http.server"
+]
+
+
+def run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=root_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+
+
+class TestStartup(object):
+    """Groups the import time tests."""
+
+    def test_lazy_imports(self):
+        """An m3u run doesn't import the other writers or optional
+            features.
+        """
+
+        result = run_python(
+            "import sys, playlister.app as app\n"
+            "args = app.parse_args([{!r}, '-t', 'm3u'])\n"
+            "app.get_converters(args['list_type'], args['music_path'])\n"
+            "print(' '.join(sys.modules))".format(resource_dir)
+        )
+
+        modules = result.stdout.split()
+        assert("playlister.m3u" in modules)
+        for module in LAZY_MODULES:
+            assert(module not in modules)
+
+    def test_import_budget(self):
+        """Importing the app stays within the budget."""
+
+        result = run_python("import playlister.app")
+        cumulative = [
+            int(line.split("|")[1])
+            for line in result.stderr.splitlines()
+            if line.rstrip().endswith("| playlister.app")
+        ]
+
+        assert(cumulative and cumulative[-1] < IMPORT_BUDGET)
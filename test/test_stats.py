@@ -0,0 +1,66 @@
+"""
+.. py:module:: test_stats
+    :platform: Unix, Windows
+    :synopsis: tests the run statistics for playlister.
+"""
+
+import json
+
+from time import sleep
+
+import pytest
+
+from .context import stats
+
+
+class TestStats(object):
+    """Groups the tests of the run statistics."""
+
+    def test_nested_timers(self):
+        """Time spent in a nested stage only counts towards that stage."""
+
+        run = stats.Stats()
+        with run.timer("render"):
+            sleep(0.01)
+            with run.timer("write"):
+                sleep(0.02)
+
+        render, write = run.stages["render"][0], run.stages["write"][0]
+        assert(0.01 <= render < 0.02)
+        assert(write >= 0.02)
+
+    def test_timed(self):
+        """Wrapped calls are only timed when enabled."""
+
+        def convert(n):
+            return n + 1
+
+        assert(stats.Stats(False).timed("convert", convert) is convert)
+
+        run = stats.Stats()
+        timed = run.timed("convert", convert)
+        assert(timed(1) == 2)
+        assert(run.stages["convert"][0] > 0)
+
+    def test_merge(self):
+        """Stats from another run add to this one."""
+
+        run, worker = stats.Stats(), stats.Stats()
+        run.count("files")
+        worker.count("files", 2)
+        worker.count("tracks", 10)
+        worker.stages["parse"][0] = 1.5
+
+        run.merge(worker.as_dict())
+        assert(run.counters["files"] == 3)
+        assert(run.counters["tracks"] == 10)
+        assert(run.stages["parse"][0] == 1.5)
+
+    def test_report(self):
+        """Reports are readable as text or json."""
+
+        run = stats.Stats()
+        run.count("tracks", 18)
+
+        assert("tracks: 18" in run.report())
+        assert(json.loads(run.report("json"))["counters"]["tracks"] == 18)
@@ -0,0 +1,57 @@
+"""
+.. py:module:: test_synthetic
+    :platform: Unix, Windows
+    :synopsis: tests the synthetic library generator used by the
+        benchmarks.
+"""
+
+import plistlib
+
+from io import StringIO
+
+import pytest
+
+from .context import files
+from bench.synthetic import write_library, generate_library
+
+
+class TestSynthetic(object):
+    """Groups the tests of the synthetic library generator."""
+
+    def test_playlist_export(self, tmp_path):
+        """A single playlist export holds every track, in a form both
+            plistlib and the streaming reader understand.
+        """
+
+        path = generate_library(
+            tmp_path / "synthetic.xml",
+            tracks=25,
+            unicode_density=0.5,
+            path_depth=2
+        )
+
+        with path.open("rb") as f:
+            plist = plistlib.load(f)
+
+        assert(len(plist["Tracks"]) == 25)
+        assert(files.load_plist(path) == files.extract_tracks(plist))
+
+    def test_library_export(self):
+        """A library export starts with the master playlist."""
+
+        f = StringIO()
+        write_library(f, tracks=10, playlists=3)
+        plist = plistlib.loads(f.getvalue().encode("utf-8"))
+
+        assert(len(plist["Playlists"]) == 3)
+        assert(plist["Playlists"][0]["Master"])
+        assert(len(plist["Playlists"][0]["Playlist Items"]) == 10)
+
+    def test_repeatable(self):
+        """The same seed gives the same library."""
+
+        first, second = StringIO(), StringIO()
+        write_library(first, tracks=10, seed=3)
+        write_library(second, tracks=10, seed=3)
+
+        assert(first.getvalue() == second.getvalue())
@@ -0,0 +1,80 @@
+"""
+.. py:module:: test_track
+    :platform: Unix, Windows
+    :synopsis: tests the compact track records for playlister.
+"""
+
+import pickle
+
+import pytest
+
+from .context import track, playlister
+
+RECORD = {
+    "Track ID": 5230,
+    "Name": "Son of a Son of a Sailor",
+    "Artist": "Jimmy Buffett",
+    "Kind": "Purchased AAC audio file",
+    "Play Count": 12,
+    "Total Time": 205250,
+    "Location": "file:///Users/jared/Music/iTunes/iTunes%20Media/"
+                "Music/Jimmy%20Buffett/a.m4a"
+}
+
+
+class TestTrack(object):
+    """Groups the tests of the compact track records."""
+
+    def test_mapping(self):
+        """A track reads like the plist record, minus unused fields."""
+
+        record = track.Track(RECORD)
+
+        assert(record["Name"] == RECORD["Name"])
+        assert(record.get("Album") is None)
+        assert(record.get("Composer", "") == "")
+        assert("Kind" not in record)
+        assert(record == {
+            key: value for key, value in RECORD.items()
+            if key not in ("Kind", "Play Count")
+        })
+
+        with pytest.raises(KeyError):
+            record["Album"]
+
+        with pytest.raises(KeyError):
+            record["Kind"]
+
+    def test_compact(self):
+        """Tracks have no per-instance dict and survive pickling, which
+            is how they reach worker processes.
+        """
+
+        record = track.Track(RECORD)
+
+        assert(not hasattr(record, "__dict__"))
+        assert(pickle.loads(pickle.dumps(record)) == record)
+
+    def test_interned(self):
+        """Repeating fields share one string across tracks, names don't."""
+
+        first = track.Track(dict(RECORD, Album="".join(["Vol", "cano"])))
+        second = track.Track(dict(RECORD, Album="".join(["Volc", "ano"])))
+
+        assert(first["Album"] is second["Album"])
+        assert(track.Track(first, Name="Volcano")["Album"] is first["Album"])
+        assert("Name" not in track.INTERNED)
+
+    def test_copy(self):
+        """Rewriting a location copies the track."""
+
+        record = track.Track(RECORD)
+        moved = track.Track(record, Location="/home/jsmith/a.m4a")
+
+        assert(moved["Location"] == "/home/jsmith/a.m4a")
+        assert(moved["Name"] == record["Name"])
+        assert(record["Location"] == RECORD["Location"])
+
+        replaced = playlister.replace_music_path("/home/jsmith", record)
+        assert(isinstance(replaced, track.Track))
+        assert(replaced["Location"] == "/home/jsmith/Jimmy%20Buffett/a.m4a")
@@ -0,0 +1,52 @@
+"""
+.. py:module:: test_verify
+    :platform: Unix, Windows
+    :synopsis: tests checking rewritten track locations for playlister.
+"""
+
+from urllib.parse import quote
+from unicodedata import normalize
+
+from .context import verify
+
+
+class TestVerify(object):
+    """Groups the tests of the track location checks."""
+
+    def test_music_index(self, tmp_path):
+        """Locations are found quoted, as file urls or decomposed."""
+
+        album = tmp_path / "Jimmy Buffett"
+        album.mkdir()
+        (album / "08 Mañana.m4a").write_text("")
+
+        index = verify.MusicIndex.scan(tmp_path)
+        path = str(album / "08 Mañana.m4a")
+
+        assert(len(index) == 1)
+        assert(quote(path) in index)
+        assert("file://" + quote(normalize("NFD", path)) in index)
+        assert(str(album / "09 African Friend.m4a") not in index)
+
+    def test_verifier(self):
+        """Missing tracks are reported per playlist."""
+
+        verifier = verify.Verifier(
+            verify.MusicIndex(["/music/0.mp3"], "/music")
+        )
+
+        assert(verifier.check("found.m3u", [{"Location": "/music/0.mp3"}])
+               == [])
+        assert(verifier.report() is None)
+
+        tracks = [{"Location": "/music/{}.mp3".format(n)} for n in range(8)]
+        assert(len(verifier.check("road.m3u", tracks)) == 7)
+        verifier.merge({"other.m3u": ["/music/x.mp3"]})
+
+        report = verifier.report()
+        assert(report.startswith(
+            "8 tracks in 2 playlists are missing from /music:"
+        ))
+        assert("  road.m3u (7 missing)" in report)
+        assert("...and 2 more" in report)
+        assert("/music/7.mp3" in verifier.report(verbose=True))
@@ -0,0 +1,222 @@
+"""
+.. py:module:: test_watch
+    :platform: Unix, Windows
+    :synopsis: tests watching xml exports for changes.
+"""
+
+import os
+import sys
+import shutil
+import time
+
+import pytest
+
+from .context import watch, playlister, scan
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+root_dir = os.path.sep.join(test_dir.split(os.path.sep)[:-1])
+resource_dir = os.path.join(root_dir, "resources")
+
+# seconds to wait for a change to be picked up before failing
+WATCH_TIMEOUT = 30
+
+
+class ScriptedWatcher(object):
+    """Returns a scripted series of changes, one per poll."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.closed = False
+
+    def poll(self, timeout):
+        return self.script.pop(0) if self.script else set()
+
+    def close(self):
+        self.closed = True
+
+
+class TestWatch(object):
+    """Groups the tests of the export watcher."""
+
+    def test_debounce(self, tmp_path):
+        """Changes close together are coalesced into one batch."""
+
+        a, b = tmp_path / "a.xml", tmp_path / "b.xml"
+        watcher = ScriptedWatcher([{a}, {b}, {a}])
+        batches = []
+
+        watch.watch(
+            tmp_path,
+            batches.append,
+            debounce=0,
+            watcher=watcher,
+            stop=lambda: bool(batches)
+        )
+
+        assert(batches == [[a, b]])
+        assert(watcher.closed)
+
+    def test_polling(self, tmp_path):
+        """Polling picks up changed and new exports, and nothing else."""
+
+        a = tmp_path / "a.xml"
+        a.write_text("<plist/>")
+        watcher = watch.PollingWatcher(tmp_path, interval=0)
+
+        assert(watcher.poll(0) == set())
+
+        stat = a.stat()
+        os.utime(str(a), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        (tmp_path / "b.xml").write_text("<plist/>")
+        (tmp_path / "a.m3u").write_text("#EXTM3U")
+
+        assert(watcher.poll(0) == {a, tmp_path / "b.xml"})
+
+    @pytest.mark.skipif(
+        not sys.platform.startswith("linux"),
+        reason="inotify is Linux only"
+    )
+    def test_inotify(self, tmp_path):
+        """inotify reports exports as they're written."""
+
+        watcher = watch.open_watcher(tmp_path)
+        try:
+            (tmp_path / "a.xml").write_text("<plist/>")
+            (tmp_path / "a.m3u").write_text("#EXTM3U")
+
+            assert(watcher.poll(1) == {tmp_path / "a.xml"})
+
+        finally:
+            watcher.close()
+
+    def test_watch_playlists(self, tmp_path, monkeypatch):
+        """A changed export is reconverted while watching, without
+            scanning the music directory again.
+        """
+
+        source = tmp_path / "Buffett.xml"
+        shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+        output = tmp_path / "out"
+        output.mkdir()
+        music = tmp_path / "music"
+        music.mkdir()
+
+        scans = []
+        scan_files = scan.scan_files
+
+        def counting_scan_files(root, *args, **kwargs):
+            scans.append(root)
+            return scan_files(root, *args, **kwargs)
+
+        monkeypatch.setattr(scan, "scan_files", counting_scan_files)
+
+        deadline = time.monotonic() + WATCH_TIMEOUT
+
+        def stop():
+            if not stop.changed:
+                stop.changed = True
+                source.write_text(source.read_text().replace(
+                    "Son of a Son of a Sailor", "Changes in Latitudes"
+                ))
+
+            return "Changes in Latitudes" in (
+                output / "Buffett.m3u"
+            ).read_text() or time.monotonic() > deadline
+
+        stop.changed = False
+
+        written = playlister.watch_playlists(
+            tmp_path,
+            output,
+            "m3u",
+            music,
+            verify=True,
+            stop=stop
+        )
+
+        assert("Changes in Latitudes" in (output / "Buffett.m3u").read_text())
+        assert(written == [output / "Buffett.m3u"] * 2)
+        assert(scans == [music])
+
+    def test_watch_excluded(self, tmp_path):
+        """An export left out with --exclude isn't converted when it
+            changes while watching.
+        """
+
+        for name in ["Buffett", "Skipped"]:
+            shutil.copy(
+                os.path.join(resource_dir, "Buffett.xml"),
+                str(tmp_path / "{}.xml".format(name))
+            )
+
+        output = tmp_path / "out"
+        output.mkdir()
+        deadline = time.monotonic() + WATCH_TIMEOUT
+
+        def stop():
+            if not stop.changed:
+                stop.changed = True
+                for name in ["Skipped", "Buffett"]:
+                    source = tmp_path / "{}.xml".format(name)
+                    source.write_text(source.read_text().replace(
+                        "Son of a Son of a Sailor", "Changes in Latitudes"
+                    ))
+
+            return "Changes in Latitudes" in (
+                output / "Buffett.m3u"
+            ).read_text() or time.monotonic() > deadline
+
+        stop.changed = False
+
+        written = playlister.watch_playlists(
+            tmp_path,
+            output,
+            "m3u",
+            stop=stop,
+            exclude=["Skipped.xml"]
+        )
+
+        assert("Changes in Latitudes" in (output / "Buffett.m3u").read_text())
+        assert(written == [output / "Buffett.m3u"] * 2)
+        assert(not (output / "Skipped.m3u").exists())
+
+    def test_watch_during_first_run(self, tmp_path, monkeypatch):
+        """An export written while the first run converts is picked up
+            once it's done.
+        """
+
+        source = tmp_path / "Buffett.xml"
+        shutil.copy(os.path.join(resource_dir, "Buffett.xml"), str(source))
+        output = tmp_path / "out"
+        output.mkdir()
+
+        load_plist = playlister.load_plist
+
+        def changing_load_plist(*args, **kwargs):
+            tracks = load_plist(*args, **kwargs)
+            if not changing_load_plist.changed:
+                changing_load_plist.changed = True
+                source.write_text(source.read_text().replace(
+                    "Son of a Son of a Sailor", "Changes in Latitudes"
+                ))
+
+            return tracks
+
+        changing_load_plist.changed = False
+        monkeypatch.setattr(playlister, "load_plist", changing_load_plist)
+        deadline = time.monotonic() + WATCH_TIMEOUT
+
+        def stop():
+            return "Changes in Latitudes" in (
+                output / "Buffett.m3u"
+            ).read_text() or time.monotonic() > deadline
+
+        written = playlister.watch_playlists(
+            tmp_path,
+            output,
+            "m3u",
+            stop=stop
+        )
+
+        assert("Changes in Latitudes" in (output / "Buffett.m3u").read_text())
+        assert(written == [output / "Buffett.m3u"] * 2)
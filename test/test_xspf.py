@@ -4,6 +4,8 @@
     :synopsis: tests the xspf-related functions for the playlister utility.
 """
 
+from io import StringIO
+
 import pytest
 
 from .context import xspf
@@ -31,4 +33,30 @@ class TestXSPF(object):
       <duration>192000</duration>
     </track>"""
 
-        assert(xspf.to_xspf_track(test_track) == result)
\ No newline at end of file
+        assert(xspf.to_xspf_track(test_track) == result)
+
+    def test_esc_field(self):
+        """Repeated artists and albums are escaped once."""
+
+        xspf.esc_field.cache_clear()
+        for name in ["a", "b", "c"]:
+            xspf.to_xspf_track({
+                "Location": "/foo/{}.mp3".format(name),
+                "Total Time": "192000",
+                "Name": name,
+                "Artist": "Simon & Garfunkel",
+                "Album": "Bookends"
+            })
+
+        assert(xspf.esc_field("Simon & Garfunkel") == "Simon &amp; Garfunkel")
+        assert(xspf.esc_field.cache_info().misses == 2)
+
+    def test_write_xspf_list(self):
+        """Streaming a playlist gives the same output as building it."""
+
+        tracks = ["    <track>1</track>", "    <track>2</track>"]
+
+        for items in [tracks, tracks[:1], []]:
+            f = StringIO()
+            xspf.write_xspf_list(f, "test", iter(items))
+            assert(f.getvalue() == xspf.to_xspf_list("test", items))